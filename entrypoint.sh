@@ -6,9 +6,12 @@ while ! timeout 1 bash -c 'cat < /dev/null > /dev/tcp/db/5432'; do
 done
 echo "PostgreSQL started."
 
-if [ "$RUN_CELERY" = "true" ]; then
+if [ "$RUN_CELERY_BEAT" = "true" ]; then
+  echo "Starting Celery Beat..."
+  exec poetry run celery -A trading_app beat -l info --logfile=/dev/stdout
+elif [ "$RUN_CELERY" = "true" ]; then
   echo "Starting Celery Worker..."
-  exec poetry run celery -A trading_app worker -l info -P solo --logfile=/dev/stdout --without-gossip --without-mingle --without-heartbeat
+  exec poetry run celery -A trading_app worker -l info -P prefork --concurrency="${CELERY_CONCURRENCY:-4}" --logfile=/dev/stdout --without-gossip --without-mingle --without-heartbeat
 else
   # Collect static files
   echo "Collecting static files..."
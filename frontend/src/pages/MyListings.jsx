@@ -4,6 +4,8 @@ import axios from "axios";
 
 const MyListings = () => {
   const [listings, setListings] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
+  const [prevPage, setPrevPage] = useState(null);
   const [loading, setLoading] = useState(true);
   const [message, setMessage] = useState(null);
   const [categories, setCategories] = useState([]);
@@ -21,14 +23,17 @@ const MyListings = () => {
     fetchCategories();
   }, [filters]);
 
-  const fetchListings = async () => {
+  // The next/previous links already carry the filters, so only the first page passes them
+  const fetchListings = async (url = null) => {
     setLoading(true);
     try {
-      const response = await axios.get(`${API_BASE_URL}/products/my_listings/`, {
+      const response = await axios.get(url || `${API_BASE_URL}/products/my_listings/`, {
         headers: { Authorization: `Bearer ${token}` },
-        params: filters,
+        params: url ? {} : filters,
       });
-      setListings(response.data);
+      setListings(response.data.results);
+      setNextPage(response.data.next);
+      setPrevPage(response.data.previous);
     } catch (error) {
       setMessage({ type: "error", text: "Failed to fetch listings" });
     } finally {
@@ -135,6 +140,25 @@ const MyListings = () => {
           ))}
         </div>
       )}
+
+      <div className="flex justify-between mt-6">
+        {prevPage && (
+          <button
+            onClick={() => fetchListings(prevPage)}
+            className="bg-gray-500 text-white px-4 py-2 rounded"
+          >
+            Previous
+          </button>
+        )}
+        {nextPage && (
+          <button
+            onClick={() => fetchListings(nextPage)}
+            className="bg-blue-500 text-white px-4 py-2 rounded"
+          >
+            Next
+          </button>
+        )}
+      </div>
     </div>
   );
 };
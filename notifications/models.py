@@ -9,5 +9,10 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.user.name} - {self.message[:50]}"
\ No newline at end of file
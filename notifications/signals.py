@@ -17,10 +17,10 @@ def send_ws_notification(user_id, message):
 
 @receiver(post_save, sender=Order)
 def notify_trader_on_order(sender, instance, created, **kwargs):
-    if created:
+    if created and instance.order_type == "purchase":
         message = f"New order for {instance.product.title} from {instance.user.username}."
-        Notification.objects.create(user=instance.product.user, message=message)
-        send_ws_notification(instance.product.user.id, message)
+        Notification.objects.create(user_id=instance.seller_id, message=message)
+        send_ws_notification(instance.seller_id, message)
 
 @receiver(post_save, sender=Order)
 def notify_customer_on_approval(sender, instance, **kwargs):
@@ -40,8 +40,8 @@ def notify_customer_on_rejection(sender, instance, **kwargs):
 def notify_trader_on_payment(sender, instance, **kwargs):
     if instance.status == "paid":
         message = f"{instance.sales_order.order.user.username} completed payment for order {instance.sales_order.order.id}."
-        Notification.objects.create(user=instance.sales_order.order.product.user, message=message)
-        send_ws_notification(instance.sales_order.order.product.user.id, message)
+        Notification.objects.create(user_id=instance.sales_order.order.seller_id, message=message)
+        send_ws_notification(instance.sales_order.order.seller_id, message)
 
 @receiver(post_save, sender=Order)
 def notify_customer_on_shipment(sender, instance, **kwargs):
@@ -61,12 +61,23 @@ def notify_customer_on_invoice(sender, instance, **kwargs):
 def notify_trader_on_cancellation(sender, instance, **kwargs):
     if instance.status in ["pending", "approved"]:
         message = f"Order {instance.id} has been cancelled by {instance.user.username}."
-        Notification.objects.create(user=instance.product.user, message=message)
-        send_ws_notification(instance.product.user.id, message)
+        Notification.objects.create(user_id=instance.seller_id, message=message)
+        send_ws_notification(instance.seller_id, message)
 
 @receiver(post_save, sender=Transaction)
 def notify_customer_on_trader_cancellation(sender, instance, **kwargs):
-    if instance.status_to == "canceled" and instance.order.product.user == instance.user:
+    if instance.status_to == "canceled" and instance.order.seller_id == instance.user_id:
         message = f"Your order {instance.order.id} has been cancelled by the trader."
         Notification.objects.create(user=instance.order.user, message=message)
-        send_ws_notification(instance.order.user.id, message)
\ No newline at end of file
+        send_ws_notification(instance.order.user.id, message)
+
+def bulk_notify(notifications):
+    """
+    Stores and pushes many (user_id, message) notifications at once.
+    Used by set-based code paths where post_save never fires.
+    """
+    Notification.objects.bulk_create([
+        Notification(user_id=user_id, message=message) for user_id, message in notifications
+    ])
+    for user_id, message in notifications:
+        send_ws_notification(user_id, message)
@@ -1,16 +1,19 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from trading_app.pagination import KeysetPagination
 from .models import Notification
 from .serializers import NotificationSerializer
 
+
 class NotificationViewSet(viewsets.ModelViewSet):
     """ API for managing notifications """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by("-created_at")
+        return Notification.objects.filter(user=self.request.user).order_by("-created_at", "-id")
 
     @action(detail=False, methods=["get"])
     def unread(self, request):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, Category
+from .models import Product, Category, ProductImport
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -11,4 +11,11 @@ class ProductListingAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'category', 'price', 'user', 'created_at')
     list_filter = ('category', 'created_at')
     search_fields = ('title', 'description', 'user__username')
-    ordering = ('-created_at',)
\ No newline at end of file
+    ordering = ('-created_at',)
+
+@admin.register(ProductImport)
+class ProductImportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'format', 'status', 'processed_rows', 'imported_rows', 'failed_rows', 'rows_per_second', 'created_at')
+    list_filter = ('status', 'format')
+    search_fields = ('user__username',)
+    ordering = ('-created_at',)
@@ -0,0 +1,40 @@
+from django.db import connection
+from django.utils.timezone import now
+
+from products.cache import invalidate_products
+from products.models import Product
+
+
+def bulk_update_price_stock(updates, owner=None):
+    """
+    Applies [{"id", "price"?, "stock"?}, ...] with one UPDATE ... FROM (VALUES ...).
+    Fields left out of an item keep their value. When `owner` is given, only
+    that user's products are touched (in the same statement). Returns the
+    updated rows as [{"id", "price", "stock"}].
+    """
+    if not updates:
+        return []
+    table = Product._meta.db_table
+    values = ", ".join(["(%s::bigint, %s::numeric, %s::integer)"] * len(updates))
+    # Placeholders in statement order: updated_at, the VALUES rows, then the owner
+    params = [now()] + [value for item in updates for value in (item["id"], item.get("price"), item.get("stock"))]
+    owned = ""
+    if owner is not None:
+        owned = "AND p.user_id = %s"
+        params.append(owner.pk)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {table} AS p
+            SET price = COALESCE(v.price, p.price),
+                stock = COALESCE(v.stock, p.stock),
+                updated_at = %s
+            FROM (VALUES {values}) AS v(id, price, stock)
+            WHERE p.id = v.id {owned}
+            RETURNING p.id, p.price, p.stock
+        """, params)
+        rows = [{"id": pk, "price": str(price), "stock": stock} for pk, price, stock in cursor.fetchall()]
+        if rows:
+            # Stock-only batches leave autocomplete and facets alone
+            invalidate_products([row["id"] for row in rows], listings=any("price" in item for item in updates))
+    return rows
@@ -0,0 +1,187 @@
+"""
+Catalog cache for the public product endpoints.
+
+Payloads are cached under versioned keys:
+  - list pages and category listings embed the catalog version, which is
+    bumped by every product or category write;
+  - a product's detail payload embeds that product's version and the
+    categories version (for category_name);
+  - autocomplete and facet results embed the listings version, which
+    stock-only updates leave alone (facets also embed the categories
+    version, for category names).
+Invalidation only ever bumps versions, after the writing transaction
+commits. A reader still rebuilding from pre-commit data therefore stores
+its result under a key that is no longer read, and old entries just age
+out after CATALOG_CACHE_TTL. Version keys themselves expire after
+CATALOG_VERSION_TTL, which is longer, and a product's version is only
+started once the product is known to exist.
+
+The same keys double as HTTP validators: ProductViewSet derives ETags
+from them, so an unchanged page is answered with 304 without touching
+the database.
+
+A cold key is rebuilt by a single request. The others wait briefly for
+its result instead of all querying the database (request coalescing).
+Hits, misses, coalesced waits and rebuild time are counted in the cache
+itself so stats() reports them across all workers.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION = "catalog:version"
+CATEGORIES_VERSION = "catalog:categories:version"
+LISTINGS_VERSION = "catalog:listings:version"
+PRODUCT_VERSION = "catalog:product:{id}:version"
+STATS_PREFIX = "catalog:stats:"
+STATS = ("hits", "misses", "coalesced", "rebuilds", "rebuild_ms")
+
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_WAIT = 2.0
+POLL_INTERVAL = 0.02
+
+
+def bump(*keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Never set (or evicted): any fresh value differs from what readers defaulted to
+            cache.add(key, int(time.time() * 1000), timeout=settings.CATALOG_VERSION_TTL)
+
+
+def versions(*keys, values=None):
+    """
+    Current values of version keys. A missing key (never bumped, expired or evicted)
+    is started at the current time in ms rather than read as 0, so a lost key can
+    never come back with a value an earlier reader (or an ETag) already saw.
+    `values` are the keys already fetched with get_many, if any.
+    """
+    values = cache.get_many(keys) if values is None else values
+    missing = [key for key in keys if key not in values]
+    if missing:
+        now_ms = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, now_ms, timeout=settings.CATALOG_VERSION_TTL)
+        values.update(cache.get_many(missing))
+    return [values.get(key, 0) for key in keys]
+
+
+def invalidate_products(product_ids, listings=False):
+    """
+    Drops cached payloads of the given products and every list page, once the transaction commits.
+    Pass listings=True when more than stock may have changed (titles, prices, categories):
+    autocomplete and facets ignore stock-only updates.
+    """
+    keys = [CATALOG_VERSION] + [PRODUCT_VERSION.format(id=product_id) for product_id in set(product_ids)]
+    if listings:
+        keys.append(LISTINGS_VERSION)
+    transaction.on_commit(lambda: bump(*keys))
+
+
+def invalidate_categories():
+    """ Drops every cached payload that shows category data, once the transaction commits """
+    transaction.on_commit(lambda: bump(CATALOG_VERSION, CATEGORIES_VERSION))
+
+
+def count(name, amount=1):
+    key = STATS_PREFIX + name
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, amount)
+
+
+def list_key(request, scope):
+    """ Key for a list payload: catalog version + normalised query string """
+    version, = versions(CATALOG_VERSION)
+    query = urlencode(sorted(request.query_params.items()))
+    digest = hashlib.sha256(f"{request.get_host()}{request.path}?{query}".encode()).hexdigest()[:32]
+    return f"catalog:{scope}:{version}:{digest}"
+
+
+def detail_key(product_id, exists):
+    """
+    Key for a product's detail payload. When the product has no version yet, `exists()`
+    is asked first and None is returned for an unknown product instead of starting one.
+    """
+    keys = (CATEGORIES_VERSION, PRODUCT_VERSION.format(id=product_id))
+    values = cache.get_many(keys)
+    if keys[1] not in values and not exists():
+        return None
+    categories_version, product_version = versions(*keys, values=values)
+    return f"catalog:product:{product_id}:{categories_version}:{product_version}"
+
+
+def autocomplete_key(prefix, limit):
+    version, = versions(LISTINGS_VERSION)
+    digest = hashlib.sha256(prefix.encode()).hexdigest()[:32]
+    return f"catalog:autocomplete:{version}:{limit}:{digest}"
+
+
+def facets_key(filters, buckets):
+    """ Key for a facets payload: listings and categories versions + normalised filter set """
+    listings_version, categories_version = versions(LISTINGS_VERSION, CATEGORIES_VERSION)
+    query = urlencode(sorted((name, value) for name, value in filters.items() if value))
+    digest = hashlib.sha256(query.encode()).hexdigest()[:32]
+    return f"catalog:facets:{listings_version}:{categories_version}:{buckets}:{digest}"
+
+
+def get_or_build(key, build):
+    """
+    Returns the cached payload for `key`, or calls `build()` to make it.
+    `build` returns (payload, cacheable). Only the request that takes the
+    rebuild lock calls it; concurrent requests for the same key wait up to
+    REBUILD_WAIT for that result before building uncached themselves.
+    """
+    payload = cache.get(key)
+    if payload is not None:
+        count("hits")
+        return payload
+    count("misses")
+
+    lock = f"{key}:lock"
+    if not cache.add(lock, 1, timeout=REBUILD_LOCK_TIMEOUT):
+        deadline = time.monotonic() + REBUILD_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            payload = cache.get(key)
+            if payload is not None:
+                count("coalesced")
+                return payload
+        return build()[0]
+
+    try:
+        started = time.perf_counter()
+        payload, cacheable = build()
+        if cacheable:
+            cache.set(key, payload, timeout=settings.CATALOG_CACHE_TTL)
+            count("rebuilds")
+            count("rebuild_ms", int((time.perf_counter() - started) * 1000))
+        return payload
+    finally:
+        cache.delete(lock)
+
+
+def stats():
+    values = cache.get_many([STATS_PREFIX + name for name in STATS])
+    hits, misses, coalesced, rebuilds, rebuild_ms = (values.get(STATS_PREFIX + name, 0) for name in STATS)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "coalesced": coalesced,
+        "hit_ratio": round((hits + coalesced) / lookups, 4) if lookups else None,
+        "rebuilds": rebuilds,
+        "rebuild_ms_avg": round(rebuild_ms / rebuilds, 2) if rebuilds else None,
+        "catalog_version": cache.get(CATALOG_VERSION, 0),
+    }
+
+
+def reset_stats():
+    cache.delete_many([STATS_PREFIX + name for name in STATS])
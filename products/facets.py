@@ -0,0 +1,68 @@
+"""
+Sidebar facets for a filtered product queryset: per-category counts and an
+equal-width price histogram, computed by a single GROUPING SETS query.
+"""
+from decimal import Decimal
+
+from django.db import connection
+
+from products.models import Category
+
+CENT = Decimal("0.01")
+
+
+def compute_facets(queryset, buckets):
+    """
+    Returns {"total", "categories", "price"} for the rows of `queryset`.
+    The filtered rows are materialised once; one grouping set counts them
+    per category, one per price bucket and the empty set gives the total
+    and the price range.
+    """
+    filtered_sql, params = queryset.order_by().values("category_id", "price").query.sql_with_params()
+    sql = f"""
+        WITH filtered AS MATERIALIZED ({filtered_sql}),
+        bounds AS (SELECT min(price) AS lo, max(price) AS hi FROM filtered),
+        bucketed AS (
+            SELECT f.category_id, f.price,
+                   CASE WHEN b.hi > b.lo THEN least(width_bucket(f.price, b.lo, b.hi, %s), %s) ELSE 1 END AS bucket
+            FROM filtered f CROSS JOIN bounds b
+        )
+        SELECT GROUPING(r.category_id, r.bucket), r.category_id, c.name, r.bucket,
+               count(*), min(r.price), max(r.price)
+        FROM bucketed r LEFT JOIN {Category._meta.db_table} c ON c.id = r.category_id
+        GROUP BY GROUPING SETS ((r.category_id, c.name), (r.bucket), ())
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, buckets, buckets])
+        rows = cursor.fetchall()
+
+    total, lo, hi = 0, None, None
+    categories, histogram = [], {}
+    for grouping, category_id, name, bucket, matches, low, high in rows:
+        # GROUPING() bitmask: 1 = category row (bucket rolled up), 2 = bucket row, 3 = grand total
+        if grouping == 1:
+            categories.append({"id": category_id, "name": name, "count": matches})
+        elif grouping == 2:
+            histogram[bucket] = matches
+        else:
+            total, lo, hi = matches, low, high
+    categories.sort(key=lambda row: (-row["count"], row["name"] or ""))
+
+    return {"total": total, "categories": categories, "price": price_histogram(lo, hi, buckets, histogram)}
+
+
+def price_histogram(lo, hi, buckets, counts):
+    if lo is None:
+        return {"min": None, "max": None, "buckets": []}
+    if hi == lo:
+        return {"min": str(lo), "max": str(hi), "buckets": [{"from": str(lo), "to": str(hi), "count": counts.get(1, 0)}]}
+    width = (hi - lo) / buckets
+    edges = [(lo + width * i).quantize(CENT) for i in range(buckets)] + [hi]
+    return {
+        "min": str(lo),
+        "max": str(hi),
+        "buckets": [
+            {"from": str(edges[i]), "to": str(edges[i + 1]), "count": counts.get(i + 1, 0)}
+            for i in range(buckets)
+        ],
+    }
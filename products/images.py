@@ -0,0 +1,123 @@
+"""
+Thumbnail and WebP variants of product images.
+
+After an upload, the original is resized to each width in
+PRODUCT_IMAGE_WIDTHS (never upscaled), and every size is encoded as WebP
+and JPEG. The variants are written next to the original in the same
+storage, as `<name>_<width>w.<ext>`. Product.image_variants records them
+so ProductSerializer can offer srcset URLs.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import ExifTags, Image, ImageOps
+
+from products.cache import invalidate_products
+from products.models import Product
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+
+def render_variants(data, widths, quality):
+    """
+    Resizes the image in `data` (bytes) to each width, widest first, and
+    encodes every size in FORMATS. Returns (original size, [(width, format, bytes)]).
+    This function is pure, so batch workers can run it in separate processes.
+    """
+    image = Image.open(io.BytesIO(data))
+    rotated = image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8)
+    original = image.size[::-1] if rotated else image.size
+    widths = sorted({width for width in widths if width < original[0]}, reverse=True) or [original[0]]
+    # JPEG sources can be decoded straight at a reduced scale (1/2, 1/4, 1/8), which is much cheaper
+    image.draft("RGB", (1, widths[0]) if rotated else (widths[0], 1))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    variants = []
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        # Each size is resized from the previous one: a smaller image to read, and the ratio stays small enough for LANCZOS
+        image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for name, pil_format in FORMATS.items():
+            frame = image
+            if pil_format == "JPEG" and image.mode == "RGBA":
+                frame = Image.new("RGB", image.size, (255, 255, 255))
+                frame.paste(image, mask=image.getchannel("A"))
+            output = io.BytesIO()
+            frame.save(output, pil_format, quality=quality, optimize=pil_format == "JPEG", method=4)
+            variants.append((width, name, output.getvalue()))
+    return original, variants
+
+
+def variant_name(source_name, width, extension):
+    root, _ = os.path.splitext(source_name)
+    return f"{root}_{width}w.{extension}"
+
+
+def process_product_image(product_id, force=False):
+    """
+    Builds and stores the variants of one product's current image.
+    Returns the number of variants written (0 if there is nothing to do).
+    """
+    product = Product.objects.filter(pk=product_id).only("image", "image_variants").first()
+    if product is None or not product.image:
+        return 0
+    source = product.image.name
+    previous = product.image_variants or {}
+    if previous.get("source") == source and not force:
+        return 0
+
+    storage = product.image.storage
+    with storage.open(source, "rb") as original:
+        data = original.read()
+    (width, height), variants = render_variants(
+        data, settings.PRODUCT_IMAGE_WIDTHS, settings.PRODUCT_IMAGE_QUALITY
+    )
+
+    stored = []
+    for variant_width, extension, content in variants:
+        name = storage.save(variant_name(source, variant_width, extension), ContentFile(content))
+        stored.append({"width": variant_width, "format": extension, "name": name})
+    image_variants = {"source": source, "width": width, "height": height, "variants": stored}
+
+    with transaction.atomic():
+        # The image may have been replaced while we were rendering; that upload queues its own run
+        updated = Product.objects.filter(pk=product_id, image=source).update(image_variants=image_variants)
+        if updated:
+            invalidate_products([product_id])
+    if not updated:
+        delete_variants(storage, stored)
+        return 0
+    kept = {variant["name"] for variant in stored}
+    delete_variants(storage, [variant for variant in previous.get("variants", []) if variant["name"] not in kept])
+    return len(stored)
+
+
+def delete_variants(storage, variants):
+    for variant in variants:
+        try:
+            storage.delete(variant["name"])
+        except Exception:
+            logger.warning("Could not delete image variant %s", variant["name"], exc_info=True)
+
+
+def srcset(product, request=None):
+    """ {"webp": "<url> 160w, ...", "jpeg": ...} for the product's current image, or None until processed """
+    image_variants = product.image_variants or {}
+    if not product.image or image_variants.get("source") != product.image.name:
+        return None
+    storage = product.image.storage
+    candidates = {}
+    for variant in sorted(image_variants["variants"], key=lambda variant: variant["width"]):
+        url = storage.url(variant["name"])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        candidates.setdefault(variant["format"], []).append(f"{url} {variant['width']}w")
+    return {extension: ", ".join(urls) for extension, urls in candidates.items()}
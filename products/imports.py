@@ -0,0 +1,133 @@
+"""
+Bulk product import from CSV or JSON Lines.
+
+The file is parsed as a stream and handled in chunks of IMPORT_CHUNK_SIZE
+rows. Rows are validated by one ProductImportRowSerializer instance (its
+fields are bound once, not per row), and category names are resolved from a
+single lookup loaded up front. Valid rows go in with one bulk_create per
+chunk. Invalid rows are reported with their line number and do not stop
+the import.
+"""
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.utils.timezone import now
+from rest_framework.exceptions import ValidationError
+
+from products.cache import invalidate_products
+from products.models import Category, Product, ProductImport
+from products.serializers import ProductImportRowSerializer
+
+PROGRESS_INTERVAL = 1.0
+
+
+def read_rows(stream, format):
+    """ Yields (line number, row dict or parse error message) from a binary stream """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="" if format == "csv" else None)
+    if format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Empty cells mean "not given", so optional fields fall back to their defaults
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        yield line_number, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def import_products(user, stream, format, progress=None):
+    """
+    Creates `user`'s products from `stream`. Calls progress(report) after each chunk
+    (at most every PROGRESS_INTERVAL seconds) and returns the final report:
+    {"processed", "imported", "failed", "errors", "seconds", "rows_per_second"}.
+    """
+    chunk_size = settings.IMPORT_CHUNK_SIZE
+    max_errors = settings.IMPORT_MAX_REPORTED_ERRORS
+    categories = {name.casefold(): pk for pk, name in Category.objects.values_list("id", "name")}
+    report = {"processed": 0, "imported": 0, "failed": 0, "errors": []}
+
+    def fail(line, errors):
+        report["failed"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"line": line, "errors": errors})
+
+    serializer = ProductImportRowSerializer()
+    started = last_progress = time.perf_counter()
+    rows = read_rows(stream, format)
+    try:
+        while chunk := list(islice(rows, chunk_size)):
+            products = []
+            for line, row in chunk:
+                if isinstance(row, str):
+                    fail(line, {"non_field_errors": [row]})
+                    continue
+                try:
+                    data = serializer.run_validation(row)
+                except ValidationError as e:
+                    fail(line, e.detail)
+                    continue
+                category = data.pop("category", "")
+                category_id = categories.get(category.casefold()) if category else None
+                if category and category_id is None:
+                    fail(line, {"category": [f"Unknown category \"{category}\"."]})
+                    continue
+                products.append(Product(user=user, category_id=category_id, **data))
+
+            Product.objects.bulk_create(products)
+            report["processed"] += len(chunk)
+            report["imported"] += len(products)
+
+            if progress and time.perf_counter() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.perf_counter()
+                progress(report)
+    finally:
+        # Chunks are committed as they go, so lists change even when a later chunk fails.
+        # bulk_create skips the post_save signals; new products have no detail payloads yet, only lists change
+        if report["imported"]:
+            invalidate_products([], listings=True)
+    seconds = time.perf_counter() - started
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round(report["processed"] / seconds, 1) if seconds else None
+    return report
+
+
+def run_import(import_id):
+    """ Processes a pending ProductImport, recording progress on the row as it goes """
+    # Claiming the row makes a redelivered task a no-op
+    if not ProductImport.objects.filter(pk=import_id, status="pending").update(status="running", started_at=now()):
+        return None
+    product_import = ProductImport.objects.select_related("user").get(pk=import_id)
+
+    def progress(report):
+        ProductImport.objects.filter(pk=import_id).update(
+            processed_rows=report["processed"], imported_rows=report["imported"], failed_rows=report["failed"]
+        )
+
+    try:
+        with product_import.file.open("rb") as stream:
+            report = import_products(product_import.user, stream, product_import.format, progress)
+    except Exception as e:
+        ProductImport.objects.filter(pk=import_id).update(
+            status="failed", finished_at=now(), errors=[{"line": None, "errors": {"non_field_errors": [str(e)]}}]
+        )
+        raise
+    ProductImport.objects.filter(pk=import_id).update(
+        status="completed",
+        finished_at=now(),
+        processed_rows=report["processed"],
+        imported_rows=report["imported"],
+        failed_rows=report["failed"],
+        errors=report["errors"],
+        rows_per_second=report["rows_per_second"],
+    )
+    return report
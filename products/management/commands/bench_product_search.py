@@ -0,0 +1,120 @@
+import re
+import statistics
+import time
+import uuid
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework import filters
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.models import Product
+from trading_app.search import FullTextSearchFilter
+from users.models import User
+
+ADJECTIVES = ["antique", "vintage", "polished", "brushed", "engraved", "handmade", "rare", "minted", "certified", "raw"]
+MATERIALS = ["gold", "silver", "platinum", "copper", "bronze", "palladium", "titanium", "brass", "nickel", "steel"]
+ITEMS = ["bar", "coin", "ring", "necklace", "bracelet", "ingot", "medal", "pendant", "chain", "bullion"]
+REGIONS = ["Almaty", "Astana", "Shymkent", "Karaganda", "Aktobe", "Taraz", "Pavlodar", "Oskemen"]
+
+DEFAULT_TERMS = ["gold", "silver necklace", "engraved palladium medal", "Shymkent", "necklase", "platnum coin"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic catalog and compare ProductViewSet search with DRF SearchFilter "
+        "(ILIKE scans) against the full-text/trigram FullTextSearchFilter"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--runs", type=int, default=5, help="Timed executions per query.")
+        parser.add_argument("--term", action="append", dest="terms", help="Search term (repeatable).")
+        parser.add_argument("--plans", action="store_true", help="Print the full EXPLAIN ANALYZE output.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rows.")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        started = time.perf_counter()
+        trader_id = self.generate(tag, options["products"])
+        self.stdout.write(f"Generated {options['products']:,} products in {time.perf_counter() - started:.1f}s")
+
+        old_view = SimpleNamespace(search_fields=["title", "description"])
+        new_view = SimpleNamespace(search_vector_field="search_vector", trigram_fields=["title"])
+        factory = APIRequestFactory()
+        try:
+            for term in options["terms"] or DEFAULT_TERMS:
+                request = Request(factory.get("/", {"search": term}))
+                base = Product.objects.filter(user_id=trader_id)
+                old = filters.SearchFilter().filter_queryset(request, base.order_by("-created_at"), old_view)
+                new = FullTextSearchFilter().filter_queryset(request, base, new_view)
+                self.compare(term, old, new, options)
+        finally:
+            if not options["keep"]:
+                self.cleanup(tag)
+
+    def generate(self, tag, products):
+        """ Bulk-load one trader and their catalog with INSERT ... SELECT """
+        users_table = User._meta.db_table
+        products_table = Product._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {users_table} (password, is_superuser, username, first_name, last_name, email,
+                                           is_staff, is_active, date_joined, role, last_updated)
+                VALUES ('!', false, %s, '', '', '', false, true, now(), 'trader', now())
+                RETURNING id
+            """, [f"bench_search_{tag}"])
+            trader_id = cursor.fetchone()[0]
+
+            cursor.execute(f"""
+                INSERT INTO {products_table} (title, description, price, stock, user_id, created_at, updated_at,
+                                              image_variants)
+                SELECT initcap(a.w || ' ' || m.w || ' ' || i.w) || ' #' || g,
+                       'Lot ' || g || ': ' || a.w || ' ' || m.w || ' ' || i.w || ', shipped from ' || r.w || '.',
+                       10 + (g * 37) %% 5000, (g * 13) %% 100, %s, now() - (g || ' seconds')::interval, now(),
+                       '{{}}'::jsonb
+                FROM generate_series(1, %s) AS g
+                JOIN LATERAL (SELECT (%s::text[])[1 + g %% %s] AS w) a ON true
+                JOIN LATERAL (SELECT (%s::text[])[1 + (g / 10) %% %s] AS w) m ON true
+                JOIN LATERAL (SELECT (%s::text[])[1 + (g / 100) %% %s] AS w) i ON true
+                JOIN LATERAL (SELECT (%s::text[])[1 + (g / 1000) %% %s] AS w) r ON true
+            """, [
+                trader_id, products,
+                ADJECTIVES, len(ADJECTIVES), MATERIALS, len(MATERIALS), ITEMS, len(ITEMS), REGIONS, len(REGIONS),
+            ])
+            cursor.execute(f"ANALYZE {products_table}")
+        return trader_id
+
+    def compare(self, term, old, new, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nsearch={term!r}"))
+        for label, queryset in (("SearchFilter (ILIKE)", old), ("FullTextSearchFilter", new)):
+            page = queryset[:10]
+            page_timings, count_timings = [], []
+            for _ in range(options["runs"]):
+                started = time.perf_counter()
+                titles = [product.title for product in page.all()]
+                page_timings.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                total = queryset.count()
+                count_timings.append((time.perf_counter() - started) * 1000)
+
+            plan = page.explain(analyze=True)
+            scans = sorted(set(re.findall(r"((?:Parallel )?(?:Bitmap Index|Index Only|Index|Seq) Scan(?: Backward)? (?:using \w+ )?on \w+)", plan)))
+            self.stdout.write(
+                f"  {label:<22} page {statistics.median(page_timings):9.2f} ms   "
+                f"count {statistics.median(count_timings):9.2f} ms   matches {total:>9,}"
+            )
+            self.stdout.write(f"    {'; '.join(scans)}")
+            self.stdout.write(f"    top: {', '.join(titles[:3]) or '-'}")
+            if options["plans"]:
+                self.stdout.write("    " + plan.replace("\n", "\n    "))
+
+    def cleanup(self, tag):
+        username = f"bench_search_{tag}"
+        users = f"SELECT id FROM {User._meta.db_table} WHERE username = %s"
+        # Raw deletes: the generated rows never went through signals, so skip them on the way out too
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Product._meta.db_table} WHERE user_id IN ({users})", [username])
+            cursor.execute(f"DELETE FROM {User._meta.db_table} WHERE username = %s", [username])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.imports import import_products
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Import a trader's products from a CSV or JSONL file (title, description, price, stock, category name)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file.")
+        parser.add_argument("--user", required=True, help="Username of the trader who owns the products.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--show-errors", type=int, default=20, help="Row errors to print.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"], role="trader")
+        except User.DoesNotExist:
+            raise CommandError(f"No trader named {options['user']!r}")
+        format = options["format"] or options["path"].rsplit(".", 1)[-1].lower()
+        if format not in ("csv", "jsonl"):
+            raise CommandError("Pass --format csv or --format jsonl")
+
+        def progress(report):
+            self.stdout.write(f"  {report['processed']:,} rows ({report['imported']:,} imported, {report['failed']:,} failed)")
+
+        with open(options["path"], "rb") as stream:
+            report = import_products(user, stream, format, progress)
+
+        for error in report["errors"][:options["show_errors"]]:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']:,} of {report['processed']:,} rows ({report['failed']:,} failed) "
+            f"in {report['seconds']:.1f}s: {report['rows_per_second']:,} rows/s"
+        ))
@@ -0,0 +1,63 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.images import process_product_image
+from products.models import Product
+
+
+def init_worker():
+    # Spawned workers start without Django; forked ones already have it and open their own DB connections
+    django.setup()
+
+
+def process(product_id, force):
+    try:
+        return product_id, process_product_image(product_id, force=force), None
+    except Exception as exc:
+        return product_id, 0, repr(exc)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate thumbnail/WebP variants for product images that don't have them yet, "
+        "in a pool of worker processes, and report throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes.")
+        parser.add_argument("--limit", type=int, help="Process at most this many products.")
+        parser.add_argument("--force", action="store_true", help="Regenerate variants that are already up to date.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image="").exclude(image__isnull=True).order_by("id")
+        ids = list(products.values_list("id", flat=True)[:options["limit"]])
+        if not ids:
+            self.stdout.write("No product images to process")
+            return
+
+        # Children must not share the parent's database socket
+        connections.close_all()
+        processed = variants = failed = 0
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=init_worker) as pool:
+            futures = [pool.submit(process, product_id, options["force"]) for product_id in ids]
+            for future in as_completed(futures):
+                product_id, written, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Product {product_id}: {error}")
+                elif written:
+                    processed += 1
+                    variants += written
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} images ({variants} variants, {len(ids) - processed - failed} up to date, "
+            f"{failed} failed) in {elapsed:.1f}s with {options['workers']} workers: "
+            f"{processed / elapsed:.1f} images/s"
+        ))
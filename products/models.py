@@ -1,5 +1,11 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
-from .storage import ProductStorage
+from django.db.models import F
+from django.db.models.functions import Collate, Upper
+from django.utils.timezone import now
+from .cache import invalidate_products
+from .storage import ImportStorage, ProductStorage
 from users.models import User
 
 
@@ -21,21 +27,73 @@ class Product(models.Model):
     stock = models.PositiveIntegerField(default=0, help_text="Available stock quantity.")
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="products", help_text="Category of the product.")
     image = models.ImageField(storage=ProductStorage(), upload_to='products/', blank=True, null=True, help_text="Product image.")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized WebP/JPEG copies of the image, see products.images.")
     created_at = models.DateTimeField(auto_now_add=True, help_text="Date and time when the product was added.")
     updated_at = models.DateTimeField(auto_now=True, help_text="Last update timestamp.")
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", weight="A", config="english") + SearchVector("description", weight="B", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        help_text="Full-text document of title and description, maintained by Postgres."
+    )
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="product_title_trgm_idx"),
+            # "C" collation lets one btree serve both LIKE 'PREFIX%' and the ORDER BY of autocomplete
+            models.Index(Collate(Upper("title"), "C"), name="product_title_prefix_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.price} KZT"
 
     def reduce_stock(self, quantity):
-        """ Reduce stock when an order is placed """
-        if self.stock >= quantity:
-            self.stock -= quantity
-            self.save()
-            return True
-        return False
+        """
+        Reduce stock when an order is placed.
+        Runs as a single conditional UPDATE so concurrent buyers can never oversell;
+        the in-memory `stock` is left untouched (use refresh_from_db() if needed).
+        """
+        updated = Product.objects.filter(pk=self.pk, stock__gte=quantity).update(
+            stock=F("stock") - quantity, updated_at=now()
+        )
+        if updated:
+            invalidate_products([self.pk])
+        return updated == 1
 
     def increase_stock(self, quantity):
         """ Increase stock when an order is canceled """
-        self.stock += quantity
-        self.save()
\ No newline at end of file
+        Product.objects.filter(pk=self.pk).update(stock=F("stock") + quantity, updated_at=now())
+        invalidate_products([self.pk])
+
+
+class ProductImport(models.Model):
+    """
+    A bulk product upload (CSV or JSONL) processed in the background by products.imports.
+    """
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="product_imports", help_text="Trader who owns the imported products.")
+    file = models.FileField(storage=ImportStorage(), upload_to='products/', help_text="Uploaded CSV or JSONL file.")
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    processed_rows = models.PositiveIntegerField(default=0)
+    imported_rows = models.PositiveIntegerField(default=0)
+    failed_rows = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True, help_text="Per-row validation errors (the first IMPORT_MAX_REPORTED_ERRORS).")
+    rows_per_second = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import {self.id} by {self.user} - {self.status}"
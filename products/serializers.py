@@ -1,16 +1,68 @@
 from rest_framework import serializers
-from .models import Product, Category
+from .images import srcset
+from .models import Product, Category, ProductImport
 
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source="category.name", read_only=True)
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'title', 'description', 'price', 'stock', 'category', 'category_name', 'image', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'description', 'price', 'stock', 'category', 'category_name', 'image', 'srcset', 'created_at', 'updated_at']
         extra_kwargs = {
             'category': {'required': False},
         }
 
+    def get_srcset(self, obj):
+        """ Resized WebP and JPEG candidates of the image, keyed by format; null until they are generated """
+        return srcset(obj, self.context.get("request"))
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """ One row of a bulk import file; `category` is a category name """
+    title = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    stock = serializers.IntegerField(min_value=0, required=False, default=0)
+    category = serializers.CharField(max_length=100, required=False, allow_blank=True)
+
+class ProductStockPriceUpdateSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    stock = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if 'price' not in attrs and 'stock' not in attrs:
+            raise serializers.ValidationError("Give a price, a stock, or both.")
+        return attrs
+
+class BulkProductUpdateSerializer(serializers.Serializer):
+    updates = ProductStockPriceUpdateSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate_updates(self, updates):
+        ids = [item['id'] for item in updates]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each product may appear only once per batch.")
+        return updates
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductImport
+        fields = ['id', 'file', 'format', 'status', 'processed_rows', 'imported_rows', 'failed_rows', 'errors',
+                  'rows_per_second', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = [field for field in fields if field not in ('file', 'format')]
+        extra_kwargs = {
+            'file': {'write_only': True},
+            'format': {'required': False},
+        }
+
+    def validate(self, attrs):
+        if not attrs.get('format'):
+            extension = attrs['file'].name.rsplit('.', 1)[-1].lower()
+            if extension not in dict(ProductImport.FORMAT_CHOICES):
+                raise serializers.ValidationError({"format": "Pass csv or jsonl, or upload a .csv/.jsonl file."})
+            attrs['format'] = extension
+        return attrs
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from products.cache import invalidate_categories, invalidate_products
+from products.models import Product, Category
+from products.tasks import generate_image_variants
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    invalidate_products([instance.pk], listings=True)
+
+
+@receiver(post_save, sender=Product)
+def queue_image_variants(sender, instance, **kwargs):
+    """ Resize a new or replaced image in the background once the upload is committed """
+    if instance.image and (instance.image_variants or {}).get("source") != instance.image.name:
+        transaction.on_commit(lambda: generate_image_variants.delay(instance.pk))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    invalidate_categories()
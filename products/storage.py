@@ -2,4 +2,10 @@ from storages.backends.s3boto3 import S3Boto3Storage
 
 class ProductStorage(S3Boto3Storage):
     location = "media"
-    file_overwrite = False
\ No newline at end of file
+    file_overwrite = False
+
+class ImportStorage(S3Boto3Storage):
+    """ Bulk import files are private: served only through signed URLs """
+    location = "imports"
+    file_overwrite = False
+    querystring_auth = True
@@ -0,0 +1,20 @@
+from celery import shared_task
+
+from products.images import process_product_image
+from products.imports import run_import
+
+
+@shared_task
+def generate_image_variants(product_id):
+    """ Render thumbnail and WebP variants of a freshly uploaded product image """
+    written = process_product_image(product_id)
+    return f"Wrote {written} image variants for product {product_id}"
+
+
+@shared_task
+def run_product_import(import_id):
+    """ Process an uploaded bulk import file; progress is recorded on the ProductImport row """
+    report = run_import(import_id)
+    if report is None:
+        return f"Import {import_id} was already processed"
+    return f"Imported {report['imported']} of {report['processed']} rows ({report['rows_per_second']} rows/s)"
@@ -1,3 +1,325 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from botocore.stub import Stubber
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from products.images import process_product_image
+from products.imports import import_products, run_import
+from products.models import Category, Product, ProductImport
+from trading_app.s3 import get_s3_client
+from users.models import User
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CatalogCacheTests(APITestCase):
+    """ Cached catalog payloads are served without queries and dropped by writes """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.category = Category.objects.create(name="Metals")
+        cls.product = Product.objects.create(user=cls.trader, title="Gold bar", price=100, stock=10, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_is_cached_until_the_product_changes(self):
+        url = f"/api/products/{self.product.id}/"
+        self.assertEqual(self.client.get(url).data["stock"], 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data["stock"], 10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.reduce_stock(3)
+        self.assertEqual(self.client.get(url).data["stock"], 7)
+
+    def test_category_rename_invalidates_product_payloads(self):
+        url = f"/api/products/{self.product.id}/"
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Precious metals"
+            self.category.save()
+        self.assertEqual(self.client.get(url).data["category_name"], "Precious metals")
+
+    def test_unknown_products_get_no_version_key(self):
+        for pk in ("999999", "not-a-number"):
+            self.assertEqual(self.client.get(f"/api/products/{pk}/").status_code, 404)
+            self.assertIsNone(cache.get(f"catalog:product:{pk}:version"))
+        self.client.get(f"/api/products/{self.product.id}/")
+        self.assertIsNotNone(cache.get(f"catalog:product:{self.product.id}:version"))
+
+    def test_list_pages_are_cached_per_query(self):
+        self.client.get("/api/products/?page_size=5")
+        with self.assertNumQueries(0):
+            self.client.get("/api/products/?page_size=5")
+        with self.assertNumQueries(2):
+            self.client.get("/api/products/?page_size=6")
+
+    def test_conditional_get_revalidates_with_etag(self):
+        url = f"/api/products/{self.product.id}/"
+        response = self.client.get(url)
+        # Category renames and image variants do not touch updated_at, so it cannot validate the payload
+        self.assertNotIn("Last-Modified", response)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        listing = self.client.get("/api/products/")
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=listing["ETag"]).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.reduce_stock(1)
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=listing["ETag"]).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+        categories = self.client.get("/api/products/categories/")
+        with self.assertNumQueries(0):
+            revalidated = self.client.get("/api/products/categories/", HTTP_IF_NONE_MATCH=categories["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ProductSearchTests(APITestCase):
+    """ ?search= goes through full-text and trigram matching; autocomplete walks the title prefix index """
+
+    @classmethod
+    def setUpTestData(cls):
+        trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.gold = Product.objects.create(user=trader, title="Gold bar", description="Minted in Almaty", price=100)
+        cls.ring = Product.objects.create(user=trader, title="Silver ring", description="Polished", price=50)
+
+    def search(self, term):
+        response = self.client.get("/api/products/", {"search": term})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [product["id"] for product in response.data["results"]]
+
+    def test_matches_title_and_description_words(self):
+        self.assertEqual(self.search("gold"), [self.gold.id])
+        self.assertEqual(self.search("almaty"), [self.gold.id])
+
+    def test_tolerates_typos(self):
+        self.assertEqual(self.search("silvr ring"), [self.ring.id])
+
+    def test_autocomplete_returns_titles_for_prefix(self):
+        response = self.client.get("/api/products/autocomplete/", {"q": "  SIL "})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data, {"query": "sil", "results": ["Silver ring"]})
+        with self.assertNumQueries(0):
+            self.client.get("/api/products/autocomplete/", {"q": "sil"})
+
+    def test_facets_count_categories_and_price_buckets_for_the_filter_set(self):
+        metals = Category.objects.create(name="Metals")
+        Product.objects.filter(id=self.gold.id).update(category=metals)
+        Product.objects.create(user=self.gold.user, title="Gold coin", price=300, category=metals)
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            facets = self.client.get("/api/products/facets/", {"buckets": 2}).data
+        self.assertEqual(facets["total"], 3)
+        self.assertEqual(facets["categories"], [
+            {"id": metals.id, "name": "Metals", "count": 2}, {"id": None, "name": None, "count": 1},
+        ])
+        self.assertEqual(facets["price"]["min"], "50.00")
+        self.assertEqual([bucket["count"] for bucket in facets["price"]["buckets"]], [2, 1])
+
+        self.assertEqual(self.client.get("/api/products/facets/", {"search": "gold"}).data["total"], 2)
+        with self.assertNumQueries(0):
+            self.client.get("/api/products/facets/", {"buckets": 2, "page": 3})
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ListingPaginationTests(APITestCase):
+    """ Category listings and my_listings are paginated, or streamed whole as NDJSON """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.category = Category.objects.create(name="Metals")
+        Product.objects.bulk_create(
+            Product(user=cls.trader, title=f"Lot {n}", price=10 + n, category=cls.category) for n in range(25)
+        )
+
+    def test_category_listing_is_paginated(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/products/by-category/{self.category.id}/")
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(response.data["results"][0]["category_name"], "Metals")
+
+    def test_ndjson_streams_every_row(self):
+        self.client.force_authenticate(self.trader)
+        response = self.client.get("/api/products/my_listings/", {"format": "ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual({row["category_name"] for row in rows}, {"Metals"})
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ProductImageVariantTests(APITestCase):
+    """ Uploaded images get resized WebP/JPEG variants next to the original, exposed as srcset """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = FileSystemStorage(location=directory.name, base_url="/media/")
+        patcher = mock.patch.object(Product._meta.get_field("image"), "storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        upload = io.BytesIO()
+        Image.new("RGB", (800, 400), "gold").save(upload, "JPEG")
+        self.product = Product.objects.create(user=trader, title="Gold bar", price=100)
+        self.product.image.save("bar.jpg", ContentFile(upload.getvalue()))
+
+    def test_variants_are_generated_once_and_listed_in_srcset(self):
+        url = f"/api/products/{self.product.id}/"
+        self.assertIsNone(self.client.get(url).data["srcset"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_product_image(self.product.id), 6)
+        self.assertEqual(process_product_image(self.product.id), 0)
+
+        srcset = self.client.get(url).data["srcset"]
+        self.assertEqual(srcset["webp"], ", ".join(
+            f"http://testserver/media/products/bar_{width}w.webp {width}w" for width in (160, 320, 640)
+        ))
+        with self.storage.open("products/bar_320w.webp") as variant:
+            self.assertEqual(Image.open(variant).size, (320, 160))
+
+
+class DirectUploadTests(APITestCase):
+    """ Product images can be uploaded straight to the bucket with a presigned POST and confirmed afterwards """
+
+    def setUp(self):
+        self.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        self.product = Product.objects.create(user=self.trader, title="Gold bar", price=100)
+        self.client.force_authenticate(self.trader)
+        self.s3 = get_s3_client()
+        patcher = mock.patch("trading_app.uploads.get_s3_client", return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_issue_and_confirm_upload(self):
+        response = self.client.post(f"/api/products/{self.product.id}/image/upload-url/", {"content_type": "image/png"})
+        self.assertEqual(response.status_code, 200, response.content)
+        key = response.data["fields"]["key"]
+        self.assertRegex(key, r"^media/products/[0-9a-f]{32}\.png$")
+        self.assertEqual(response.data["fields"]["Content-Type"], "image/png")
+
+        with Stubber(self.s3) as stubber:
+            stubber.add_response(
+                "head_object", {"ContentLength": 2048, "ContentType": "image/png"},
+                {"Bucket": self.product.image.storage.bucket_name, "Key": key},
+            )
+            confirmed = self.client.post(
+                f"/api/products/{self.product.id}/image/confirm/", {"token": response.data["token"]}
+            )
+        self.assertEqual(confirmed.status_code, 200, confirmed.content)
+        self.product.refresh_from_db()
+        self.assertEqual(f"media/{self.product.image.name}", key)
+
+    def test_rejects_other_content_types_and_foreign_tokens(self):
+        url = f"/api/products/{self.product.id}/image/upload-url/"
+        self.assertEqual(self.client.post(url, {"content_type": "text/html"}).status_code, 400)
+
+        token = self.client.post(url, {"content_type": "image/jpeg"}).data["token"]
+        other = Product.objects.create(user=self.trader, title="Silver ring", price=50)
+        response = self.client.post(f"/api/products/{other.id}/image/confirm/", {"token": token})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}, IMPORT_CHUNK_SIZE=2)
+class ProductImportTests(APITestCase):
+    """ Bulk imports validate rows in chunks, resolve category names and report per-row errors """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(ProductImport._meta.get_field("file"), "storage", FileSystemStorage(location=directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        self.category = Category.objects.create(name="Metals")
+        self.client.force_authenticate(self.trader)
+
+    def test_csv_import_reports_progress_and_row_errors(self):
+        csv = (
+            "title,description,price,stock,category\n"
+            "Gold bar,Minted,100.50,3,metals\n"
+            "Silver ring,,50,,\n"
+            "Broken,,abc,1,\n"
+            "Copper coin,,5,1,Coins\n"
+        )
+        response = self.client.post("/api/products/imports/", {"file": SimpleUploadedFile("stock.csv", csv.encode())})
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual((response.data["format"], response.data["status"]), ("csv", "pending"))
+
+        run_import(response.data["id"])
+        self.assertIsNone(run_import(response.data["id"]))
+
+        result = self.client.get(f"/api/products/imports/{response.data['id']}/").data
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual((result["processed_rows"], result["imported_rows"], result["failed_rows"]), (4, 2, 2))
+        self.assertEqual([error["line"] for error in result["errors"]], [4, 5])
+        self.assertEqual(
+            sorted(Product.objects.filter(user=self.trader).values_list("title", "stock", "category_id")),
+            [("Gold bar", 3, self.category.id), ("Silver ring", 0, None)],
+        )
+
+    @override_settings(IMPORT_CHUNK_SIZE=1)
+    def test_failed_import_still_invalidates_the_chunks_it_committed(self):
+        def rows(stream, format):
+            yield 2, {"title": "Gold bar", "price": "100"}
+            raise OSError("Connection reset")
+
+        with mock.patch("products.imports.read_rows", rows), \
+                mock.patch("products.imports.invalidate_products") as invalidate:
+            with self.assertRaises(OSError):
+                import_products(self.trader, io.BytesIO(), "jsonl")
+
+        self.assertTrue(Product.objects.filter(user=self.trader, title="Gold bar").exists())
+        invalidate.assert_called_once_with([], listings=True)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class BulkUpdateTests(APITestCase):
+    """ Bulk price/stock updates run as one statement and only touch the caller's products """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        other = User.objects.create_user(username="other", password="pass12345", role="trader")
+        cls.gold = Product.objects.create(user=cls.trader, title="Gold bar", price=100, stock=1)
+        cls.ring = Product.objects.create(user=cls.trader, title="Silver ring", price=50, stock=2)
+        cls.foreign = Product.objects.create(user=other, title="Copper coin", price=5, stock=3)
+
+    def test_updates_own_products_in_one_query(self):
+        self.client.force_authenticate(self.trader)
+        cache.clear()
+        self.client.get(f"/api/products/{self.gold.id}/")
+        updates = [{"id": self.gold.id, "price": "120.00"}, {"id": self.ring.id, "stock": 9}, {"id": self.foreign.id, "stock": 0}]
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                response = self.client.post("/api/products/bulk-update/", {"updates": updates}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["skipped"], [self.foreign.id])
+        self.assertEqual(
+            sorted(Product.objects.values_list("id", "price", "stock")),
+            [(self.gold.id, 120, 1), (self.ring.id, 50, 9), (self.foreign.id, 5, 3)],
+        )
+        self.assertEqual(self.client.get(f"/api/products/{self.gold.id}/").data["price"], "120.00")
+
+    def test_rejects_duplicate_ids(self):
+        self.client.force_authenticate(self.trader)
+        updates = [{"id": self.gold.id, "stock": 1}, {"id": self.gold.id, "stock": 2}]
+        response = self.client.post("/api/products/bulk-update/", {"updates": updates}, format="json")
+        self.assertEqual(response.status_code, 400)
@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, CategoryViewSet
+from .views import ProductViewSet, CategoryViewSet, ProductImportViewSet
 
 
 router = DefaultRouter()
+# Registered before the catch-all product routes so "imports" is not read as a product id
+router.register(r'imports', ProductImportViewSet, basename='product-imports')
 router.register(r'', ProductViewSet, basename='products')
 
 urlpatterns = [
@@ -1,4 +1,6 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, mixins, status
+from rest_framework.parsers import MultiPartParser
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -6,10 +8,26 @@ from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from products.models import Product, Category
-from products.serializers import ProductSerializer, CategorySerializer
-from trading_app.permissions import IsTrader, IsAdminOrReadOnly, IsOwnerOrAdmin
+from products import cache as catalog_cache
+from products.facets import compute_facets
+from products.models import Product, Category, ProductImport
+from products.bulk import bulk_update_price_stock
+from products.serializers import ProductSerializer, CategorySerializer, ProductImportSerializer, BulkProductUpdateSerializer
+from products.tasks import run_product_import
+from trading_app.conditional import etag_for, not_modified, with_validators
+from trading_app.search import FullTextSearchFilter
+from trading_app.permissions import IsAdmin, IsTrader, IsAdminOrReadOnly, IsOwnerOrAdmin
+from trading_app import uploads
+from trading_app.streaming import NDJSONRenderer, stream_ndjson, wants_ndjson
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+from django.db.models.functions import Collate, Upper
+
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 20
+FACET_DEFAULT_BUCKETS = 10
+FACET_MAX_BUCKETS = 50
+LISTING_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
 
 
 class ProductPagination(PageNumberPagination):
@@ -23,49 +41,216 @@ class ProductViewSet(viewsets.ModelViewSet):
     - Traders can create, update, and delete their own products.
     - Customers can only view available products.
     """
-    queryset = Product.objects.all().order_by('-created_at')
+    queryset = Product.objects.select_related('category').order_by('-created_at')
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'price']
-    search_fields = ['title', 'description']
+    search_vector_field = 'search_vector'
+    trigram_fields = ['title']
     pagination_class = ProductPagination
 
     def get_permissions(self):
         """ Set RBAC for product management """
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'my_listings']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'my_listings', 'image_upload_url', 'image_confirm', 'bulk_update']:
             return [IsTrader(), IsOwnerOrAdmin()]
+        if self.action == 'cache_stats':
+            return [IsAdmin()]
         return [permissions.AllowAny()]
 
     def perform_create(self, serializer):
         """ Assign trader as the owner of the product """
         serializer.save(user=self.request.user)
 
+    def cached(self, key, build_response):
+        """
+        Serves a read-only payload through the catalog cache; only 200 responses are stored.
+        The ETag is derived from the cache key, which embeds the catalog versions. There is no
+        Last-Modified: category renames and image variants change a payload without its updated_at.
+        """
+        response = None
+
+        def build():
+            nonlocal response
+            response = build_response()
+            return response.data, response.status_code == 200
+
+        data = catalog_cache.get_or_build(key, build)
+        response = response if response is not None else Response(data)
+        if response.status_code != 200:
+            return response
+        return self.conditional(key, response)
+
+    def conditional(self, key, response):
+        etag = etag_for(key)
+        return not_modified(self.request, etag) or with_validators(response, etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(
+            catalog_cache.list_key(request, "list"), lambda: super(ProductViewSet, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs["pk"]
+        key = catalog_cache.detail_key(pk, exists=lambda: pk.isdigit() and self.get_queryset().filter(pk=pk).exists())
+        if key is None:
+            # Unknown ids are answered uncached, so they never get a version key of their own
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached(key, lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs))
+
+    def listing(self, queryset):
+        """ A page of `queryset`, or every row as NDJSON when the client asked for ?format=ndjson """
+        if wants_ndjson(self.request):
+            return stream_ndjson(queryset, self.get_serializer_class(), self.get_serializer_context())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @swagger_auto_schema(
         method='get',
-        operation_description="Retrieve all products in a category",
-        responses={200: openapi.Response("List of products in the category")}
+        operation_description="Retrieve products in a category, paginated (?format=ndjson streams them all)",
+        responses={200: openapi.Response("Page of products in the category")}
     )
-    @action(detail=False, methods=['get'], url_path='by-category/(?P<category_id>[^/.]+)')
+    @action(detail=False, methods=['get'], url_path='by-category/(?P<category_id>[^/.]+)', renderer_classes=LISTING_RENDERERS)
     def get_by_category(self, request, category_id=None):
         """ Get products filtered by category """
+        if wants_ndjson(request):
+            return self.build_category_listing(category_id)
+        return self.cached(catalog_cache.list_key(request, "category"), lambda: self.build_category_listing(category_id))
+
+    def build_category_listing(self, category_id):
         category = get_object_or_404(Category, id=category_id)
-        products = Product.objects.filter(category=category)
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return self.listing(self.get_queryset().filter(category=category).order_by('-created_at', '-id'))
+
+    @swagger_auto_schema(
+        method='get',
+        operation_description="Title completions for a search-as-you-type prefix",
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Typed prefix"),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f"Completions to return (max {AUTOCOMPLETE_MAX_LIMIT})"),
+        ],
+        responses={200: openapi.Response("Matching product titles")}
+    )
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """ Top product titles starting with ?q=, served from the prefix index and cached per prefix """
+        prefix = " ".join(request.query_params.get("q", "").split())[:100].lower()
+        try:
+            limit = min(max(int(request.query_params.get("limit", AUTOCOMPLETE_DEFAULT_LIMIT)), 1), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            limit = AUTOCOMPLETE_DEFAULT_LIMIT
+        if not prefix:
+            return Response({"query": prefix, "results": []})
+
+        def build():
+            # Walks product_title_prefix_idx in order; over-fetch a little so duplicate titles don't starve the list
+            titles = (
+                Product.objects.annotate(title_key=Collate(Upper("title"), "C"))
+                .filter(title_key__startswith=prefix.upper())
+                .order_by("title_key")
+                .values_list("title", flat=True)[:limit * 3]
+            )
+            return {"query": prefix, "results": list(dict.fromkeys(titles))[:limit]}, True
+
+        key = catalog_cache.autocomplete_key(prefix, limit)
+        return self.conditional(key, Response(catalog_cache.get_or_build(key, build)))
+
+    @swagger_auto_schema(
+        method='get',
+        operation_description="Category counts and a price histogram for the current ?category=, ?price= and ?search= filters",
+        manual_parameters=[
+            openapi.Parameter('buckets', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f"Price histogram buckets (max {FACET_MAX_BUCKETS})"),
+        ],
+        responses={200: openapi.Response("Facet counts")}
+    )
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """ Sidebar facets for the same filter set as the product list, in one aggregate query, cached per filter set """
+        try:
+            buckets = min(max(int(request.query_params.get("buckets", FACET_DEFAULT_BUCKETS)), 1), FACET_MAX_BUCKETS)
+        except ValueError:
+            buckets = FACET_DEFAULT_BUCKETS
+        # Only the parameters that change the matching rows; ordering and paging don't affect the counts
+        filter_set = {name: request.query_params.get(name, "").strip() for name in self.filterset_fields}
+        filter_set["search"] = " ".join(FullTextSearchFilter().get_search_terms(request)).lower()
+
+        def build():
+            return compute_facets(self.filter_queryset(self.get_queryset()), buckets), True
+
+        key = catalog_cache.facets_key(filter_set, buckets)
+        return self.conditional(key, Response(catalog_cache.get_or_build(key, build)))
+
+    @swagger_auto_schema(
+        method='get',
+        operation_description="Catalog cache hit ratio and rebuild latency (admins only)",
+        responses={200: openapi.Response("Catalog cache counters")}
+    )
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdmin])
+    def cache_stats(self, request):
+        """ Catalog cache metrics, aggregated over all workers """
+        return Response(catalog_cache.stats())
+
+    @swagger_auto_schema(
+        method='post',
+        operation_description="Presigned POST for uploading the product image straight to storage",
+        request_body=uploads.UPLOAD_URL_REQUEST,
+        responses={200: openapi.Response("Upload URL, form fields and confirmation token")}
+    )
+    @action(detail=True, methods=['post'], url_path='image/upload-url')
+    def image_upload_url(self, request, pk=None):
+        """ Issue a short-lived direct upload for the product image """
+        product = self.get_object()
+        try:
+            return Response(uploads.issue(product, "image", request.data.get("content_type"), request.user))
+        except uploads.UploadError as e:
+            return Response({"error": str(e)}, status=400)
+
+    @swagger_auto_schema(
+        method='post',
+        operation_description="Attach a directly uploaded image to the product",
+        request_body=uploads.UPLOAD_CONFIRM_REQUEST,
+        responses={200: ProductSerializer}
+    )
+    @action(detail=True, methods=['post'], url_path='image/confirm')
+    def image_confirm(self, request, pk=None):
+        """ Point the product image at the uploaded object once it exists in storage """
+        product = self.get_object()
+        try:
+            uploads.confirm(product, "image", request.data.get("token", ""), request.user)
+        except uploads.UploadError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(self.get_serializer(product).data)
+
+    @swagger_auto_schema(
+        method='post',
+        operation_description="Set price and/or stock of many of your products in one statement",
+        request_body=BulkProductUpdateSerializer,
+        responses={200: openapi.Response("Updated rows, and the ids that were skipped (not found or not yours)")}
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """ Bulk repricing/restocking of the trader's own products """
+        serializer = BulkProductUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updates = serializer.validated_data["updates"]
+        rows = bulk_update_price_stock(updates, owner=request.user)
+        updated = {row["id"] for row in rows}
+        return Response({"updated": rows, "skipped": [item["id"] for item in updates if item["id"] not in updated]})
 
     @swagger_auto_schema(
         method="get",
-        operation_description="Retrieve products created by the authenticated user",
+        operation_description="Retrieve products created by the authenticated user, paginated (?format=ndjson streams them all)",
         responses={200: ProductSerializer(many=True)}
     )
-    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated], renderer_classes=LISTING_RENDERERS)
     def my_listings(self, request):
         """ Get listings specific to the authenticated trader """
         user = request.user
         if not user.is_trader():
             return Response({"error": "Only traders can view their listings"}, status=403)
 
-        queryset = Product.objects.filter(user=user).order_by("-created_at")
+        queryset = self.get_queryset().filter(user=user).order_by("-created_at", "-id")
 
         # Apply filtering dynamically
         category = request.query_params.get("category")
@@ -79,8 +264,36 @@ class ProductViewSet(viewsets.ModelViewSet):
         if max_price:
             queryset = queryset.filter(price__lte=max_price)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.listing(queryset)
+
+class ProductImportViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Bulk product imports.
+    - Traders upload a CSV or JSONL file; it is processed by a Celery task.
+    - Poll the import to follow progress and read per-row errors.
+    """
+    serializer_class = ProductImportSerializer
+    permission_classes = [IsTrader]
+    parser_classes = [MultiPartParser]
+    pagination_class = ProductPagination
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ProductImport.objects.none()
+        return ProductImport.objects.filter(user=self.request.user).order_by('-created_at')
+
+    @swagger_auto_schema(
+        operation_description="Upload a CSV or JSONL file of products (title, description, price, stock, category name)",
+        responses={202: ProductImportSerializer}
+    )
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_import = serializer.save(user=request.user)
+        transaction.on_commit(lambda: run_product_import.delay(product_import.id))
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
 
 class CategoryViewSet(viewsets.ModelViewSet):
     """
@@ -100,4 +313,10 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """ Only return active categories """
-        return Category.objects.all().order_by("name")
\ No newline at end of file
+        return Category.objects.all().order_by("name")
+
+    def list(self, request, *args, **kwargs):
+        """ Categories change rarely: revalidate against the categories version without querying """
+        version, = catalog_cache.versions(catalog_cache.CATEGORIES_VERSION)
+        etag = etag_for("categories", version, request.get_full_path())
+        return not_modified(request, etag) or with_validators(super().list(request, *args, **kwargs), etag)
\ No newline at end of file
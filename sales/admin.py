@@ -1,5 +1,5 @@
 from django.contrib import admin
-from sales.models import SalesOrder, Payment, Invoice
+from sales.models import SalesOrder, Payment, Invoice, StripeReference
 
 @admin.register(SalesOrder)
 class SalesOrderAdmin(admin.ModelAdmin):
@@ -14,4 +14,9 @@ class PaymentAdmin(admin.ModelAdmin):
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
     list_display = ('id', 'sales_order', 'issued_at', 'pdf_file')
-    search_fields = ('sales_order__order__user__username',)
\ No newline at end of file
+    search_fields = ('sales_order__order__user__username',)
+
+@admin.register(StripeReference)
+class StripeReferenceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'reference', 'sales_order', 'created_at')
+    search_fields = ('reference',)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales'
+
+    def ready(self):
+        from django.conf import settings
+        import stripe
+
+        if settings.STRIPE_API_BASE:
+            stripe.api_base = settings.STRIPE_API_BASE
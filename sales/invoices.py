@@ -0,0 +1,193 @@
+"""
+Invoice PDF rendering.
+
+Styles, the order table style and the column layout are built once per
+process (at import) and shared by every render. Rendering is split from the
+database and storage work:
+  - invoice_context() snapshots everything an invoice shows into a plain
+    dict, which can be pickled;
+  - render_invoice(context) turns it into PDF bytes without touching Django,
+    so a process pool can run it;
+  - render_invoices() loads a batch in one query, renders it across a
+    process pool and uploads the PDFs from a thread pool.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from notifications.signals import bulk_notify
+from sales.models import Invoice, SalesOrder
+
+logger = logging.getLogger(__name__)
+
+STYLES = getSampleStyleSheet()
+ORDER_TABLE_STYLE = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+    ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
+    ("GRID", (0, 0), (-1, -1), 1, colors.black),
+])
+ORDER_TABLE_COLUMNS = [2 * inch, inch, inch, inch]
+ORDER_TABLE_HEADER = ["Item", "Quantity", "Unit Price", "Total Price"]
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def invoice_context(invoice, sales_order):
+    """ Everything the PDF shows, as plain (picklable) values """
+    order, user, product = sales_order.order, sales_order.order.user, sales_order.order.product
+    payment = getattr(sales_order, "payment", None)
+    return {
+        "invoice_id": invoice.id,
+        "sales_order_id": sales_order.id,
+        "order_id": order.id,
+        "status": sales_order.status,
+        "total_price": str(sales_order.total_price),
+        "created_at": sales_order.created_at.strftime(DATE_FORMAT),
+        "user": {"username": user.username, "email": user.email, "role": user.get_role_display()},
+        "payment": payment and {
+            "method": payment.method,
+            "status": payment.status,
+            "created_at": payment.created_at.strftime(DATE_FORMAT),
+        },
+        "product": {
+            "title": product.title,
+            "description": product.description,
+            "price": str(product.price),
+            "category": product.category.name if product.category else None,
+        },
+        "quantity": order.quantity,
+        "order_total": str(order.total_price),
+    }
+
+
+def render_invoice(context):
+    """ PDF bytes for an invoice_context() """
+    normal, heading = STYLES["Normal"], STYLES["Heading2"]
+
+    def line(label, value):
+        return Paragraph(f"{label}: {escape(str(value))}", normal)
+
+    user, payment, product = context["user"], context["payment"], context["product"]
+    elements = [
+        Paragraph("<b>INVOICE</b>", STYLES["Title"]),
+        Spacer(1, 12),
+        line("Invoice ID", context["invoice_id"]),
+        line("Order ID", context["order_id"]),
+        line("Order Status", context["status"]),
+        line("Total Price", f"{context['total_price']} KZT"),
+        line("Created At", context["created_at"]),
+        Spacer(1, 12),
+        Paragraph("<b>User Information</b>", heading),
+        line("User Name", user["username"]),
+        line("User Email", user["email"]),
+        line("User Role", user["role"]),
+        Spacer(1, 12),
+    ]
+    if payment:
+        elements += [
+            Paragraph("<b>Payment Information</b>", heading),
+            line("Payment Method", payment["method"]),
+            line("Payment Status", payment["status"]),
+            line("Payment Created At", payment["created_at"]),
+            Spacer(1, 12),
+        ]
+    elements += [
+        Paragraph("<b>Product Information</b>", heading),
+        line("Product Name", product["title"]),
+        line("Product Description", product["description"]),
+        line("Product Price", f"{product['price']} KZT"),
+    ]
+    if product["category"]:
+        elements.append(line("Product Category", product["category"]))
+    table = Table(
+        [
+            ORDER_TABLE_HEADER,
+            [product["title"], context["quantity"], f"{product['price']} KZT", f"{context['order_total']} KZT"],
+        ],
+        colWidths=ORDER_TABLE_COLUMNS,
+    )
+    table.setStyle(ORDER_TABLE_STYLE)
+    elements += [Spacer(1, 12), Paragraph("<b>Order Details</b>", heading), table, Spacer(1, 12)]
+
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4).build(elements)
+    return buffer.getvalue()
+
+
+def pdf_filename(sales_order_id):
+    return f"invoice/order_{sales_order_id}.pdf"
+
+
+def load_invoices(sales_order_ids):
+    """ [(invoice, sales_order)] for the given sales orders, creating missing Invoice rows """
+    sales_orders = list(
+        SalesOrder.objects.select_related(
+            "order", "payment", "order__user", "order__product", "order__product__category", "invoice"
+        ).filter(id__in=sales_order_ids)
+    )
+    missing = [sales_order for sales_order in sales_orders if not hasattr(sales_order, "invoice")]
+    if missing:
+        Invoice.objects.bulk_create([Invoice(sales_order=sales_order) for sales_order in missing], ignore_conflicts=True)
+        invoices = Invoice.objects.in_bulk([sales_order.id for sales_order in missing], field_name="sales_order_id")
+        for sales_order in missing:
+            sales_order.invoice = invoices[sales_order.id]
+    return [(sales_order.invoice, sales_order) for sales_order in sales_orders]
+
+
+def generate_invoice_pdf(sales_order_id):
+    """ Renders and stores one invoice; returns the Invoice """
+    [(invoice, sales_order)] = load_invoices([sales_order_id])
+    invoice.pdf_file.save(pdf_filename(sales_order.id), ContentFile(render_invoice(invoice_context(invoice, sales_order))), save=True)
+    return invoice
+
+
+def render_invoices(sales_order_ids, workers=None):
+    """
+    Renders and stores a batch of invoices. PDFs are rendered across `workers`
+    processes (INVOICE_RENDER_WORKERS by default) and uploaded concurrently by
+    INVOICE_UPLOAD_THREADS threads, then each customer is notified. Returns the number of invoices stored.
+    """
+    pairs = load_invoices(sales_order_ids)
+    if not pairs:
+        return 0
+    contexts = [invoice_context(invoice, sales_order) for invoice, sales_order in pairs]
+    workers = workers or settings.INVOICE_RENDER_WORKERS
+
+    def upload(pair, pdf):
+        invoice, sales_order = pair
+        invoice.pdf_file.save(pdf_filename(sales_order.id), ContentFile(pdf), save=False)
+        return invoice
+
+    with ThreadPoolExecutor(max_workers=settings.INVOICE_UPLOAD_THREADS) as uploads:
+        # Daemonic processes (e.g. prefork Celery children) can't start a pool of their own
+        if workers > 1 and len(contexts) > 1 and not multiprocessing.current_process().daemon:
+            # Uploads start as soon as each PDF comes back, while the pool keeps rendering
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+                rendered = pool.map(render_invoice, contexts, chunksize=8)
+                futures = [uploads.submit(upload, pair, pdf) for pair, pdf in zip(pairs, rendered)]
+        else:
+            futures = [uploads.submit(upload, pair, render_invoice(context)) for pair, context in zip(pairs, contexts)]
+        invoices = [future.result() for future in futures]
+
+    Invoice.objects.bulk_update(invoices, ["pdf_file"])
+    # bulk_update skips post_save, so notify the customers here like notify_customer_on_invoice does
+    bulk_notify([
+        (sales_order.order.user_id, f"Invoice for your order {sales_order.order_id} is now available.")
+        for _, sales_order in pairs
+    ])
+    logger.info("Rendered %s invoices with %s workers", len(invoices), workers)
+    return len(invoices)
@@ -0,0 +1,72 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from reportlab.lib.styles import getSampleStyleSheet
+
+from sales import invoices
+
+
+def context(n):
+    return {
+        "invoice_id": n,
+        "sales_order_id": n,
+        "order_id": n,
+        "status": "paid",
+        "total_price": f"{100 + n % 900}.00",
+        "created_at": "2026-01-01 12:00:00",
+        "user": {"username": f"customer{n}", "email": f"customer{n}@example.com", "role": "Customer"},
+        "payment": {"method": "stripe", "status": "succeeded", "created_at": "2026-01-01 12:05:00"},
+        "product": {
+            "title": f"Gold bar #{n}",
+            "description": "Minted 999.9 fine gold bar <1 oz> & certificate",
+            "price": f"{100 + n % 900}.00",
+            "category": "Metals",
+        },
+        "quantity": 1 + n % 5,
+        "order_total": f"{(100 + n % 900) * (1 + n % 5)}.00",
+    }
+
+
+def render_rebuilding_styles(context):
+    """ The previous behaviour: a fresh stylesheet for every invoice """
+    invoices.STYLES = getSampleStyleSheet()
+    return invoices.render_invoice(context)
+
+
+class Command(BaseCommand):
+    help = "Render synthetic invoices (no database or S3) and report invoices/s for one process versus a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--invoices", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        contexts = [context(n) for n in range(options["invoices"])]
+        invoices.render_invoice(contexts[0])  # warm up fonts and imports
+
+        styles = invoices.STYLES
+        try:
+            self.report("1 process, styles per invoice", contexts, lambda: [render_rebuilding_styles(c) for c in contexts])
+        finally:
+            invoices.STYLES = styles
+        self.report("1 process, shared styles", contexts, lambda: [invoices.render_invoice(c) for c in contexts])
+
+        workers = options["workers"]
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            list(pool.map(invoices.render_invoice, contexts[:workers]))  # start the workers outside the timing
+            self.report(
+                f"pool of {workers} processes", contexts,
+                lambda: list(pool.map(invoices.render_invoice, contexts, chunksize=8)),
+            )
+
+    def report(self, label, contexts, run):
+        started = time.perf_counter()
+        pdfs = run()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label:<32} {len(pdfs) / elapsed:8.1f} invoices/s   "
+            f"({elapsed:.2f}s, {sum(map(len, pdfs)) / len(pdfs) / 1024:.1f} KiB avg)"
+        )
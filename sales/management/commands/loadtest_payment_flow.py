@@ -0,0 +1,188 @@
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from products.models import Product
+from sales.models import Invoice, Payment, SalesOrder
+from sales.stripe_stub import StripeStub
+from trading.models import Order
+from users.models import User
+from webhooks.models import StripeEvent
+
+POLL_INTERVAL = 0.05
+STAGES = ["order", "approve", "payment session", "checkout", "webhook -> paid", "invoice"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class StageFailed(Exception):
+    def __init__(self, stage, detail):
+        super().__init__(f"{stage}: {detail}")
+        self.stage = stage
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive order -> approve -> pay -> webhook -> invoice end to end against a running app and report "
+        "latency percentiles per stage. The app must use the Stripe stub (STRIPE_API_BASE) and have a Celery "
+        "worker; --stub starts the stub in this process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000", help="The running app.")
+        parser.add_argument("--flows", type=int, default=50, help="Orders taken through the whole flow.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Flows in flight at once.")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for each asynchronous stage.")
+        parser.add_argument("--stub", action="store_true", help="Run the Stripe stub in this process.")
+        parser.add_argument("--stub-host", default="127.0.0.1")
+        parser.add_argument("--stub-port", type=int, default=12111)
+        parser.add_argument("--rate", type=float, default=50.0, help="Stub webhook events per second at most.")
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Stub API latency.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated users, products and orders.")
+
+    def handle(self, *args, **options):
+        self.base_url = options["base_url"].rstrip("/")
+        self.timeout = options["timeout"]
+        try:
+            requests.get(f"{self.base_url}/api/", timeout=5)
+        except requests.RequestException as e:
+            raise CommandError(f"The app is not reachable at {self.base_url}: {e}")
+
+        stub = None
+        if options["stub"]:
+            stub = StripeStub(
+                f"{self.base_url}/api/webhooks/stripe/",
+                settings.STRIPE_WEBHOOK_SECRET,
+                host=options["stub_host"],
+                port=options["stub_port"],
+                rate=options["rate"],
+                latency=options["latency_ms"] / 1000,
+            ).start()
+            self.stdout.write(f"Stripe stub on {stub.url} (the app needs STRIPE_API_BASE={stub.url})")
+
+        tag = uuid.uuid4().hex[:8]
+        self.trader = User.objects.create_user(username=f"loadtest_pay_{tag}_t", role="trader")
+        self.customer = User.objects.create_user(username=f"loadtest_pay_{tag}_c", role="customer")
+        self.product = Product.objects.create(
+            user=self.trader, title=f"Load test item {tag}", price=1000, stock=options["flows"] + 10
+        )
+        self.tokens = {user: str(AccessToken.for_user(user)) for user in (self.trader, self.customer)}
+        self.http = threading.local()
+
+        timings, failures, totals = defaultdict(list), defaultdict(int), []
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                for result in pool.map(lambda _: self.flow(), range(options["flows"])):
+                    for stage, ms in result["timings"].items():
+                        timings[stage].append(ms)
+                    if result["failed"]:
+                        failures[result["failed"].stage] += 1
+                        self.stderr.write(str(result["failed"]))
+                    else:
+                        totals.append(sum(result["timings"].values()))
+            elapsed = time.perf_counter() - started
+            self.report(options, timings, failures, totals, elapsed, stub)
+        finally:
+            if stub:
+                stub.stop()
+            if not options["keep"]:
+                order_ids = list(Order.objects.filter(user=self.customer).values_list("id", flat=True))
+                StripeEvent.objects.filter(
+                    sales_order_id__in=SalesOrder.objects.filter(order_id__in=order_ids).values("id")
+                ).delete()
+                # Move the orders out of pending/approved so the cancellation signal stays quiet on cleanup
+                Order.objects.filter(id__in=order_ids).update(status="canceled")
+                User.objects.filter(username__startswith=f"loadtest_pay_{tag}_").delete()
+
+    def session(self, user):
+        if not hasattr(self.http, "sessions"):
+            self.http.sessions = {}
+        if user not in self.http.sessions:
+            session = requests.Session()
+            session.headers["Authorization"] = f"Bearer {self.tokens[user]}"
+            self.http.sessions[user] = session
+        return self.http.sessions[user]
+
+    def call(self, stage, user, method, path, expected, **kwargs):
+        response = self.session(user).request(method, f"{self.base_url}{path}", timeout=30, **kwargs)
+        if response.status_code != expected:
+            raise StageFailed(stage, f"HTTP {response.status_code} {response.text[:200]}")
+        return response.json()
+
+    def wait_for(self, stage, condition):
+        deadline = time.monotonic() + self.timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                raise StageFailed(stage, f"not done after {self.timeout:g}s")
+            time.sleep(POLL_INTERVAL)
+
+    def flow(self):
+        """ One order through every stage; returns {"timings": {stage: ms}, "failed": StageFailed or None} """
+        timings = {}
+
+        def timed(stage, step):
+            started = time.perf_counter()
+            result = step()
+            timings[stage] = (time.perf_counter() - started) * 1000
+            return result
+
+        try:
+            order = timed("order", lambda: self.call(
+                "order", self.customer, "POST", "/api/trading/orders/", 201,
+                json={"product": self.product.id, "quantity": 1},
+            ))
+            timed("approve", lambda: self.call(
+                "approve", self.trader, "POST", f"/api/trading/orders/{order['id']}/approve/", 200,
+            ))
+            session = timed("payment session", lambda: self.call(
+                "payment session", self.customer, "POST", "/api/sales/sales-orders/create_payment_session/", 200,
+                json={"orderId": order["id"]},
+            ))
+            timed("checkout", lambda: requests.get(session["checkout_url"], timeout=30).raise_for_status())
+            # Asynchronous from here on: webhook delivery, the Celery consumer, then invoice rendering
+            timed("webhook -> paid", lambda: self.wait_for("webhook -> paid", lambda: Payment.objects.filter(
+                sales_order__order_id=order["id"], status="succeeded"
+            ).exists()))
+            timed("invoice", lambda: self.wait_for("invoice", lambda: Invoice.objects.filter(
+                sales_order__order_id=order["id"]
+            ).exclude(pdf_file="").exclude(pdf_file=None).exists()))
+        except (StageFailed, requests.RequestException) as e:
+            stage = e.stage if isinstance(e, StageFailed) else next(s for s in STAGES if s not in timings)
+            return {"timings": timings, "failed": e if isinstance(e, StageFailed) else StageFailed(stage, e)}
+        return {"timings": timings, "failed": None}
+
+    def report(self, options, timings, failures, totals, elapsed, stub):
+        completed = len(totals)
+        self.stdout.write(
+            f"flows={options['flows']} concurrency={options['concurrency']} completed={completed} "
+            f"in {elapsed:.1f}s ({completed / elapsed:.1f} flows/s)"
+        )
+        rows = [(stage, timings[stage], failures[stage]) for stage in STAGES]
+        if stub:
+            acks = [delivery["ms"] for delivery in stub.deliveries]
+            rows.insert(4, ("webhook ack", acks, sum(1 for delivery in stub.deliveries if delivery["status"] != 200)))
+        self.stdout.write(f"{'stage':<18}{'n':>6}{'failed':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage, values, failed in rows:
+            if not values:
+                self.stdout.write(f"{stage:<18}{0:>6}{failed:>8}")
+                continue
+            self.stdout.write(
+                f"{stage:<18}{len(values):>6}{failed:>8}{percentile(values, 50):>10.1f}{percentile(values, 90):>10.1f}"
+                f"{percentile(values, 99):>10.1f}{max(values):>10.1f}"
+            )
+        if totals:
+            self.stdout.write(self.style.SUCCESS(
+                f"order to invoice: p50 {statistics.median(totals):.1f} ms, p99 {percentile(totals, 99):.1f} ms"
+            ))
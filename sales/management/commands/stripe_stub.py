@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sales.stripe_stub import StripeStub
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local Stripe stand-in (checkout sessions, PaymentIntents, signed webhooks) for load tests. "
+        "Start the app with STRIPE_API_BASE set to the printed URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument(
+            "--webhook-url", default="http://localhost:8000/api/webhooks/stripe/", help="Where webhooks are delivered."
+        )
+        parser.add_argument("--rate", type=float, default=50.0, help="Webhook events per second at most (0 = no limit).")
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every API response.")
+
+    def handle(self, *args, **options):
+        stub = StripeStub(
+            options["webhook_url"],
+            settings.STRIPE_WEBHOOK_SECRET,
+            host=options["host"],
+            port=options["port"],
+            rate=options["rate"],
+            latency=options["latency_ms"] / 1000,
+        ).start()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stripe stub on {stub.url}, delivering webhooks to {stub.webhook_url} at up to {options['rate']:g}/s"
+        ))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
+            failed = sum(1 for delivery in stub.deliveries if delivery["status"] != 200)
+            self.stdout.write(f"{len(stub.sessions)} sessions, {len(stub.deliveries)} webhooks delivered ({failed} failed)")
@@ -4,8 +4,7 @@ from .storage import InvoiceStorage
 from trading.models import Order
 from django.utils.timezone import now
 from django.core.files.storage import default_storage
-import boto3
-from botocore.exceptions import NoCredentialsError, ClientError
+from trading_app.s3 import presigned_get_url, presigned_get_urls
 
 class SalesOrder(models.Model):
     STATUS_CHOICES = [
@@ -31,6 +30,13 @@ class SalesOrder(models.Model):
         self.order.save()
         self.save()
 
+        # Imported here: trading.reservations -> notifications.signals -> sales.models
+        from trading.reservations import consume_reservations, release_reservations
+        if self.status == "paid":
+            consume_reservations([self.order_id])
+        elif self.status == "failed":
+            release_reservations([self.order_id])
+
     def __str__(self):
         return f"Sales Order {self.id} for Order {self.order.id} - {self.status}"
 
@@ -51,45 +57,25 @@ class Invoice(models.Model):
             default_storage.delete(self.pdf_file.name)
         super().delete(*args, **kwargs)
 
-    def get_download_url(self):
-        """ Generates a signed S3 URL using AWS4-HMAC-SHA256 for secure invoice download """
+    @property
+    def s3_key(self):
+        """ Object key of the PDF in the bucket """
+        key = self.pdf_file.name
+        return key if key.startswith("invoice/") else f"invoice/{key}"
 
+    def get_download_url(self):
+        """ Signed S3 URL (AWS4-HMAC-SHA256) for secure invoice download, cached per object key """
         if self.pdf_file and self.pdf_file.name:
-            s3_client = boto3.client(
-                "s3",
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_S3_REGION_NAME,
-            )
-
-            s3_key = self.pdf_file.name
-            if not s3_key.startswith("invoice/"):
-                s3_key = f"invoice/{s3_key}"
-
-            try:
-                signed_url = s3_client.generate_presigned_url(
-                    "get_object",
-                    Params={
-                        "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
-                        "Key": s3_key
-                    },
-                    ExpiresIn=600,
-                    HttpMethod="GET",
-                )
-
-                # signed_url += "&response-content-disposition=inline"
-
-                return signed_url
-
-            except NoCredentialsError:
-
-                return None
-            except ClientError as e:
-
-                return None
-
+            return presigned_get_url(self.s3_key)
         return None
 
+    @staticmethod
+    def download_urls(invoices):
+        """ {invoice id: signed URL} for many invoices, signed in one pass """
+        invoices = [invoice for invoice in invoices if invoice.pdf_file and invoice.pdf_file.name]
+        urls = presigned_get_urls(invoice.s3_key for invoice in invoices)
+        return {invoice.id: urls[invoice.s3_key] for invoice in invoices}
+
 class Payment(models.Model):
     PAYMENT_METHODS = [
         ('stripe', 'Stripe')
@@ -117,4 +103,35 @@ class Payment(models.Model):
             self.sales_order.update_status_from_stripe(stripe_status)
 
     def __str__(self):
-        return f"Payment for Sales Order {self.sales_order.id} - {self.status}"
\ No newline at end of file
+        return f"Payment for Sales Order {self.sales_order.id} - {self.status}"
+
+class StripeReference(models.Model):
+    """
+    Local index from Stripe object ids (checkout sessions, PaymentIntents) to
+    sales orders, so webhooks can be matched without asking Stripe.
+    """
+    reference = models.CharField(max_length=255, unique=True)
+    sales_order = models.ForeignKey(SalesOrder, on_delete=models.CASCADE, related_name="stripe_references")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def remember(cls, sales_order_id, *references):
+        """ Records the given ids for a sales order; ids already known are left alone """
+        references = {reference for reference in references if reference}
+        if references:
+            cls.objects.bulk_create(
+                [cls(reference=reference, sales_order_id=sales_order_id) for reference in references],
+                ignore_conflicts=True,
+            )
+
+    @classmethod
+    def resolve(cls, *references):
+        """ The sales order id the first known of the given ids points to, or None """
+        references = [reference for reference in references if reference]
+        if not references:
+            return None
+        found = dict(cls.objects.filter(reference__in=references).values_list("reference", "sales_order_id"))
+        return next((found[reference] for reference in references if reference in found), None)
+
+    def __str__(self):
+        return f"{self.reference} -> Sales Order {self.sales_order_id}"
@@ -1,7 +1,36 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
 from rest_framework import serializers
 from sales.models import SalesOrder, Payment, Invoice
 
 
+class InvoiceURLListSerializer(serializers.ListSerializer):
+    """
+    Signs the download URLs of every invoice in the list in one pass and hands
+    them to the row serializers through the context (`invoice_urls`).
+    `invoice_path` leads from a list item to its invoice.
+    """
+    invoice_path = ()
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        invoices = [invoice for invoice in map(self.get_invoice, items) if invoice is not None]
+        self.child.context.setdefault("invoice_urls", {}).update(Invoice.download_urls(invoices))
+        return super().to_representation(items)
+
+    def get_invoice(self, item):
+        try:
+            for attribute in self.invoice_path:
+                item = getattr(item, attribute)
+        except ObjectDoesNotExist:
+            return None
+        return item
+
+
+class SalesOrderListSerializer(InvoiceURLListSerializer):
+    invoice_path = ("invoice",)
+
+
 class InvoiceSerializer(serializers.ModelSerializer):
     """ Serializer for Invoices """
 
@@ -11,9 +40,12 @@ class InvoiceSerializer(serializers.ModelSerializer):
         model = Invoice
         fields = ("id", "sales_order", "issued_at", "pdf_file")
         read_only_fields = ("id", "issued_at")
+        list_serializer_class = InvoiceURLListSerializer
 
     def get_pdf_file(self, obj):
-
+        urls = self.context.get("invoice_urls", {})
+        if obj.id in urls:
+            return urls[obj.id]
         return obj.get_download_url() if obj.pdf_file else None
 
 
@@ -25,10 +57,11 @@ class SalesOrderSerializer(serializers.ModelSerializer):
         model = SalesOrder
         fields = ("id", "order", "total_price", "status", "created_at", "invoice")
         read_only_fields = ("id", "total_price", "created_at")
+        list_serializer_class = SalesOrderListSerializer
 
     def get_invoice(self, obj):
         if hasattr(obj, "invoice") and obj.invoice:
-            return InvoiceSerializer(obj.invoice).data
+            return InvoiceSerializer(obj.invoice, context=self.context).data
         return None
 
 
@@ -38,4 +71,4 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ("id", "sales_order", "method", "payment_intent_id", "status", "created_at")
-        read_only_fields = ("id", "created_at")
\ No newline at end of file
+        read_only_fields = ("id", "created_at")
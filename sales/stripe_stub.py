@@ -0,0 +1,245 @@
+"""
+A local stand-in for the parts of the Stripe API the payment flow uses.
+
+Point the app at it with STRIPE_API_BASE and it serves:
+  - POST /v1/checkout/sessions              creates a session and its PaymentIntent
+  - GET  /v1/payment_intents/<id>           returns the PaymentIntent (with its metadata)
+  - GET  /pay/<session id>                  the checkout page: "paying" there queues the
+                                            payment_intent.succeeded and
+                                            checkout.session.completed webhooks
+
+Webhooks are signed with STRIPE_WEBHOOK_SECRET the way Stripe signs them and
+are delivered to `webhook_url` at up to `rate` events per second. Every
+delivery is recorded in `deliveries` so a load test can report ack latency.
+State lives in memory and is lost when the stub stops.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_THREADS = 8
+
+
+def sign(payload, secret, timestamp=None):
+    """ A Stripe-Signature header value for `payload` """
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def unflatten(pairs):
+    """ Stripe's form encoding (a[b][0][c]=1) back into nested dicts; list indexes stay string keys """
+    data = {}
+    for key, value in pairs:
+        parts = re.findall(r"[^\[\]]+", key)
+        node = data
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return data
+
+
+def public(obj):
+    """ An object without the stub's private bookkeeping keys """
+    return {key: value for key, value in obj.items() if not key.startswith("_")}
+
+
+class StripeStub:
+    def __init__(self, webhook_url, secret, host="127.0.0.1", port=12111, rate=50.0, latency=0.0):
+        self.webhook_url = webhook_url
+        self.secret = secret
+        self.rate = rate
+        self.latency = latency
+        self.sessions = {}
+        self.payment_intents = {}
+        self.deliveries = []
+        self.lock = threading.Lock()
+        self.events = queue.Queue()
+        self.stopping = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.threads = []
+        self.http = threading.local()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{'localhost' if host == '0.0.0.0' else host}:{port}"
+
+    def start(self):
+        self.threads = [
+            threading.Thread(target=self.server.serve_forever, name="stripe-stub-http", daemon=True),
+            threading.Thread(target=self.emit, name="stripe-stub-webhooks", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+    def create_session(self, params):
+        data = unflatten(params)
+        session_id, payment_intent_id = f"cs_test_{uuid.uuid4().hex}", f"pi_test_{uuid.uuid4().hex}"
+        line_items = data.get("line_items", {}).values()
+        amount = sum(
+            int(item.get("price_data", {}).get("unit_amount", 0)) * int(item.get("quantity", 1)) for item in line_items
+        )
+        currency = next((item.get("price_data", {}).get("currency") for item in line_items), "usd")
+        payment_intent = {
+            "id": payment_intent_id,
+            "object": "payment_intent",
+            "amount": amount,
+            "currency": currency,
+            "status": "requires_payment_method",
+            "metadata": data.get("payment_intent_data", {}).get("metadata", {}),
+            "created": int(time.time()),
+        }
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "amount_total": amount,
+            "currency": currency,
+            "mode": data.get("mode", "payment"),
+            "status": "open",
+            "payment_status": "unpaid",
+            # Like Stripe, the PaymentIntent is only exposed on the session once it is paid
+            "payment_intent": None,
+            "metadata": data.get("metadata", {}),
+            "success_url": data.get("success_url"),
+            "cancel_url": data.get("cancel_url"),
+            "url": f"{self.url}/pay/{session_id}",
+            "created": int(time.time()),
+        }
+        with self.lock:
+            self.sessions[session_id] = session
+            self.payment_intents[payment_intent_id] = payment_intent
+            session["_payment_intent"] = payment_intent_id
+        return public(session)
+
+    def pay(self, session_id):
+        """ Completes a checkout and queues its webhooks; False for unknown or already paid sessions """
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or session["payment_status"] == "paid":
+                return False
+            payment_intent = self.payment_intents[session["_payment_intent"]]
+            payment_intent["status"] = "succeeded"
+            session.update(status="complete", payment_status="paid", payment_intent=payment_intent["id"])
+            objects = [("payment_intent.succeeded", dict(payment_intent)), ("checkout.session.completed", public(session))]
+        for event_type, obj in objects:
+            self.events.put((session_id, {
+                "id": f"evt_{uuid.uuid4().hex}",
+                "object": "event",
+                "type": event_type,
+                "created": int(time.time()),
+                "livemode": False,
+                "pending_webhooks": 1,
+                "data": {"object": obj},
+            }))
+        return True
+
+    def emit(self):
+        """ Delivers queued events at up to `rate` per second from a small pool of senders """
+        interval = 1 / self.rate if self.rate else 0
+        with ThreadPoolExecutor(max_workers=DELIVERY_THREADS, thread_name_prefix="stripe-stub-delivery") as senders:
+            next_at = time.monotonic()
+            while not self.stopping.is_set():
+                try:
+                    session_id, event = self.events.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at = max(next_at, time.monotonic()) + interval
+                senders.submit(self.deliver, session_id, event)
+
+    def deliver(self, session_id, event):
+        if not hasattr(self.http, "session"):
+            self.http.session = requests.Session()
+        payload = json.dumps(event)
+        started = time.perf_counter()
+        try:
+            response = self.http.session.post(
+                self.webhook_url,
+                data=payload,
+                headers={"Content-Type": "application/json", "Stripe-Signature": sign(payload, self.secret)},
+                timeout=30,
+            )
+            status = response.status_code
+        except requests.RequestException as e:
+            logger.warning("Webhook delivery of %s failed: %s", event["id"], e)
+            status = None
+        with self.lock:
+            self.deliveries.append({
+                "session": session_id,
+                "event": event["id"],
+                "type": event["type"],
+                "status": status,
+                "ms": (time.perf_counter() - started) * 1000,
+            })
+
+    def handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/checkout/sessions":
+                    return self.not_found()
+                length = int(self.headers.get("Content-Length") or 0)
+                params = parse_qsl(self.rfile.read(length).decode(), keep_blank_values=True)
+                self.api_latency()
+                self.reply(200, stub.create_session(params))
+
+            def do_GET(self):
+                if match := re.fullmatch(r"/v1/payment_intents/([\w-]+)", self.path.split("?")[0]):
+                    self.api_latency()
+                    with stub.lock:
+                        payment_intent = stub.payment_intents.get(match[1])
+                    return self.reply(200, payment_intent) if payment_intent else self.not_found("payment_intent", match[1])
+                if match := re.fullmatch(r"/pay/([\w-]+)", self.path.split("?")[0]):
+                    paid = stub.pay(match[1])
+                    return self.reply(200 if paid else 404, {"paid": paid})
+                self.not_found()
+
+            def api_latency(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+            def not_found(self, kind=None, object_id=None):
+                message = f"No such {kind}: '{object_id}'" if kind else f"Unrecognized request URL ({self.command}: {self.path})."
+                self.reply(404, {"error": {"type": "invalid_request_error", "message": message}})
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Request-Id", f"req_{uuid.uuid4().hex[:14]}")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug("%s - %s", self.address_string(), format % args)
+
+        return Handler
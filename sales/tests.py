@@ -1,3 +1,217 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import requests
+import stripe
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase, TestCase
+from reportlab import rl_config
+
+from notifications.models import Notification
+from products.models import Category, Product
+from sales.invoices import invoice_context, render_invoice, render_invoices
+from sales.models import Invoice, Payment, SalesOrder, StripeReference
+from sales.stripe_stub import StripeStub, sign
+from trading.models import Order
+from users.models import User
+
+
+class InvoiceRenderingTests(TestCase):
+    """ PDF rendering from invoice_context() snapshots, singly and in batches """
+
+    @classmethod
+    def setUpTestData(cls):
+        trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        customer = User.objects.create_user(username="customer", email="c@example.com", password="pass12345", role="customer")
+        category = Category.objects.create(name="Metals & <alloys>")
+        product = Product.objects.create(
+            user=trader, title="Gold bar <1 oz>", description="Fine & pure", price=100, stock=10, category=category
+        )
+        cls.sales_orders = []
+        for _ in range(3):
+            order = Order.objects.create(user=customer, product=product, quantity=2, total_price=200, status="paid")
+            sales_order = SalesOrder.objects.create(order=order, total_price=200, status="paid")
+            Payment.objects.create(sales_order=sales_order, status="succeeded")
+            cls.sales_orders.append(sales_order)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(Invoice._meta.get_field("pdf_file"), "storage", FileSystemStorage(location=directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def context(self, sales_order):
+        return invoice_context(Invoice.objects.create(sales_order=sales_order), sales_order)
+
+    def test_renders_a_pdf(self):
+        pdf = render_invoice(self.context(self.sales_orders[0]))
+        self.assertTrue(pdf.startswith(b"%PDF-"))
+        self.assertIn(b"%%EOF", pdf[-32:])
+
+    def test_markup_characters_in_order_data_are_escaped(self):
+        # Unescaped, reportlab reads "<1 oz>" as a paragraph tag and fails to render
+        with mock.patch.object(rl_config, "pageCompression", 0):
+            pdf = render_invoice(self.context(self.sales_orders[0]))
+        # A paragraph's text is drawn in fragments: (Gold bar <) Tj (1 oz) Tj (>) Tj
+        text = pdf.replace(b") Tj (", b"")
+        self.assertIn(b"(Product Name: Gold bar <1 oz>)", text)
+        self.assertIn(b"(Product Category: Metals & <alloys>)", text)
+
+    def test_batch_renders_and_stores_every_invoice(self):
+        ids = [sales_order.id for sales_order in self.sales_orders]
+
+        self.assertEqual(render_invoices(ids, workers=1), 3)
+
+        invoices = Invoice.objects.filter(sales_order_id__in=ids)
+        self.assertEqual(len(invoices), 3)
+        for invoice in invoices:
+            self.assertTrue(invoice.pdf_file.name.endswith(f"invoice/order_{invoice.sales_order_id}.pdf"))
+            with invoice.pdf_file.open("rb") as pdf:
+                self.assertTrue(pdf.read().startswith(b"%PDF-"))
+
+    def test_batch_notifies_each_customer_like_a_single_render(self):
+        ids = [sales_order.id for sales_order in self.sales_orders]
+
+        render_invoices(ids, workers=1)
+
+        self.assertEqual(
+            sorted(Notification.objects.filter(message__startswith="Invoice").values_list("user_id", "message")),
+            sorted(
+                (sales_order.order.user_id, f"Invoice for your order {sales_order.order_id} is now available.")
+                for sales_order in self.sales_orders
+            ),
+        )
+
+    def test_empty_batch_renders_nothing(self):
+        self.assertEqual(render_invoices([0], workers=1), 0)
+
+
+class StripeReferenceTests(TestCase):
+    """ The local index from Stripe session / PaymentIntent ids to sales orders """
+
+    @classmethod
+    def setUpTestData(cls):
+        trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+        product = Product.objects.create(user=trader, title="Gold bar", price=100, stock=10)
+        cls.first, cls.second = (
+            SalesOrder.objects.create(
+                order=Order.objects.create(user=customer, product=product, quantity=1, total_price=100), total_price=100
+            )
+            for _ in range(2)
+        )
+
+    def test_remember_skips_empty_and_known_ids(self):
+        StripeReference.remember(self.first.id, "cs_1", None, "")
+        StripeReference.remember(self.second.id, "cs_1", "pi_2")
+
+        self.assertEqual(
+            dict(StripeReference.objects.values_list("reference", "sales_order_id")),
+            {"cs_1": self.first.id, "pi_2": self.second.id},
+        )
+
+    def test_resolve_returns_the_first_known_id(self):
+        StripeReference.remember(self.first.id, "cs_1")
+        StripeReference.remember(self.second.id, "pi_2")
+
+        self.assertEqual(StripeReference.resolve("pi_unknown", "pi_2", "cs_1"), self.second.id)
+        self.assertEqual(StripeReference.resolve(None, "cs_1"), self.first.id)
+        self.assertIsNone(StripeReference.resolve("pi_unknown"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(StripeReference.resolve(None, ""))
+
+
+class WebhookReceiver:
+    """ A local endpoint that records the webhooks posted to it and when they arrived """
+
+    def __init__(self):
+        self.received = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+                receiver.received.append((time.monotonic(), body, self.headers["Stripe-Signature"]))
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/api/webhooks/stripe/"
+
+    def wait_for(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(self.received) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.received
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StripeStubTests(SimpleTestCase):
+    """ The local Stripe stand-in used by the payment flow load test """
+
+    RATE = 10
+
+    def setUp(self):
+        self.receiver = WebhookReceiver()
+        self.addCleanup(self.receiver.stop)
+        self.stub = StripeStub(self.receiver.url, settings.STRIPE_WEBHOOK_SECRET, port=0, rate=self.RATE).start()
+        self.addCleanup(self.stub.stop)
+        patcher = mock.patch.object(stripe, "api_base", self.stub.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_signatures_verify_with_the_webhook_secret(self):
+        payload = json.dumps({"id": "evt_1", "object": "event", "type": "charge.succeeded", "data": {"object": {}}})
+
+        event = stripe.Webhook.construct_event(payload, sign(payload, settings.STRIPE_WEBHOOK_SECRET), settings.STRIPE_WEBHOOK_SECRET)
+
+        self.assertEqual(event["id"], "evt_1")
+        with self.assertRaises(stripe.SignatureVerificationError):
+            stripe.Webhook.construct_event(payload, sign(payload, "whsec_other"), settings.STRIPE_WEBHOOK_SECRET)
+
+    def test_paying_a_session_delivers_both_events_at_the_configured_rate(self):
+        session = stripe.checkout.Session.create(
+            api_key="sk_test_stub",
+            line_items=[{"price_data": {"currency": "kzt", "unit_amount": 1500}, "quantity": 2}],
+            mode="payment",
+            success_url="http://localhost/success",
+            cancel_url="http://localhost/cancel",
+            payment_intent_data={"metadata": {"sales_order_id": "42"}},
+        )
+        self.assertEqual((session.amount_total, session.payment_intent), (3000, None))
+
+        self.assertEqual(requests.get(session.url, timeout=5).status_code, 200)
+        self.assertEqual(requests.get(session.url, timeout=5).status_code, 404)
+        received = self.receiver.wait_for(2)
+
+        events = [
+            stripe.Webhook.construct_event(body, signature, settings.STRIPE_WEBHOOK_SECRET)
+            for _, body, signature in received
+        ]
+        self.assertEqual([event["type"] for event in events], ["payment_intent.succeeded", "checkout.session.completed"])
+        payment_intent, completed = (event["data"]["object"] for event in events)
+        self.assertEqual(payment_intent["metadata"], {"sales_order_id": "42"})
+        self.assertEqual((completed["payment_status"], completed["payment_intent"]), ("paid", payment_intent["id"]))
+        self.assertEqual(
+            stripe.PaymentIntent.retrieve(payment_intent["id"], api_key="sk_test_stub").metadata["sales_order_id"], "42"
+        )
+        # Deliveries are spaced by 1 / rate seconds
+        self.assertGreaterEqual(received[1][0] - received[0][0], 1 / self.RATE * 0.9)
+        self.assertEqual([delivery["status"] for delivery in self.stub.deliveries], [200, 200])
@@ -7,11 +7,13 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.conf import settings
 import stripe
-from sales.models import SalesOrder, Payment, Invoice
+from sales.models import SalesOrder, Payment, Invoice, StripeReference
 from sales.serializers import SalesOrderSerializer, PaymentSerializer, InvoiceSerializer
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from trading.models import Order
+from trading.reservations import consume_reservations
+from trading_app.idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
 from trading_app.permissions import IsCustomer, IsTrader
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
@@ -37,7 +39,7 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
 
         user = self.request.user
         if user.is_trader():
-            return SalesOrder.objects.filter(order__product__user=user)
+            return SalesOrder.objects.filter(order__seller=user)
         return SalesOrder.objects.filter(order__user=user)
 
     def create_or_get_sales_order(self, order):
@@ -48,9 +50,11 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
     @swagger_auto_schema(
         method='post',
         operation_description="Create a Stripe payment session for an approved SalesOrder",
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         responses={200: "Stripe Checkout Session Created"}
     )
     @action(detail=False, methods=['post'], permission_classes=[IsCustomer])
+    @idempotent
     def create_payment_session(self, request):
         """ Create or retrieve SalesOrder and process payment """
 
@@ -100,6 +104,9 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
         payment.payment_intent_id = session.id
         payment.status = "pending"
         payment.save()
+        # Lets the webhook find the sales order without a PaymentIntent lookup. A new session has no
+        # PaymentIntent id yet; it is indexed from the first event that carries it (usually the completed session)
+        StripeReference.remember(sales_order.id, session.id)
 
         return Response({"checkout_url": session.url})
 
@@ -108,7 +115,7 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
         """ Traders can mark an order as shipped after payment """
         sales_order = self.get_object()
 
-        if sales_order.order.product.user != request.user:
+        if sales_order.order.seller_id != request.user.id:
             return Response({"error": "You cannot mark this order as shipped"}, status=status.HTTP_403_FORBIDDEN)
 
         if sales_order.status != "paid":
@@ -132,6 +139,7 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
 
         sales_order.status = "paid"
         sales_order.save()
+        consume_reservations([sales_order.order_id])
 
         generate_invoice.delay(sales_order.id)
 
@@ -183,7 +191,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         # Permission Check
         if (
                 sales_order.order.user != request.user and
-                sales_order.order.product.user != request.user and
+                sales_order.order.seller_id != request.user.id and
                 not request.user.is_admin()
         ):
             return Response(
@@ -1,12 +1,24 @@
 from django.contrib import admin
-from trading.models import Order, Transaction
+from trading.models import Order, Transaction, StockReservation, OrderBookState
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'product', 'status', 'total_price', 'created_at')
+    list_display = ('id', 'user', 'seller', 'product', 'order_type', 'side', 'status', 'total_price', 'created_at')
     search_fields = ('user__username', 'product__title', 'status')
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ('order', 'user', 'status_from', 'status_to', 'timestamp')
-    search_fields = ('order__id', 'user__username', 'status_from', 'status_to')
\ No newline at end of file
+    search_fields = ('order__id', 'user__username', 'status_from', 'status_to')
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'status', 'expires_at')
+    list_filter = ('status',)
+    search_fields = ('order__id', 'product__title')
+
+
+@admin.register(OrderBookState)
+class OrderBookStateAdmin(admin.ModelAdmin):
+    list_display = ('product', 'sequence', 'updated_at')
+    readonly_fields = ('sequence', 'bids', 'asks')
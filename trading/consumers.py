@@ -0,0 +1,52 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
+from trading.market_data import hub
+
+
+class MarketDataConsumer(AsyncWebsocketConsumer):
+    """ Streams order book depth, best bid/ask and trades for the products a socket subscribes to """
+
+    async def connect(self):
+        """ Handles WebSocket connection """
+        self.user = self.scope.get("user", AnonymousUser())
+
+        if not self.user or self.user.is_anonymous:
+            await self.close(code=403)
+            return
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        """ Drops every subscription of this socket """
+        await hub.unsubscribe_all(self)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """ Handles subscribe, unsubscribe and resync requests """
+        try:
+            message = json.loads(text_data or "")
+            action = message["action"]
+            product_id = int(message["product"])
+        except (ValueError, KeyError, TypeError):
+            await self.send_error("Expected {\"action\": ..., \"product\": <id>}.")
+            return
+
+        if action == "subscribe":
+            snapshot = await hub.subscribe(self, product_id)
+        elif action == "resync":
+            snapshot = hub.resync(product_id)
+        elif action == "unsubscribe":
+            await hub.unsubscribe(self, product_id)
+            await self.send(text_data=json.dumps({"type": "unsubscribed", "product": product_id}))
+            return
+        else:
+            await self.send_error(f"Unknown action '{action}'.")
+            return
+
+        if snapshot is None:
+            await self.send_error(f"Not subscribed to product {product_id}.")
+            return
+        await self.send(text_data=json.dumps(snapshot))
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({"type": "error", "error": message}))
@@ -0,0 +1,72 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from notifications.signals import bulk_notify
+from trading.models import Order, Transaction
+from trading.reservations import release_reservations
+
+logger = logging.getLogger(__name__)
+
+
+def stale_orders_filter(cutoff_time):
+    """
+    Matches orders older than the expiry threshold of their status (settings.ORDER_EXPIRY).
+    Orders that have been paid are left alone: a Stripe payment marks the sales
+    order and payment, while the order itself stays 'approved' until shipped.
+    """
+    condition = Q(pk__in=[])
+    for status, max_age in settings.ORDER_EXPIRY.items():
+        condition |= Q(status=status, created_at__lte=cutoff_time - max_age)
+    return condition & ~Q(sales_order__status='paid') & ~Q(sales_order__payment__status='succeeded')
+
+
+def expire_stale_orders(batch_size=None):
+    """
+    Moves stale orders to 'expired' in batches of set-based UPDATEs, writes their
+    Transaction rows in bulk and releases their reserved stock.
+    Each batch commits on its own so a long sweep never holds many row locks.
+    Returns {"expired": <rows>, "batches": <count>, "seconds": <duration>}.
+    """
+    batch_size = batch_size or settings.ORDER_EXPIRY_BATCH_SIZE
+    started = time.monotonic()
+    condition = stale_orders_filter(now())
+    expired = batches = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Order.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(condition)
+                .order_by('id')
+                .values_list('id', 'status', 'user_id', 'seller_id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            order_ids = [order_id for order_id, _, _, _ in batch]
+            Order.objects.filter(id__in=order_ids).update(status='expired')
+            Transaction.objects.bulk_create([
+                Transaction(order_id=order_id, status_from=status_from, status_to='expired')
+                for order_id, status_from, _, _ in batch
+            ])
+            release_reservations(order_ids)
+
+            notifications = []
+            for order_id, _, user_id, seller_id in batch:
+                notifications.append((user_id, f"Your order {order_id} has expired."))
+                notifications.append((seller_id, f"Order {order_id} has expired."))
+            transaction.on_commit(lambda notifications=notifications: bulk_notify(notifications))
+
+        expired += len(batch)
+        batches += 1
+        if len(batch) < batch_size:
+            break
+
+    report = {"expired": expired, "batches": batches, "seconds": round(time.monotonic() - started, 3)}
+    logger.info("Expired %(expired)s stale orders in %(batches)s batches (%(seconds)ss)", report)
+    return report
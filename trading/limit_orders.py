@@ -0,0 +1,161 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, When, Value
+
+from trading.market_data import publish
+from trading.matching import BUY, SELL, OrderBook, engine, from_ticks, to_ticks
+from trading.models import Order, OrderBookState, Transaction
+from trading.reservations import InsufficientStock
+
+
+class LimitOrderRejected(Exception):
+    """ Raised when a user may not place a limit order on this side of a product's book """
+
+
+def load_book(state):
+    """
+    Returns the in-memory book for `state.product`, rebuilding it from the open
+    limit orders when this process has no book or another process has moved
+    the sequence on since. Must be called with the state row locked.
+    """
+    book = engine.get(state.product_id)
+    if book is not None and book.sequence == state.sequence:
+        return book
+
+    book = OrderBook(state.product_id, sequence=state.sequence)
+    resting = (
+        Order.objects.filter(product_id=state.product_id, order_type='limit', status__in=['open', 'partial'])
+        .order_by('id')
+        .values_list('id', 'user_id', 'side', 'limit_price', 'quantity', 'filled_quantity')
+    )
+    for order_id, user_id, side, price, quantity, filled in resting:
+        book.add_resting(order_id, user_id, side, to_ticks(price), quantity - filled, quantity)
+    return engine.put(book)
+
+
+def lock_state(product_id):
+    OrderBookState.objects.get_or_create(product_id=product_id)
+    return OrderBookState.objects.select_for_update().get(product_id=product_id)
+
+
+def save_state(state, book):
+    snapshot = book.snapshot()
+    state.sequence = snapshot["sequence"]
+    state.bids = snapshot["bids"]
+    state.asks = snapshot["asks"]
+    state.save(update_fields=['sequence', 'bids', 'asks', 'updated_at'])
+
+
+def submit_limit_order(user, product, side, price, quantity):
+    """
+    Places a limit order and matches it against the product's book.
+    Only the product's owner sells, out of the product's stock: a sell order
+    takes its whole quantity from `stock` up front (the unfilled part goes
+    back on cancel), so every fill is covered. Buyers can't be the owner,
+    which also rules out self-trades.
+    Fills update the resting orders with one UPDATE and are written as two
+    Transaction rows each (maker and taker side). Returns (order, fills).
+    """
+    if side == SELL and product.user_id != user.id:
+        raise LimitOrderRejected("Only the product's owner can sell it.")
+    if side == BUY and product.user_id == user.id:
+        raise LimitOrderRejected("You cannot purchase your own product.")
+
+    try:
+        with transaction.atomic():
+            state = lock_state(product.id)
+            book = load_book(state)
+
+            if side == SELL and not product.reduce_stock(quantity):
+                raise InsufficientStock(product.id)
+
+            order = Order.objects.create(
+                user=user,
+                product=product,
+                quantity=quantity,
+                total_price=price * quantity,
+                status='open',
+                order_type='limit',
+                side=side,
+                limit_price=price
+            )
+            result = book.submit(order.id, user.id, side, to_ticks(price), quantity)
+            apply_fills(order, result)
+            save_state(state, book)
+            transaction.on_commit(partial(publish, product.id, result.sequence, result.levels, result.fills, side))
+    except Exception:
+        # The in-memory book may be ahead of what was committed; rebuild it next time
+        engine.drop(product.id)
+        raise
+    return order, result.fills
+
+
+def apply_fills(order, result):
+    if not result.fills:
+        return
+
+    transactions = []
+    maker_filled = {}
+    maker_status = {}
+    taker_filled = 0
+    for fill in result.fills:
+        price = from_ticks(fill.price)
+        maker_from = 'open' if fill.maker_remaining + fill.quantity == fill.maker_quantity else 'partial'
+        maker_to = 'filled' if fill.maker_remaining == 0 else 'partial'
+        maker_filled[fill.maker_id] = fill.quantity
+        maker_status[fill.maker_id] = maker_to
+
+        taker_from = 'open' if taker_filled == 0 else 'partial'
+        taker_filled += fill.quantity
+        taker_to = 'filled' if taker_filled == order.quantity else 'partial'
+
+        transactions.append(Transaction(
+            order_id=fill.maker_id, user_id=fill.maker_user_id, status_from=maker_from, status_to=maker_to,
+            price=price, quantity=fill.quantity, counter_order_id=order.id
+        ))
+        transactions.append(Transaction(
+            order_id=order.id, user_id=order.user_id, status_from=taker_from, status_to=taker_to,
+            price=price, quantity=fill.quantity, counter_order_id=fill.maker_id
+        ))
+
+    Order.objects.filter(id__in=maker_filled).update(
+        filled_quantity=F('filled_quantity') + Case(
+            *[When(id=order_id, then=Value(quantity)) for order_id, quantity in maker_filled.items()]
+        ),
+        status=Case(*[When(id=order_id, then=Value(status)) for order_id, status in maker_status.items()])
+    )
+    order.filled_quantity = taker_filled
+    order.status = 'filled' if result.remaining == 0 else 'partial'
+    Order.objects.filter(id=order.id).update(filled_quantity=order.filled_quantity, status=order.status)
+    Transaction.objects.bulk_create(transactions)
+
+
+def cancel_limit_order(order, user):
+    """ Takes a resting limit order off the book; returns False if it is no longer open """
+    try:
+        with transaction.atomic():
+            state = lock_state(order.product_id)
+            book = load_book(state)
+
+            status_from = Order.objects.filter(id=order.id).values_list('status', flat=True).first()
+            if status_from not in ('open', 'partial'):
+                return False
+            remaining = book.cancel(order.id)
+            if remaining is None:
+                return False
+            if order.side == SELL:
+                # The unsold part of the stock it took
+                order.product.increase_stock(remaining)
+
+            order.status = 'canceled'
+            Order.objects.filter(id=order.id).update(status='canceled')
+            Transaction.objects.create(order=order, user=user, status_from=status_from, status_to='canceled')
+            save_state(state, book)
+            price = to_ticks(order.limit_price)
+            levels = [(order.side, price, book.level(order.side, price))]
+            transaction.on_commit(partial(publish, order.product_id, book.sequence, levels))
+    except Exception:
+        engine.drop(order.product_id)
+        raise
+    return True
@@ -0,0 +1,76 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from products.models import Product
+from trading.models import Order
+from users.models import User
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Compare cart latency of per-item POST /orders/ calls with one POST /orders/checkout/"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=20, help="Products per cart.")
+        parser.add_argument("--sellers", type=int, default=4, help="Traders the cart is spread over.")
+        parser.add_argument("--rounds", type=int, default=20, help="Carts placed through each path.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated users, products and orders.")
+
+    def handle(self, *args, **options):
+        items, rounds = options["items"], options["rounds"]
+        tag = uuid.uuid4().hex[:8]
+
+        traders = [
+            User.objects.create_user(username=f"bench_checkout_{tag}_t{i}", role="trader")
+            for i in range(options["sellers"])
+        ]
+        customer = User.objects.create_user(username=f"bench_checkout_{tag}_c", role="customer")
+        products = Product.objects.bulk_create([
+            Product(user=traders[i % len(traders)], title=f"Bench item {i}", price=10, stock=rounds * 2 + 10)
+            for i in range(items)
+        ])
+
+        client = APIClient(HTTP_HOST="localhost")
+        client.force_authenticate(customer)
+
+        try:
+            per_item, batch = [], []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                for product in products:
+                    response = client.post("/api/trading/orders/", {"product": product.id, "quantity": 1}, format="json")
+                    assert response.status_code == 201, response.content
+                per_item.append((time.perf_counter() - started) * 1000)
+
+                started = time.perf_counter()
+                response = client.post(
+                    "/api/trading/orders/checkout/",
+                    {"items": [{"product": product.id, "quantity": 1} for product in products]},
+                    format="json",
+                )
+                assert response.status_code == 201, response.content
+                batch.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(f"cart size={items} sellers={len(traders)} rounds={rounds}")
+            self.stdout.write(f"{'path':<24}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+            for label, timings in ((f"{items} x POST /orders/", per_item), ("POST /orders/checkout/", batch)):
+                self.stdout.write(
+                    f"{label:<24}{percentile(timings, 50):>10.1f}{percentile(timings, 95):>10.1f}"
+                    f"{statistics.mean(timings):>10.1f}"
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"checkout is {statistics.median(per_item) / statistics.median(batch):.1f}x faster per cart (median)"
+            ))
+        finally:
+            if not options["keep"]:
+                # Move the orders out of pending so the cancellation signal stays quiet on cleanup
+                Order.objects.filter(user=customer).update(status="canceled")
+                User.objects.filter(username__startswith=f"bench_checkout_{tag}_").delete()
@@ -0,0 +1,53 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from trading.matching import BUY, SELL, OrderBook
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark the in-memory order book: submit random limit orders around a mid price"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=200_000, help="Limit orders to submit.")
+        parser.add_argument("--mid", type=int, default=10_000, help="Mid price in ticks.")
+        parser.add_argument("--spread", type=int, default=200, help="Max distance from mid in ticks.")
+        parser.add_argument("--max-quantity", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        mid, spread, max_quantity = options["mid"], options["spread"], options["max_quantity"]
+        orders = [
+            (
+                BUY if rng.random() < 0.5 else SELL,
+                mid + rng.randint(-spread, spread),
+                rng.randint(1, max_quantity),
+            )
+            for _ in range(options["orders"])
+        ]
+
+        book = OrderBook(product_id=0)
+        latencies = []
+        fills = 0
+        clock = time.perf_counter_ns
+        started = clock()
+        for order_id, (side, price, quantity) in enumerate(orders, start=1):
+            submitted = clock()
+            result = book.submit(order_id, order_id % 100, side, price, quantity)
+            latencies.append(clock() - submitted)
+            fills += len(result.fills)
+        elapsed = (clock() - started) / 1e9
+
+        self.stdout.write(f"orders={len(orders):,} fills={fills:,} elapsed={elapsed:.2f}s")
+        self.stdout.write(f"resting: {len(book.index):,} orders on {len(book.bids.keys)} bid / {len(book.asks.keys)} ask levels")
+        self.stdout.write(f"{'orders/s':<16}{len(orders) / elapsed:>14,.0f}")
+        self.stdout.write(f"{'matches/s':<16}{fills / elapsed:>14,.0f}")
+        for pct in (50, 99, 99.9):
+            self.stdout.write(f"{f'p{pct} submit':<16}{percentile(latencies, pct) / 1000:>12.2f}µs")
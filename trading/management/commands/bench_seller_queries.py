@@ -0,0 +1,160 @@
+import re
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from products.models import Product
+from sales.models import SalesOrder
+from trading.models import Order, Transaction
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic order book and compare trader-scoped query plans "
+        "joining through products (old) with the denormalized seller column (new)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--traders", type=int, default=200)
+        parser.add_argument("--products-per-trader", type=int, default=20)
+        parser.add_argument("--orders", type=int, default=500_000)
+        parser.add_argument("--runs", type=int, default=5, help="Timed executions per query.")
+        parser.add_argument("--plans", action="store_true", help="Print the full EXPLAIN ANALYZE output.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rows.")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        started = time.perf_counter()
+        trader = self.generate(tag, options)
+        self.stdout.write(f"Generated {options['orders']:,} orders in {time.perf_counter() - started:.1f}s")
+
+        try:
+            pairs = [
+                (
+                    "orders page",
+                    Order.objects.filter(product__user=trader).order_by("-created_at", "-id")[:10],
+                    Order.objects.filter(seller=trader).order_by("-created_at", "-id")[:10],
+                ),
+                (
+                    "orders count",
+                    Order.objects.filter(product__user=trader),
+                    Order.objects.filter(seller=trader),
+                ),
+                (
+                    "transactions page",
+                    Transaction.objects.filter(order__product__user=trader).order_by("-timestamp", "-id")[:10],
+                    Transaction.objects.filter(order__seller=trader).order_by("-timestamp", "-id")[:10],
+                ),
+                (
+                    "sales orders page",
+                    SalesOrder.objects.filter(order__product__user=trader).order_by("-id")[:10],
+                    SalesOrder.objects.filter(order__seller=trader).order_by("-id")[:10],
+                ),
+            ]
+            for name, old, new in pairs:
+                self.compare(name, old, new, options)
+        finally:
+            if not options["keep"]:
+                self.cleanup(tag)
+
+    def generate(self, tag, options):
+        """ Bulk-load users, products, orders, transactions and sales orders with INSERT ... SELECT """
+        traders = options["traders"]
+        products = traders * options["products_per_trader"]
+        users_table = User._meta.db_table
+        products_table = Product._meta.db_table
+        orders_table = Order._meta.db_table
+        transactions_table = Transaction._meta.db_table
+        sales_orders_table = SalesOrder._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {users_table} (password, is_superuser, username, first_name, last_name, email,
+                                           is_staff, is_active, date_joined, role, last_updated)
+                SELECT '!', false, %s || g, '', '', '', false, true, now(),
+                       CASE WHEN g <= %s THEN 'trader' ELSE 'customer' END, now()
+                FROM generate_series(1, %s) AS g
+            """, [f"bench_{tag}_", traders, traders * 2])
+
+            cursor.execute(f"""
+                INSERT INTO {products_table} (title, description, price, stock, user_id, created_at, updated_at,
+                                              image_variants)
+                SELECT 'Bench ' || g, '', 100, 1000, t.id, now(), now(), '{{}}'::jsonb
+                FROM generate_series(1, %s) AS g
+                JOIN {users_table} t ON t.username = %s || (1 + g %% %s)
+            """, [products, f"bench_{tag}_", traders])
+
+            cursor.execute(f"""
+                WITH p AS (
+                    SELECT id, user_id, row_number() OVER (ORDER BY id) - 1 AS n
+                    FROM {products_table} WHERE user_id IN (SELECT id FROM {users_table} WHERE username LIKE %s)
+                ), c AS (
+                    SELECT id, row_number() OVER (ORDER BY id) - 1 AS n
+                    FROM {users_table} WHERE username LIKE %s AND role = 'customer'
+                )
+                INSERT INTO {orders_table} (user_id, product_id, seller_id, quantity, total_price, status, created_at,
+                                            order_type, side, filled_quantity)
+                SELECT c.id, p.id, p.user_id, 1, 100, 'pending', now() - (g || ' seconds')::interval,
+                       'purchase', 'buy', 0
+                FROM generate_series(1, %s) AS g
+                JOIN p ON p.n = g %% %s
+                JOIN c ON c.n = g %% %s
+            """, [f"bench\\_{tag}\\_%", f"bench\\_{tag}\\_%", options["orders"], products, traders])
+            cursor.execute(f"ANALYZE {users_table}, {products_table}, {orders_table}")
+
+            cursor.execute(f"""
+                INSERT INTO {transactions_table} (order_id, timestamp, status_from, status_to, user_id)
+                SELECT o.id, o.created_at, 'pending', 'approved', o.seller_id
+                FROM {orders_table} o JOIN {users_table} u ON u.id = o.seller_id
+                WHERE u.username LIKE %s
+            """, [f"bench\\_{tag}\\_%"])
+
+            cursor.execute(f"""
+                INSERT INTO {sales_orders_table} (order_id, total_price, status, created_at)
+                SELECT o.id, o.total_price, 'paid', o.created_at
+                FROM {orders_table} o JOIN {users_table} u ON u.id = o.user_id
+                WHERE u.username LIKE %s AND o.id %% 3 = 0
+            """, [f"bench\\_{tag}\\_%"])
+
+            cursor.execute(
+                f"ANALYZE {users_table}, {products_table}, {orders_table}, {transactions_table}, {sales_orders_table}"
+            )
+
+        return User.objects.get(username=f"bench_{tag}_1")
+
+    def compare(self, name, old, new, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}"))
+        for label, queryset in (("old (join products)", old), ("new (seller column)", new)):
+            timings = []
+            for _ in range(options["runs"]):
+                started = time.perf_counter()
+                if queryset.query.is_sliced:
+                    list(queryset.all())
+                else:
+                    queryset.count()
+                timings.append((time.perf_counter() - started) * 1000)
+            plan = queryset.explain(analyze=True, buffers=True)
+            execution = re.search(r"Execution Time: ([\d.]+) ms", plan)
+            scans = sorted({m.strip() for m in re.findall(r"((?:Parallel )?(?:Index Only|Index|Seq|Bitmap Heap) Scan(?: Backward)? (?:using \w+ )?on \w+)", plan)})
+            self.stdout.write(
+                f"  {label:<22} median {sorted(timings)[len(timings) // 2]:8.2f} ms"
+                f"   plan {float(execution.group(1)) if execution else 0:8.2f} ms"
+            )
+            self.stdout.write(f"    {'; '.join(scans)}")
+            if options["plans"]:
+                self.stdout.write("    " + plan.replace("\n", "\n    "))
+
+    def cleanup(self, tag):
+        pattern = f"bench\\_{tag}\\_%"
+        users = f"SELECT id FROM {User._meta.db_table} WHERE username LIKE %s"
+        orders = f"SELECT id FROM {Order._meta.db_table} WHERE user_id IN ({users})"
+        # Raw deletes: the generated rows never went through signals, so skip them on the way out too
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Transaction._meta.db_table} WHERE order_id IN ({orders})", [pattern])
+            cursor.execute(f"DELETE FROM {SalesOrder._meta.db_table} WHERE order_id IN ({orders})", [pattern])
+            cursor.execute(f"DELETE FROM {Order._meta.db_table} WHERE user_id IN ({users})", [pattern])
+            cursor.execute(f"DELETE FROM {Product._meta.db_table} WHERE user_id IN ({users})", [pattern])
+            cursor.execute(f"DELETE FROM {User._meta.db_table} WHERE username LIKE %s", [pattern])
@@ -0,0 +1,86 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from products.models import Product
+from trading.models import Order, StockReservation
+from trading.reservations import InsufficientStock, place_order
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Run N parallel buyers against one product and report reservation throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=16, help="Number of concurrent buyer threads.")
+        parser.add_argument("--attempts", type=int, default=50, help="Purchase attempts per buyer.")
+        parser.add_argument("--stock", type=int, default=500, help="Initial stock of the contended product.")
+        parser.add_argument("--quantity", type=int, default=1, help="Quantity requested per attempt.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated users, product and orders.")
+
+    def handle(self, *args, **options):
+        buyers, attempts = options["buyers"], options["attempts"]
+        quantity, initial_stock = options["quantity"], options["stock"]
+        tag = uuid.uuid4().hex[:8]
+
+        trader = User.objects.create_user(username=f"bench_trader_{tag}", role="trader")
+        customers = User.objects.bulk_create([
+            User(username=f"bench_buyer_{tag}_{i}", role="customer") for i in range(buyers)
+        ])
+        product = Product.objects.create(user=trader, title=f"Bench product {tag}", price=100, stock=initial_stock)
+
+        counters = {"reserved": 0, "rejected": 0, "errors": 0}
+        counters_lock = threading.Lock()
+        start_barrier = threading.Barrier(buyers + 1)
+
+        def buyer(customer):
+            reserved = rejected = errors = 0
+            start_barrier.wait()
+            try:
+                for _ in range(attempts):
+                    try:
+                        place_order(customer, product, quantity)
+                        reserved += 1
+                    except InsufficientStock:
+                        rejected += 1
+                    except Exception:
+                        errors += 1
+            finally:
+                connection.close()
+                with counters_lock:
+                    counters["reserved"] += reserved
+                    counters["rejected"] += rejected
+                    counters["errors"] += errors
+
+        threads = [threading.Thread(target=buyer, args=(customer,)) for customer in customers]
+        for thread in threads:
+            thread.start()
+        start_barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db(fields=["stock"])
+        held = sum(StockReservation.objects.filter(product=product).values_list("quantity", flat=True))
+        total = buyers * attempts
+
+        self.stdout.write(f"buyers={buyers} attempts/buyer={attempts} quantity={quantity} initial_stock={initial_stock}")
+        self.stdout.write(f"elapsed:               {elapsed:.3f}s")
+        self.stdout.write(f"attempts/s:            {total / elapsed:,.0f}")
+        self.stdout.write(f"reservations/s:        {counters['reserved'] / elapsed:,.0f}")
+        self.stdout.write(f"reserved / rejected:   {counters['reserved']} / {counters['rejected']} (errors: {counters['errors']})")
+        self.stdout.write(f"final stock:           {product.stock}")
+
+        if product.stock + held != initial_stock:
+            self.stdout.write(self.style.ERROR(f"Stock mismatch: {product.stock} left + {held} held != {initial_stock}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No oversell: remaining + reserved == initial stock"))
+
+        if not options["keep"]:
+            # Move the orders out of pending first so the cancellation signal stays quiet on cleanup
+            Order.objects.filter(product=product).update(status="canceled")
+            User.objects.filter(id__in=[trader.id] + [c.id for c in customers]).delete()
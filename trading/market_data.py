@@ -0,0 +1,285 @@
+"""
+Market data fan-out for the limit order books.
+
+Workers publish one event per committed book change to the product's
+channel-layer group. Each daphne process runs a single hub that listens on
+those groups for all of its sockets. The hub folds the events into
+per-product deltas and sends each subscriber at most one frame every
+MARKET_DATA_INTERVAL seconds, no matter how many changes happened in between.
+
+Protocol (prices are decimal strings):
+  -> {"action": "subscribe" | "unsubscribe" | "resync", "product": <id>}
+  <- {"type": "snapshot", "product", "sequence", "bids", "asks", "bbo", "trades"}
+  <- {"type": "delta", "product", "prev_sequence", "sequence", "bids", "asks", "bbo", "trades"}
+
+Levels are [price, quantity] with the absolute quantity resting at that price;
+a quantity of 0 removes the level. A client applies a delta only when its
+prev_sequence equals the sequence the client holds, and sends "resync"
+otherwise.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import F
+from django.utils.timezone import now
+
+from trading.matching import BUY, from_ticks, to_ticks
+from trading.models import OrderBookState, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Flushes a hole in the sequence may stay open before the hub reloads the book
+MAX_STALLED_FLUSHES = 3
+GROUP_REFRESH_SECONDS = 3600
+
+
+def group_name(product_id):
+    return f"market_{product_id}"
+
+
+def publish(product_id, sequence, levels=(), fills=(), taker_side=None):
+    """
+    Sends one book change to the product's market data group. Meant to run
+    from transaction.on_commit; a lost event shows up as a sequence gap, and
+    the hubs recover from that by reloading, so failures are only logged.
+    """
+    timestamp = now().isoformat()
+    event = {
+        "type": "market.event",
+        "product": product_id,
+        "sequence": sequence,
+        "levels": [[side, price, quantity] for side, price, quantity in levels],
+        "trades": [[fill.price, fill.quantity, taker_side, timestamp] for fill in fills],
+    }
+    try:
+        async_to_sync(get_channel_layer().group_send)(group_name(product_id), event)
+    except Exception:
+        logger.exception("Failed to publish market data for product %s", product_id)
+
+
+def format_levels(levels, reverse):
+    return [[str(from_ticks(price)), quantity] for price, quantity in sorted(levels.items(), reverse=reverse)]
+
+
+def format_trade(price, quantity, side, timestamp):
+    return {"price": str(from_ticks(price)), "quantity": quantity, "side": side, "time": timestamp}
+
+
+class ProductFeed:
+    """ The hub's view of one product's book, plus what changed since the last flush """
+
+    def __init__(self, product_id, tape_length):
+        self.product_id = product_id
+        self.sequence = None
+        self.bids = {}
+        self.asks = {}
+        self.trades = deque(maxlen=tape_length)
+        self.pending = {}
+        self.changed = {}
+        self.new_trades = []
+        self.stalled = 0
+        self.subscribers = set()
+        self.ready = asyncio.Event()
+
+    def load(self, snapshot):
+        self.sequence = snapshot["sequence"]
+        self.bids = dict(snapshot["bids"])
+        self.asks = dict(snapshot["asks"])
+        self.trades.clear()
+        self.trades.extend(snapshot["trades"])
+        self.pending = {sequence: event for sequence, event in self.pending.items() if sequence > self.sequence}
+        self.changed.clear()
+        self.new_trades.clear()
+        self.stalled = 0
+        self.ready.set()
+
+    def apply(self, event):
+        for side, price, quantity in event["levels"]:
+            levels = self.bids if side == BUY else self.asks
+            if quantity:
+                levels[price] = quantity
+            else:
+                levels.pop(price, None)
+            self.changed[(side, price)] = quantity
+        for trade in event["trades"]:
+            self.trades.appendleft(trade)
+            self.new_trades.append(trade)
+        self.sequence = event["sequence"]
+
+    def bbo(self):
+        best_bid = max(self.bids) if self.bids else None
+        best_ask = min(self.asks) if self.asks else None
+        return {
+            "bid": [str(from_ticks(best_bid)), self.bids[best_bid]] if best_bid is not None else None,
+            "ask": [str(from_ticks(best_ask)), self.asks[best_ask]] if best_ask is not None else None,
+        }
+
+    def snapshot(self):
+        return {
+            "type": "snapshot",
+            "product": self.product_id,
+            "sequence": self.sequence,
+            "bids": format_levels(self.bids, reverse=True),
+            "asks": format_levels(self.asks, reverse=False),
+            "bbo": self.bbo(),
+            "trades": [format_trade(*trade) for trade in self.trades],
+        }
+
+    def drain(self):
+        """ Applies every contiguous pending event; returns a delta frame or None """
+        previous = self.sequence
+        while self.sequence + 1 in self.pending:
+            self.apply(self.pending.pop(self.sequence + 1))
+        self.stalled = self.stalled + 1 if self.pending else 0
+
+        if self.sequence == previous:
+            return None
+        bids = {price: quantity for (side, price), quantity in self.changed.items() if side == BUY}
+        asks = {price: quantity for (side, price), quantity in self.changed.items() if side != BUY}
+        delta = {
+            "type": "delta",
+            "product": self.product_id,
+            "prev_sequence": previous,
+            "sequence": self.sequence,
+            "bids": format_levels(bids, reverse=True),
+            "asks": format_levels(asks, reverse=False),
+            "bbo": self.bbo(),
+            "trades": [format_trade(*trade) for trade in self.new_trades],
+        }
+        self.changed.clear()
+        self.new_trades.clear()
+        return delta
+
+
+@database_sync_to_async
+def load_snapshot(product_id, tape_length):
+    """ Depth from OrderBookState and the latest trades from the taker-side fill transactions """
+    state = OrderBookState.objects.filter(product_id=product_id).values("sequence", "bids", "asks").first()
+    state = state or {"sequence": 0, "bids": [], "asks": []}
+    trades = (
+        Transaction.objects
+        .filter(order__product_id=product_id, counter_order_id__lt=F("order_id"))
+        .order_by("-id")
+        .values_list("price", "quantity", "order__side", "timestamp")[:tape_length]
+    )
+    state["trades"] = [
+        [to_ticks(price), quantity, side, timestamp.isoformat()] for price, quantity, side, timestamp in trades
+    ]
+    return state
+
+
+class MarketDataHub:
+    """
+    Process-wide subscriber registry. One channel-layer channel receives the
+    events of every subscribed product, and one flush loop sends the
+    coalesced deltas. JSON for a frame is encoded once and shared by all
+    of its sockets.
+    """
+
+    def __init__(self):
+        self.feeds = {}
+        self.channel = None
+        self.tasks = []
+
+    @property
+    def interval(self):
+        return settings.MARKET_DATA_INTERVAL
+
+    async def subscribe(self, consumer, product_id):
+        feed = self.feeds.get(product_id)
+        if feed is None:
+            feed = self.feeds[product_id] = ProductFeed(product_id, settings.MARKET_DATA_TAPE_LENGTH)
+            await self.start()
+            # Join the group before reading the snapshot so no committed change falls in between
+            await get_channel_layer().group_add(group_name(product_id), self.channel)
+            try:
+                feed.load(await load_snapshot(product_id, settings.MARKET_DATA_TAPE_LENGTH))
+            except Exception:
+                del self.feeds[product_id]
+                feed.ready.set()
+                raise
+        await feed.ready.wait()
+        if self.feeds.get(product_id) is not feed:
+            return None
+        feed.subscribers.add(consumer)
+        return feed.snapshot()
+
+    async def unsubscribe(self, consumer, product_id):
+        feed = self.feeds.get(product_id)
+        if feed is None:
+            return
+        feed.subscribers.discard(consumer)
+        if not feed.subscribers and feed.ready.is_set():
+            del self.feeds[product_id]
+            await get_channel_layer().group_discard(group_name(product_id), self.channel)
+            if not self.feeds:
+                await self.stop()
+
+    async def unsubscribe_all(self, consumer):
+        for product_id in [pid for pid, feed in self.feeds.items() if consumer in feed.subscribers]:
+            await self.unsubscribe(consumer, product_id)
+
+    def resync(self, product_id):
+        feed = self.feeds.get(product_id)
+        return feed.snapshot() if feed is not None and feed.ready.is_set() else None
+
+    async def start(self):
+        if self.channel is None:
+            self.channel = await get_channel_layer().new_channel()
+            self.tasks = [asyncio.create_task(self.receive()), asyncio.create_task(self.flush_loop())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        self.channel = None
+
+    async def receive(self):
+        layer = get_channel_layer()
+        channel = self.channel
+        while True:
+            event = await layer.receive(channel)
+            feed = self.feeds.get(event["product"])
+            if feed is not None and (feed.sequence is None or event["sequence"] > feed.sequence):
+                feed.pending[event["sequence"]] = event
+
+    async def flush_loop(self):
+        refreshed = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            if time.monotonic() - refreshed > GROUP_REFRESH_SECONDS:
+                # Group membership expires on the channel layer; renew it for long-lived subscriptions
+                refreshed = time.monotonic()
+                for product_id in list(self.feeds):
+                    await get_channel_layer().group_add(group_name(product_id), self.channel)
+            for feed in list(self.feeds.values()):
+                try:
+                    await self.flush(feed)
+                except Exception:
+                    logger.exception("Failed to flush market data for product %s", feed.product_id)
+
+    async def flush(self, feed):
+        if not feed.ready.is_set():
+            return
+        frame = feed.drain()
+        if feed.stalled >= MAX_STALLED_FLUSHES:
+            # An event never arrived; start over from the committed state
+            feed.load(await load_snapshot(feed.product_id, settings.MARKET_DATA_TAPE_LENGTH))
+            frame = feed.snapshot()
+        if frame is not None:
+            await self.broadcast(feed, json.dumps(frame))
+
+    async def broadcast(self, feed, text):
+        await asyncio.gather(
+            *(consumer.send(text_data=text) for consumer in list(feed.subscribers)), return_exceptions=True
+        )
+
+
+hub = MarketDataHub()
@@ -0,0 +1,203 @@
+"""
+In-process price-time priority matching engine.
+
+Prices are handled as integer ticks (hundredths of a KZT) so comparisons and
+level keys stay cheap. Each side of a book keeps its level prices in a sorted
+`array('q')` with the best level at the end, so taking or emptying the best
+level is O(1); every level is a FIFO queue of resting orders.
+
+This module does not touch the database; trading.limit_orders persists fills
+and rebuilds books from open orders.
+"""
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import deque, namedtuple
+from decimal import Decimal
+
+BUY = 'buy'
+SELL = 'sell'
+TICKS_PER_UNIT = 100
+TICK = Decimal("0.01")
+
+Fill = namedtuple("Fill", "maker_id maker_user_id taker_id price quantity maker_remaining maker_quantity")
+MatchResult = namedtuple("MatchResult", "fills remaining levels sequence")
+
+
+def to_ticks(price):
+    return int(Decimal(price) * TICKS_PER_UNIT)
+
+
+def from_ticks(ticks):
+    return (Decimal(ticks) / TICKS_PER_UNIT).quantize(TICK)
+
+
+class BookSide:
+    """
+    One side of a book. Level keys are `price * sign` so that for both bids
+    (sign=1) and asks (sign=-1) the best level is the largest key, i.e. the
+    last element of `keys`.
+    """
+    __slots__ = ('sign', 'keys', 'queues', 'totals')
+
+    def __init__(self, sign):
+        self.sign = sign
+        self.keys = array('q')
+        self.queues = {}
+        self.totals = {}
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def best_price(self):
+        return self.keys[-1] * self.sign if self.keys else None
+
+    def add(self, price, entry):
+        key = price * self.sign
+        queue = self.queues.get(key)
+        if queue is None:
+            insort(self.keys, key)
+            queue = self.queues[key] = deque()
+            self.totals[key] = 0
+        queue.append(entry)
+        self.totals[key] += entry[1]
+
+    def remove_level(self, key):
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+        del self.queues[key]
+        del self.totals[key]
+
+    def depth(self, levels):
+        """ Aggregated [price_ticks, quantity] pairs, best first """
+        return [[key * self.sign, self.totals[key]] for key in reversed(self.keys[-levels:])]
+
+
+class OrderBook:
+    """
+    Limit order book for one product.
+    Resting entries are small lists: [order_id, remaining, user_id, quantity].
+    """
+
+    def __init__(self, product_id, sequence=0):
+        self.product_id = product_id
+        self.sequence = sequence
+        self.bids = BookSide(1)
+        self.asks = BookSide(-1)
+        self.index = {}
+
+    def add_resting(self, order_id, user_id, side, price, remaining, quantity=None):
+        """ Places an order on the book without matching it (used for recovery) """
+        book_side = self.bids if side == BUY else self.asks
+        book_side.add(price, [order_id, remaining, user_id, quantity or remaining])
+        self.index[order_id] = (book_side, price * book_side.sign)
+
+    def submit(self, order_id, user_id, side, price, quantity):
+        """
+        Matches an incoming limit order against the opposite side and rests any
+        remainder. Returns the fills, the unfilled quantity and the new
+        aggregate quantity of every level that changed.
+        """
+        if side == BUY:
+            opposite, crosses = self.asks, lambda best: best <= price
+        else:
+            opposite, crosses = self.bids, lambda best: best >= price
+
+        fills = []
+        levels = []
+        remaining = quantity
+        keys, queues, totals = opposite.keys, opposite.queues, opposite.totals
+
+        while remaining and keys:
+            key = keys[-1]
+            level_price = key * opposite.sign
+            if not crosses(level_price):
+                break
+
+            queue = queues[key]
+            while remaining and queue:
+                maker = queue[0]
+                traded = maker[1] if maker[1] < remaining else remaining
+                maker[1] -= traded
+                remaining -= traded
+                totals[key] -= traded
+                fills.append(Fill(maker[0], maker[2], order_id, level_price, traded, maker[1], maker[3]))
+                if not maker[1]:
+                    queue.popleft()
+                    del self.index[maker[0]]
+
+            if queue:
+                levels.append((SELL if side == BUY else BUY, level_price, totals[key]))
+            else:
+                keys.pop()
+                del queues[key]
+                del totals[key]
+                levels.append((SELL if side == BUY else BUY, level_price, 0))
+
+        if remaining:
+            self.add_resting(order_id, user_id, side, price, remaining, quantity)
+            own = self.bids if side == BUY else self.asks
+            levels.append((side, price, own.totals[price * own.sign]))
+
+        self.sequence += 1
+        return MatchResult(fills, remaining, levels, self.sequence)
+
+    def cancel(self, order_id):
+        """ Removes a resting order; returns its unfilled quantity or None if unknown """
+        located = self.index.pop(order_id, None)
+        if located is None:
+            return None
+        book_side, key = located
+        queue = book_side.queues[key]
+        for entry in queue:
+            if entry[0] == order_id:
+                queue.remove(entry)
+                book_side.totals[key] -= entry[1]
+                break
+        if not queue:
+            book_side.remove_level(key)
+        self.sequence += 1
+        return entry[1]
+
+    def level(self, side, price):
+        """ Quantity resting at `price` on `side` """
+        book_side = self.bids if side == BUY else self.asks
+        return book_side.totals.get(price * book_side.sign, 0)
+
+    def best_bid(self):
+        return self.bids.best_price()
+
+    def best_ask(self):
+        return self.asks.best_price()
+
+    def snapshot(self, levels=50):
+        """ Aggregated depth of both sides, as stored on OrderBookState """
+        return {
+            "sequence": self.sequence,
+            "bids": self.bids.depth(levels),
+            "asks": self.asks.depth(levels),
+        }
+
+
+class MatchingEngine:
+    """ Process-wide registry of order books, one per product """
+
+    def __init__(self):
+        self._books = {}
+        self._lock = threading.Lock()
+
+    def get(self, product_id):
+        return self._books.get(product_id)
+
+    def put(self, book):
+        with self._lock:
+            self._books[book.product_id] = book
+        return book
+
+    def drop(self, product_id):
+        with self._lock:
+            self._books.pop(product_id, None)
+
+
+engine = MatchingEngine()
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_alter_product_category_alter_product_image'),
+        ('trading', '0012_order_seller'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderBookState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.BigIntegerField(default=0)),
+                ('bids', models.JSONField(default=list)),
+                ('asks', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='filled_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='limit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='order_type',
+            field=models.CharField(choices=[('purchase', 'Purchase'), ('limit', 'Limit')], default='purchase', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='side',
+            field=models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell')], default='buy', max_length=4),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='counter_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='trading.order'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='quantity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('canceled', 'Canceled'), ('shipped', 'Shipped'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('open', 'Open'), ('partial', 'Partially Filled'), ('filled', 'Filled')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('order_type', 'limit'), ('status__in', ['open', 'partial'])), fields=['product', 'id'], name='order_resting_limit_idx'),
+        ),
+        migrations.AddField(
+            model_name='orderbookstate',
+            name='product',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='book_state', to='products.product'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_alter_product_category_alter_product_image'),
+        ('trading', '0013_limit_orders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('canceled', 'Canceled'), ('shipped', 'Shipped'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('expired', 'Expired'), ('open', 'Open'), ('partial', 'Partially Filled'), ('filled', 'Filled')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'approved'])), fields=['created_at'], name='order_awaiting_created_idx'),
+        ),
+    ]
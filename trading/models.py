@@ -12,16 +12,58 @@ class Order(models.Model):
         ('shipped', 'Shipped'),
         ('approved', 'Approved'),
         ('rejected', 'Rejected'),
+        ('expired', 'Expired'),
+        ('open', 'Open'),
+        ('partial', 'Partially Filled'),
+        ('filled', 'Filled'),
+    )
+
+    ORDER_TYPE_CHOICES = (
+        ('purchase', 'Purchase'),
+        ('limit', 'Limit'),
+    )
 
+    SIDE_CHOICES = (
+        ('buy', 'Buy'),
+        ('sell', 'Sell'),
     )
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="orders")
+    # Copy of product.user so trader-side queries can filter without joining products.
+    # Only meaningful for purchase orders: limit orders trade on the book and are listed by `user`
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sales", editable=False, db_index=False)
     quantity = models.PositiveIntegerField(default=1)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    order_type = models.CharField(max_length=10, choices=ORDER_TYPE_CHOICES, default='purchase')
+    side = models.CharField(max_length=4, choices=SIDE_CHOICES, default='buy')
+    limit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    filled_quantity = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            models.Index(fields=['seller', '-created_at', '-id'], name='order_seller_created_idx'),
+            models.Index(
+                fields=['product', 'id'],
+                condition=models.Q(order_type='limit', status__in=['open', 'partial']),
+                name='order_resting_limit_idx'
+            ),
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status__in=['pending', 'approved']),
+                name='order_awaiting_created_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.seller_id is None and self.product_id is not None:
+            self.seller_id = self.product.user_id
+        super().save(*args, **kwargs)
+
     def calculate_total(self):
         """ Calculates total price from product and quantity """
         self.total_price = self.quantity * self.product.price
@@ -39,6 +81,60 @@ class Transaction(models.Model):
     status_from = models.CharField(max_length=20, null=True)
     status_to = models.CharField(max_length=20, null=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    # Set only for limit-order fills
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    quantity = models.PositiveIntegerField(null=True, blank=True)
+    counter_order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-timestamp', '-id'], name='transaction_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"Transaction {self.id}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for an order between placement and payment.
+    The product's `stock` is decremented when the row is created, so `stock`
+    always means "available to buy"; releasing the reservation gives it back.
+    """
+    STATUS_CHOICES = (
+        ('active', 'Active'),
+        ('released', 'Released'),
+        ('consumed', 'Consumed'),
+    )
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="reservation")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], condition=models.Q(status='active'), name='reservation_active_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reservation {self.id} - {self.quantity} x {self.product_id} ({self.status})"
+
+
+class OrderBookState(models.Model):
+    """
+    Durable state of a product's limit order book.
+    The row is locked for every book mutation, which serializes matching for a
+    product across processes; `sequence` tells a process whether its in-memory
+    book is current, and `bids`/`asks` hold the aggregated depth at that sequence.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="book_state")
+    sequence = models.BigIntegerField(default=0)
+    bids = models.JSONField(default=list)
+    asks = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Order book for {self.product_id} @ {self.sequence}"
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, When, Value
+from django.utils.timezone import now
+
+from notifications.signals import bulk_notify
+from products.cache import invalidate_products
+from products.models import Product
+from trading.models import Order, StockReservation
+
+
+class InsufficientStock(Exception):
+    """ Raised when a product cannot cover the requested quantity """
+
+
+class CheckoutRejected(Exception):
+    """ Raised when any line of a cart cannot be ordered; carries per-line errors """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def place_order(user, product, quantity):
+    """
+    Create a pending order and reserve its stock in one transaction.
+    The stock is taken with a conditional UPDATE before the order row exists,
+    so a sold-out product never produces an order (or its notifications).
+    """
+    with transaction.atomic():
+        if not product.reduce_stock(quantity):
+            raise InsufficientStock(product.id)
+
+        order = Order.objects.create(
+            user=user,
+            product=product,
+            quantity=quantity,
+            total_price=product.price * quantity
+        )
+        StockReservation.objects.create(
+            order=order,
+            product=product,
+            quantity=quantity,
+            expires_at=now() + settings.STOCK_RESERVATION_TTL
+        )
+    return order
+
+
+def place_orders(user, items):
+    """
+    Batch version of place_order for a whole cart.
+    `items` maps product id -> quantity. All products are locked and validated
+    with one SELECT ... FOR UPDATE, stock is taken with one UPDATE, and the
+    orders and reservations are written with bulk_create. Either every line
+    is ordered or none is.
+    """
+    with transaction.atomic():
+        products = {
+            product.id: product
+            for product in Product.objects.select_for_update().filter(id__in=items).order_by('id')
+        }
+
+        errors = []
+        for product_id, quantity in items.items():
+            product = products.get(product_id)
+            if product is None:
+                errors.append({"product": product_id, "error": "Product not found"})
+            elif product.user_id == user.id:
+                errors.append({"product": product_id, "error": "You cannot purchase your own product."})
+            elif product.stock < quantity:
+                errors.append({"product": product_id, "error": "Not enough stock available"})
+        if errors:
+            raise CheckoutRejected(errors)
+
+        # Rows are locked, so the checks above still hold for this UPDATE
+        Product.objects.filter(id__in=items).update(
+            stock=F('stock') - Case(
+                *[When(id=product_id, then=Value(quantity)) for product_id, quantity in items.items()]
+            ),
+            updated_at=now()
+        )
+        invalidate_products(items)
+
+        orders = Order.objects.bulk_create([
+            Order(
+                user=user,
+                product=products[product_id],
+                seller_id=products[product_id].user_id,
+                quantity=quantity,
+                total_price=products[product_id].price * quantity
+            )
+            for product_id, quantity in items.items()
+        ])
+        expires_at = now() + settings.STOCK_RESERVATION_TTL
+        StockReservation.objects.bulk_create([
+            StockReservation(order=order, product_id=order.product_id, quantity=order.quantity, expires_at=expires_at)
+            for order in orders
+        ])
+
+        # One notification per seller instead of one per order
+        titles_by_seller = defaultdict(list)
+        for order in orders:
+            titles_by_seller[order.seller_id].append(order.product.title)
+        notifications = [
+            (seller_id, f"New order for {titles[0]} from {user.username}." if len(titles) == 1
+             else f"{len(titles)} new orders from {user.username}: {', '.join(titles)}.")
+            for seller_id, titles in titles_by_seller.items()
+        ]
+        transaction.on_commit(lambda: bulk_notify(notifications))
+    return orders
+
+
+def release_reservations(order_ids):
+    """
+    Give the stock held by the given orders back to their products.
+    Only active reservations are touched, so calling this twice is harmless.
+    Returns the number of reservations released.
+    """
+    with transaction.atomic():
+        reservations = list(
+            StockReservation.objects.select_for_update()
+            .filter(order_id__in=order_ids, status='active')
+            .values_list('id', 'product_id', 'quantity')
+        )
+        if not reservations:
+            return 0
+
+        per_product = defaultdict(int)
+        for _, product_id, quantity in reservations:
+            per_product[product_id] += quantity
+
+        StockReservation.objects.filter(id__in=[r[0] for r in reservations]).update(status='released')
+        Product.objects.filter(id__in=per_product).update(
+            stock=F('stock') + Case(
+                *[When(id=product_id, then=Value(quantity)) for product_id, quantity in per_product.items()]
+            ),
+            updated_at=now()
+        )
+        invalidate_products(per_product)
+    return len(reservations)
+
+
+def consume_reservations(order_ids):
+    """ Mark reservations as final once the order has been paid for """
+    return StockReservation.objects.filter(order_id__in=order_ids, status='active').update(status='consumed')
+
+
+def release_expired_reservations():
+    """
+    Release reservations past their expiry that nothing else will release: their
+    order has already left pending/approved (e.g. a status change that did not go
+    through release_reservations). Orders still awaiting approval or payment are
+    expired by trading.expiry, which releases their stock itself.
+    Returns the number of reservations released.
+    """
+    order_ids = list(
+        StockReservation.objects.filter(status='active', expires_at__lte=now())
+        .exclude(order__status__in=['pending', 'approved'])
+        .values_list('order_id', flat=True)
+    )
+    return release_reservations(order_ids) if order_ids else 0
@@ -0,0 +1,6 @@
+from django.urls import re_path
+from trading.consumers import MarketDataConsumer
+
+websocket_urlpatterns = [
+    re_path(r"ws/market/$", MarketDataConsumer.as_asgi()),
+]
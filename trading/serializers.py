@@ -1,10 +1,16 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 
 from products.serializers import ProductSerializer
-from sales.serializers import SalesOrderSerializer
+from sales.serializers import InvoiceURLListSerializer, SalesOrderSerializer
 from trading.models import Order, Transaction
 from products.models import Product
 
+class OrderListSerializer(InvoiceURLListSerializer):
+    invoice_path = ("sales_order", "invoice")
+
+
 class OrderSerializer(serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     product = ProductSerializer(read_only=True)
@@ -22,10 +28,15 @@ class OrderSerializer(serializers.ModelSerializer):
             "quantity",
             "total_price",
             "status",
+            "order_type",
+            "side",
+            "limit_price",
+            "filled_quantity",
             "sales_order",
             "shipping_address",
             "created_at",
         ]
+        list_serializer_class = OrderListSerializer
 
     def get_user(self, obj):
         return {
@@ -37,7 +48,7 @@ class OrderSerializer(serializers.ModelSerializer):
     def get_sales_order(self, obj):
         """ Returns full SalesOrder details if it exists """
         if hasattr(obj, "sales_order") and obj.sales_order:
-            return SalesOrderSerializer(obj.sales_order).data
+            return SalesOrderSerializer(obj.sales_order, context=self.context).data
         return None
 
 class TransactionSerializer(serializers.ModelSerializer):
@@ -46,4 +57,25 @@ class TransactionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Transaction
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=["approved", "rejected", "shipped"])
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    items = CheckoutItemSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class LimitOrderSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    side = serializers.ChoiceField(choices=Order.SIDE_CHOICES)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
+    quantity = serializers.IntegerField(min_value=1)
@@ -0,0 +1,18 @@
+from celery import shared_task
+
+from trading.expiry import expire_stale_orders as _expire_stale_orders
+from trading.reservations import release_expired_reservations as _release_expired_reservations
+
+
+@shared_task
+def release_expired_reservations():
+    """ Periodically return stock still held by orders that no longer need it """
+    released = _release_expired_reservations()
+    return f"Released {released} expired reservations"
+
+
+@shared_task
+def expire_stale_orders():
+    """ Periodically expire orders left pending or approved for too long """
+    report = _expire_stale_orders()
+    return f"Expired {report['expired']} stale orders in {report['batches']} batches ({report['seconds']}s)"
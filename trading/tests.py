@@ -1,3 +1,830 @@
-from django.test import TestCase
+import hashlib
+import json
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework.response import Response
+from rest_framework.test import APITestCase
+
+from products.models import Category, Product
+from sales.models import Invoice, Payment, SalesOrder
+from trading.expiry import expire_stale_orders
+from trading.consumers import MarketDataConsumer
+from trading.market_data import MAX_STALLED_FLUSHES, MarketDataHub, ProductFeed, group_name, hub
+from trading.matching import BUY, SELL, OrderBook
+from trading.models import Order, OrderBookState, StockReservation, Transaction
+from trading.reservations import InsufficientStock, place_order, release_expired_reservations
+from trading_app.idempotency import acquire_lock, idempotent, release_lock
+from trading_app.s3 import PRESIGNED_URL_EXPIRY
+from users.models import User
+
+
+class OrderQueryBudgetTests(APITestCase):
+    """
+    Query-count regression suite for the order endpoints.
+    Each endpoint has a fixed budget that must not depend on how many rows are
+    returned; raise a budget only together with the change that needs it.
+    """
+
+    ORDER_LIST_BUDGET = 2        # COUNT(*) for the paginator + one joined page query
+    ORDER_DETAIL_BUDGET = 1      # one joined lookup
+    TRANSACTION_LIST_BUDGET = 2  # COUNT(*) + one joined page query
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+        category = Category.objects.create(name="Metals")
+        cls.product = Product.objects.create(
+            user=cls.trader, title="Gold bar", price=100, stock=1000, category=category
+        )
+
+    def create_orders(self, count):
+        """ Create orders with sales orders, invoices and transactions, bypassing signals """
+        orders = Order.objects.bulk_create([
+            Order(user=self.customer, seller=self.trader, product=self.product, quantity=1, total_price=100, status="paid")
+            for _ in range(count)
+        ])
+        sales_orders = SalesOrder.objects.bulk_create([
+            SalesOrder(order=order, total_price=order.total_price, status="paid") for order in orders
+        ])
+        Invoice.objects.bulk_create([Invoice(sales_order=sales_order) for sales_order in sales_orders])
+        Transaction.objects.bulk_create([
+            Transaction(order=order, user=self.trader, status_from="approved", status_to="paid") for order in orders
+        ])
+        return orders
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries), response
+
+    def assert_constant_queries(self, url, budget, sizes=(1, 10, 50)):
+        """ The same request must cost `budget` queries whatever the result size """
+        created = 0
+        for size in sizes:
+            self.create_orders(size - created)
+            created = size
+            num_queries, _ = self.count_queries(f"{url}?page_size={size}")
+            self.assertLessEqual(
+                num_queries, budget,
+                f"{url} with {size} rows ran {num_queries} queries (budget {budget})"
+            )
+
+    def test_customer_order_list_is_constant(self):
+        self.client.force_authenticate(self.customer)
+        self.assert_constant_queries("/api/trading/orders/", self.ORDER_LIST_BUDGET)
+
+    def test_trader_order_list_is_constant(self):
+        self.client.force_authenticate(self.trader)
+        self.assert_constant_queries("/api/trading/orders/", self.ORDER_LIST_BUDGET)
+
+    def test_order_list_serializes_nested_objects(self):
+        self.create_orders(3)
+        self.client.force_authenticate(self.customer)
+        _, response = self.count_queries("/api/trading/orders/")
+        order = response.data["results"][0]
+        self.assertEqual(order["user"]["username"], "customer")
+        self.assertEqual(order["product"]["category_name"], "Metals")
+        self.assertEqual(order["sales_order"]["status"], "paid")
+        self.assertIsNotNone(order["sales_order"]["invoice"])
+
+    def test_order_detail_within_budget(self):
+        order = self.create_orders(1)[0]
+        self.client.force_authenticate(self.customer)
+        num_queries, _ = self.count_queries(f"/api/trading/orders/{order.id}/")
+        self.assertLessEqual(num_queries, self.ORDER_DETAIL_BUDGET)
+
+    def test_transaction_list_is_constant(self):
+        self.client.force_authenticate(self.trader)
+        self.assert_constant_queries("/api/trading/transactions/", self.TRANSACTION_LIST_BUDGET)
+
+    def test_keyset_pages_cost_one_query(self):
+        orders = self.create_orders(25)
+        self.client.force_authenticate(self.customer)
+
+        seen = []
+        url = "/api/trading/orders/?cursor=&page_size=10"
+        while url:
+            num_queries, response = self.count_queries(url)
+            self.assertEqual(num_queries, 1)  # no COUNT(*), no OFFSET
+            seen.extend(order["id"] for order in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(seen, sorted((order.id for order in orders), reverse=True))
+
+    def test_keyset_rejects_garbage_cursor(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get("/api/trading/orders/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class OrderSearchTests(APITestCase):
+    """ ?search= on the order list: product text, exact status, partial username """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        alice = User.objects.create_user(username="alice_smith", password="pass12345", role="customer")
+        bob = User.objects.create_user(username="bob", password="pass12345", role="customer")
+        product = Product.objects.create(user=cls.trader, title="Gold bar", price=100, stock=10)
+        cls.alice_order = Order.objects.create(user=alice, product=product, quantity=1, total_price=100)
+        cls.bob_order = Order.objects.create(user=bob, product=product, quantity=1, total_price=100, status="approved")
+
+    def search(self, text):
+        self.client.force_authenticate(self.trader)
+        response = self.client.get("/api/trading/orders/", {"search": text})
+        self.assertEqual(response.status_code, 200, response.content)
+        return {order["id"] for order in response.data["results"]}
+
+    def test_username_matches_partially_and_ignores_case(self):
+        self.assertEqual(self.search("alice"), {self.alice_order.id})
+        self.assertEqual(self.search("SMITH"), {self.alice_order.id})
+
+    def test_status_matches_exactly(self):
+        self.assertEqual(self.search("approved"), {self.bob_order.id})
+        self.assertEqual(self.search("approv"), set())
+
+    def test_product_title_matches(self):
+        self.assertEqual(self.search("gold"), {self.alice_order.id, self.bob_order.id})
+
+
+class InvoiceDownloadURLTests(APITestCase):
+    """ Invoice URLs on order lists are signed in one pass per page, then served from the cache """
+
+    @classmethod
+    def setUpTestData(cls):
+        trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+        product = Product.objects.create(user=trader, title="Gold bar", price=100, stock=1000)
+        for _ in range(3):
+            order = Order.objects.create(
+                user=cls.customer, seller=trader, product=product, quantity=1, total_price=100, status="paid"
+            )
+            sales_order, _ = SalesOrder.objects.get_or_create(order=order, defaults={"total_price": 100, "status": "paid"})
+            Invoice.objects.update_or_create(
+                sales_order=sales_order, defaults={"pdf_file": f"invoice/order_{sales_order.id}.pdf"}
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.s3 = mock.Mock()
+        self.s3.generate_presigned_url.side_effect = lambda method, Params, **kwargs: f"https://signed/{Params['Key']}"
+        patcher = mock.patch("trading_app.s3.get_s3_client", return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_authenticate(self.customer)
+
+    def test_order_list_signs_each_invoice_once(self):
+        response = self.client.get("/api/trading/orders/")
+        self.assertEqual(response.status_code, 200)
+        for order in response.data["results"]:
+            invoice = order["sales_order"]["invoice"]
+            self.assertEqual(invoice["pdf_file"], f"https://signed/invoice/order_{order['sales_order']['id']}.pdf")
+        self.assertEqual(self.s3.generate_presigned_url.call_count, 3)
+
+        self.client.get("/api/trading/orders/")
+        self.assertEqual(self.s3.generate_presigned_url.call_count, 3)
+
+    def test_urls_are_cached_for_half_their_lifetime(self):
+        with mock.patch("trading_app.s3.cache.set_many") as set_many:
+            self.client.get("/api/trading/orders/")
+        self.assertEqual(set_many.call_args.kwargs["timeout"], PRESIGNED_URL_EXPIRY // 2)
+
+
+# The idempotency lock uses Redis itself; a database of its own keeps cache.clear() away from other data
+@override_settings(CACHES={"default": {
+    "BACKEND": "django.core.cache.backends.redis.RedisCache",
+    "LOCATION": settings.CACHES["default"]["LOCATION"].rsplit("/", 1)[0] + "/15",
+}})
+class IdempotencyKeyTests(APITestCase):
+    """ Retried order creation with the same Idempotency-Key must not create a second order """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+        cls.product = Product.objects.create(user=cls.trader, title="Gold bar", price=100, stock=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.customer)
+
+    def post_order(self, key=None, quantity=1):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        return self.client.post("/api/trading/orders/", {"product": self.product.id, "quantity": quantity}, format="json", **headers)
+
+    def test_retry_replays_first_response(self):
+        first = self.post_order("key-1")
+        retry = self.post_order("key-1")
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data["id"], first.data["id"])
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 1)
+
+    def test_key_reused_for_different_body_is_rejected(self):
+        self.post_order("key-1")
+        response = self.post_order("key-1", quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.post_order()
+        self.post_order()
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 2)
+
+    def test_lock_taken_over_after_expiry_is_not_released(self):
+        digest = hashlib.sha256(f"{self.customer.pk}:/orders/:key-1".encode()).hexdigest()
+        lock_key = f"idempotency:{digest}:lock"
+
+        def slow_view(viewset, request):
+            # The lock timed out while the view ran and a retry now holds it
+            cache.delete(lock_key)
+            self.assertTrue(acquire_lock(lock_key, "retry-token"))
+            return Response({}, status=201)
+
+        request = SimpleNamespace(headers={"Idempotency-Key": "key-1"}, user=self.customer, path="/orders/", data={})
+        idempotent(slow_view)(None, request)
+
+        self.assertFalse(acquire_lock(lock_key, "third-token"))
+        self.assertTrue(release_lock(lock_key, "retry-token"))
+
+    def test_lock_is_released_after_the_request(self):
+        self.post_order("key-1")
+        digest = hashlib.sha256(f"{self.customer.pk}:/api/trading/orders/:key-1".encode()).hexdigest()
+        self.assertTrue(acquire_lock(f"idempotency:{digest}:lock", "next-token"))
+
+
+class StockReservationTests(APITestCase):
+    """ Orders take stock with a conditional UPDATE and hold it in a reservation until paid, canceled or expired """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+
+    def setUp(self):
+        self.product = Product.objects.create(user=self.trader, title="Gold bar", price=100, stock=3)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_place_order_reserves_stock(self):
+        order = place_order(self.customer, self.product, 2)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(order.reservation.quantity, 2)
+        self.assertEqual(order.reservation.status, "active")
+
+    def test_place_order_never_oversells(self):
+        place_order(self.customer, self.product, 3)
+        with self.assertRaises(InsufficientStock):
+            place_order(self.customer, self.product, 1)
+        self.assertEqual(self.stock(), 0)
+        self.assertEqual(Order.objects.filter(product=self.product).count(), 1)
+
+    def test_reduce_and_increase_stock(self):
+        self.assertFalse(self.product.reduce_stock(4))
+        self.assertEqual(self.stock(), 3)
+        self.assertTrue(self.product.reduce_stock(3))
+        self.assertEqual(self.stock(), 0)
+        self.product.increase_stock(2)
+        self.assertEqual(self.stock(), 2)
+
+    def test_cancel_releases_stock(self):
+        order = place_order(self.customer, self.product, 2)
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(f"/api/trading/orders/{order.id}/cancel/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.stock(), 3)
+        self.assertEqual(StockReservation.objects.get(order=order).status, "released")
+
+    def test_deleting_an_order_releases_stock(self):
+        order = place_order(self.customer, self.product, 2)
+        self.client.force_authenticate(self.customer)
+        response = self.client.delete(f"/api/trading/orders/{order.id}/")
+        self.assertEqual(response.status_code, 204, response.content)
+        self.assertEqual(self.stock(), 3)
+
+    def test_sweeper_releases_only_abandoned_reservations(self):
+        waiting = place_order(self.customer, self.product, 1)
+        abandoned = place_order(self.customer, self.product, 1)
+        StockReservation.objects.update(expires_at=now() - timedelta(minutes=1))
+        Order.objects.filter(id=abandoned.id).update(status="rejected")
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(self.stock(), 2)
+        # Orders still awaiting approval or payment are left to the expiry sweeper
+        self.assertEqual(Order.objects.get(id=waiting.id).status, "pending")
+        self.assertEqual(StockReservation.objects.get(order=waiting).status, "active")
+
+
+@override_settings(ORDER_EXPIRY={'pending': timedelta(hours=48), 'approved': timedelta(days=7)})
+class OrderExpiryTests(APITestCase):
+    """ The stale order sweeper: per-status thresholds, paid orders, batching """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username="seller", password="pass12345", role="trader")
+        cls.buyer = User.objects.create_user(username="buyer", password="pass12345", role="customer")
+
+    def setUp(self):
+        self.product = Product.objects.create(user=self.seller, title="Gold bar", price=100, stock=100)
+
+    def order(self, status, age):
+        order = place_order(self.buyer, self.product, 1)
+        Order.objects.filter(id=order.id).update(status=status, created_at=now() - age)
+        return order
+
+    def statuses(self, *orders):
+        return [Order.objects.get(id=order.id).status for order in orders]
+
+    def test_each_status_has_its_own_threshold(self):
+        young_pending = self.order('pending', timedelta(hours=47))
+        old_pending = self.order('pending', timedelta(hours=49))
+        young_approved = self.order('approved', timedelta(days=6))
+        old_approved = self.order('approved', timedelta(days=8))
+        old_shipped = self.order('shipped', timedelta(days=30))
+
+        report = expire_stale_orders()
+
+        self.assertEqual(report["expired"], 2)
+        self.assertEqual(
+            self.statuses(young_pending, old_pending, young_approved, old_approved, old_shipped),
+            ['pending', 'expired', 'approved', 'expired', 'shipped']
+        )
+        self.assertEqual(
+            set(Transaction.objects.filter(status_to='expired').values_list('order_id', 'status_from')),
+            {(old_pending.id, 'pending'), (old_approved.id, 'approved')}
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 97)
+
+    def test_paid_orders_are_not_expired(self):
+        paid_sales_order = self.order('approved', timedelta(days=8))
+        SalesOrder.objects.create(order=paid_sales_order, total_price=100, status='paid')
+        succeeded_payment = self.order('approved', timedelta(days=8))
+        Payment.objects.create(
+            sales_order=SalesOrder.objects.create(order=succeeded_payment, total_price=100), status='succeeded'
+        )
+        unpaid = self.order('approved', timedelta(days=8))
+        Payment.objects.create(sales_order=SalesOrder.objects.create(order=unpaid, total_price=100))
+
+        self.assertEqual(expire_stale_orders()["expired"], 1)
+        self.assertEqual(self.statuses(paid_sales_order, succeeded_payment, unpaid), ['approved', 'approved', 'expired'])
+
+    def test_sweeps_in_batches(self):
+        stale = [self.order('pending', timedelta(days=3)) for _ in range(5)]
+
+        report = expire_stale_orders(batch_size=2)
+
+        self.assertEqual((report["expired"], report["batches"]), (5, 3))
+        self.assertEqual(set(self.statuses(*stale)), {'expired'})
+        self.assertEqual(StockReservation.objects.filter(status='released').count(), 5)
+        self.assertEqual(expire_stale_orders(batch_size=2)["expired"], 0)
+
+
+class ConcurrentStockReservationTests(TransactionTestCase):
+    """ Parallel buyers of one product never take more than its stock """
+
+    BUYERS = 8
+
+    def test_parallel_buyers_cannot_oversell(self):
+        trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+        product = Product.objects.create(user=trader, title="Gold bar", price=100, stock=5)
+        results = []
+        barrier = threading.Barrier(self.BUYERS)
+
+        def buy():
+            barrier.wait()
+            try:
+                place_order(customer, product, 1)
+                results.append(True)
+            except InsufficientStock:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(self.BUYERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(Order.objects.filter(product=product).count(), 5)
+
+
+class BulkTransitionTests(APITestCase):
+    """ Traders move many orders at once; every id gets its own result """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.other_trader = User.objects.create_user(username="other", password="pass12345", role="trader")
+        cls.customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+
+    def setUp(self):
+        self.product = Product.objects.create(user=self.trader, title="Gold bar", price=100, stock=10)
+        self.client.force_authenticate(self.trader)
+
+    def transition(self, ids, target):
+        response = self.client.post("/api/trading/orders/bulk-transition/", {"ids": ids, "status": target}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_approve_reports_each_id(self):
+        pending = [place_order(self.customer, self.product, 1) for _ in range(3)]
+        Order.objects.filter(id=pending[2].id).update(status="canceled")
+        foreign = Product.objects.create(user=self.other_trader, title="Silver", price=10, stock=5)
+        not_mine = place_order(self.customer, foreign, 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.transition([pending[0].id, pending[1].id, pending[2].id, not_mine.id, 999999], "approved")
+
+        self.assertEqual(data["updated"], 2)
+        self.assertEqual([result["ok"] for result in data["results"]], [True, True, False, False, False])
+        self.assertEqual(data["results"][2]["error"], "Only pending orders can be approved")
+        self.assertEqual(data["results"][3]["error"], "Order not found")
+        self.assertEqual(Order.objects.filter(id__in=[pending[0].id, pending[1].id], status="approved").count(), 2)
+        self.assertEqual(Transaction.objects.filter(status_to="approved").count(), 2)
+        self.assertLessEqual(sum("FROM \"trading_order\"" in query["sql"] for query in queries), 2)
+
+    def test_reject_releases_stock(self):
+        orders = [place_order(self.customer, self.product, 2) for _ in range(2)]
+        self.transition([order.id for order in orders], "rejected")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+
+    def test_ship_requires_a_paid_sales_order(self):
+        paid, unpaid = [place_order(self.customer, self.product, 1) for _ in range(2)]
+        Order.objects.filter(id__in=[paid.id, unpaid.id]).update(status="paid")
+        SalesOrder.objects.update_or_create(order=paid, defaults={"total_price": 100, "status": "paid"})
+
+        data = self.transition([paid.id, unpaid.id], "shipped")
+
+        self.assertEqual(data["updated"], 1)
+        self.assertEqual(data["results"][1], {"id": unpaid.id, "ok": False, "error": "Order has not been paid yet", "status": "paid"})
+        self.assertEqual(Order.objects.get(id=paid.id).status, "shipped")
+        self.assertEqual(Order.objects.get(id=unpaid.id).status, "paid")
+
+    def test_single_ship_uses_the_same_guard(self):
+        order = place_order(self.customer, self.product, 1)
+        Order.objects.filter(id=order.id).update(status="paid")
+        response = self.client.post(f"/api/trading/orders/{order.id}/ship/")
+        self.assertEqual(response.status_code, 400)
+
+        SalesOrder.objects.update_or_create(order=order, defaults={"total_price": 100, "status": "paid"})
+        response = self.client.post(f"/api/trading/orders/{order.id}/ship/")
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class CheckoutTests(APITestCase):
+    """ A cart is ordered in one request; every line succeeds or none does """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.traders = [
+            User.objects.create_user(username=f"trader{i}", password="pass12345", role="trader") for i in range(2)
+        ]
+        cls.customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(user=self.traders[i % 2], title=f"Item {i}", price=10 + i, stock=5) for i in range(3)
+        ]
+        self.client.force_authenticate(self.customer)
+
+    def checkout(self, items):
+        return self.client.post("/api/trading/orders/checkout/", {"items": items}, format="json")
+
+    def stock(self):
+        return list(Product.objects.filter(id__in=[p.id for p in self.products]).order_by("id").values_list("stock", flat=True))
+
+    def test_creates_every_order_and_takes_stock(self):
+        response = self.checkout([
+            {"product": self.products[0].id, "quantity": 2},
+            {"product": self.products[1].id, "quantity": 1},
+            {"product": self.products[0].id, "quantity": 1},
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.data["orders"]), 2)  # repeated products collapse into one line
+        self.assertEqual(response.data["total_price"], "41.00")
+        self.assertEqual(self.stock(), [2, 4, 5])
+        self.assertEqual(StockReservation.objects.filter(order__user=self.customer, status="active").count(), 2)
+        self.assertEqual(
+            set(Order.objects.filter(user=self.customer).values_list("seller_id", flat=True)),
+            {self.traders[0].id, self.traders[1].id},
+        )
+
+    def test_one_bad_line_rejects_the_whole_cart(self):
+        response = self.checkout([
+            {"product": self.products[0].id, "quantity": 1},
+            {"product": self.products[1].id, "quantity": 6},
+            {"product": 999999, "quantity": 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["items"], [
+            {"product": self.products[1].id, "error": "Not enough stock available"},
+            {"product": 999999, "error": "Product not found"},
+        ])
+        self.assertEqual(self.stock(), [5, 5, 5])
+        self.assertFalse(Order.objects.filter(user=self.customer).exists())
+
+    def test_own_products_are_rejected(self):
+        self.client.force_authenticate(self.traders[0])
+        response = self.checkout([{"product": self.products[0].id, "quantity": 1}])
+        self.assertEqual(response.status_code, 403)  # checkout is for customers only
+
+        own = Product.objects.create(user=self.customer, title="Resold", price=1, stock=5)
+        self.client.force_authenticate(self.customer)
+        response = self.checkout([
+            {"product": self.products[0].id, "quantity": 1},
+            {"product": own.id, "quantity": 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["items"], [{"product": own.id, "error": "You cannot purchase your own product."}])
+        self.assertEqual(self.stock(), [5, 5, 5])
+
+
+class MatchingEngineTests(SimpleTestCase):
+    """ Price-time priority matching on the in-memory book (prices in ticks) """
+
+    def setUp(self):
+        self.book = OrderBook(product_id=1)
+
+    def test_best_price_fills_first(self):
+        self.book.submit(1, 10, SELL, 10100, 1)
+        self.book.submit(2, 10, SELL, 10000, 1)
+        self.book.submit(3, 10, SELL, 10200, 1)
+
+        result = self.book.submit(4, 20, BUY, 10100, 3)
+
+        self.assertEqual([(fill.maker_id, fill.price) for fill in result.fills], [(2, 10000), (1, 10100)])
+        self.assertEqual(result.remaining, 1)
+        self.assertEqual(self.book.best_bid(), 10100)
+        self.assertEqual(self.book.best_ask(), 10200)
+
+    def test_earlier_order_fills_first_at_the_same_price(self):
+        self.book.submit(1, 10, SELL, 10000, 2)
+        self.book.submit(2, 11, SELL, 10000, 2)
+
+        result = self.book.submit(3, 20, BUY, 10000, 3)
+
+        self.assertEqual([(fill.maker_id, fill.quantity) for fill in result.fills], [(1, 2), (2, 1)])
+        self.assertEqual(self.book.level(SELL, 10000), 1)
+
+    def test_partial_fill_keeps_the_maker_resting(self):
+        self.book.submit(1, 10, SELL, 10000, 5)
+
+        result = self.book.submit(2, 20, BUY, 10000, 2)
+
+        [fill] = result.fills
+        self.assertEqual((fill.quantity, fill.maker_remaining, fill.maker_quantity), (2, 3, 5))
+        self.assertEqual(result.remaining, 0)
+        self.assertEqual(self.book.level(SELL, 10000), 3)
+        self.assertIn((SELL, 10000, 3), result.levels)
+
+    def test_remainder_rests_when_the_book_runs_out(self):
+        self.book.submit(1, 10, SELL, 10000, 2)
+
+        result = self.book.submit(2, 20, BUY, 10100, 5)
+
+        self.assertEqual(result.remaining, 3)
+        self.assertIsNone(self.book.best_ask())
+        self.assertEqual(self.book.best_bid(), 10100)
+        self.assertEqual(self.book.level(BUY, 10100), 3)
+
+    def test_orders_that_do_not_cross_rest(self):
+        self.book.submit(1, 10, SELL, 10000, 1)
+        result = self.book.submit(2, 20, BUY, 9900, 1)
+        self.assertEqual(result.fills, [])
+        self.assertEqual((self.book.best_bid(), self.book.best_ask()), (9900, 10000))
+
+    def test_cancel_removes_the_order_and_empty_level(self):
+        self.book.submit(1, 10, SELL, 10000, 2)
+        self.book.submit(2, 10, SELL, 10000, 3)
+        sequence = self.book.sequence
+
+        self.assertEqual(self.book.cancel(1), 2)
+        self.assertIsNone(self.book.cancel(1))
+        self.assertEqual(self.book.sequence, sequence + 1)
+
+        result = self.book.submit(3, 20, BUY, 10000, 5)
+        self.assertEqual([fill.maker_id for fill in result.fills], [2])
+        self.assertEqual(result.remaining, 2)
+
+        self.assertEqual(self.book.cancel(3), 2)
+        self.assertIsNone(self.book.best_bid())
+        self.assertEqual(self.book.snapshot()["bids"], [])
+
+
+class LimitOrderTests(APITestCase):
+    """ Limit orders through the API: the owner sells out of stock, everyone else buys """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.other_trader = User.objects.create_user(username="other", password="pass12345", role="trader")
+        cls.customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+
+    def setUp(self):
+        self.product = Product.objects.create(user=self.trader, title="Gold bar", price=100, stock=10)
+
+    def place(self, user, side, price, quantity):
+        self.client.force_authenticate(user)
+        return self.client.post("/api/trading/orders/", {
+            "order_type": "limit", "product": self.product.id, "side": side, "price": price, "quantity": quantity
+        }, format="json")
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_sell_orders_take_stock_from_the_owner_only(self):
+        self.assertEqual(self.place(self.trader, "sell", "100.00", 4).status_code, 201)
+        self.assertEqual(self.stock(), 6)
+
+        self.assertEqual(self.place(self.trader, "sell", "100.00", 7).data["error"], "Not enough stock available")
+        self.assertEqual(self.place(self.other_trader, "sell", "90.00", 1).status_code, 400)
+        self.assertEqual(self.place(self.trader, "buy", "110.00", 1).status_code, 400)
+        self.assertEqual(self.stock(), 6)
+
+    def test_buy_fills_against_the_owners_sell(self):
+        sell = self.place(self.trader, "sell", "100.00", 4).data
+        buy = self.place(self.customer, "buy", "105.00", 3).data
+
+        self.assertEqual(buy["status"], "filled")
+        self.assertEqual(buy["fills"], [{"counter_order": sell["id"], "price": "100.00", "quantity": 3}])
+        self.assertEqual(Order.objects.get(id=sell["id"]).status, "partial")
+        self.assertEqual(Transaction.objects.filter(price__isnull=False).count(), 2)
+        self.assertEqual(self.stock(), 6)
+
+    def test_traders_list_their_own_limit_orders_only(self):
+        own_product = self.place(self.trader, "sell", "100.00", 1).data
+        book_order = self.place(self.customer, "buy", "90.00", 1).data
+        foreign_product = Product.objects.create(user=self.other_trader, title="Silver", price=10, stock=5)
+        self.client.force_authenticate(self.trader)
+        elsewhere = self.client.post("/api/trading/orders/", {
+            "order_type": "limit", "product": foreign_product.id, "side": "buy", "price": "9.00", "quantity": 1
+        }, format="json").data
+
+        response = self.client.get("/api/trading/orders/")
+
+        ids = {order["id"] for order in response.data["results"]}
+        self.assertEqual(ids, {own_product["id"], elsewhere["id"]})
+        self.assertNotIn(book_order["id"], ids)
+        self.assertEqual(self.client.post(f"/api/trading/orders/{elsewhere['id']}/cancel/").status_code, 200)
+
+    def test_cancel_returns_the_unsold_stock(self):
+        sell = self.place(self.trader, "sell", "100.00", 5).data
+        self.place(self.customer, "buy", "100.00", 2)
+
+        self.client.force_authenticate(self.trader)
+        response = self.client.post(f"/api/trading/orders/{sell['id']}/cancel/")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.stock(), 8)
+        self.assertEqual(Order.objects.get(id=sell["id"]).status, "canceled")
+
+
+def market_event(sequence, levels=(), trades=()):
+    return {"type": "market.event", "product": 1, "sequence": sequence, "levels": list(levels), "trades": list(trades)}
+
+
+class MarketDataFeedTests(SimpleTestCase):
+    """ ProductFeed folds book events into per-flush deltas and stops at sequence gaps """
+
+    def setUp(self):
+        self.feed = ProductFeed(1, tape_length=10)
+        self.feed.load({"sequence": 5, "bids": [[10000, 2]], "asks": [[10100, 1]], "trades": []})
+
+    def queue(self, *events):
+        for event in events:
+            self.feed.pending[event["sequence"]] = event
+
+    def test_in_order_events_coalesce_into_one_delta(self):
+        self.queue(
+            market_event(6, [[BUY, 10000, 5]]),
+            market_event(7, [[BUY, 10000, 3], [SELL, 10100, 0]], [[10100, 1, BUY, "t1"]]),
+            market_event(8, [[SELL, 10200, 4]], [[10200, 2, BUY, "t2"]]),
+        )
+
+        delta = self.feed.drain()
+
+        self.assertEqual((delta["type"], delta["prev_sequence"], delta["sequence"]), ("delta", 5, 8))
+        # Only the latest quantity of each touched level, and 0 for removed levels
+        self.assertEqual(delta["bids"], [["100.00", 3]])
+        self.assertEqual(delta["asks"], [["101.00", 0], ["102.00", 4]])
+        self.assertEqual(delta["bbo"], {"bid": ["100.00", 3], "ask": ["102.00", 4]})
+        self.assertEqual([trade["time"] for trade in delta["trades"]], ["t1", "t2"])
+        self.assertIsNone(self.feed.drain())
+
+    def test_deltas_chain_by_prev_sequence(self):
+        self.queue(market_event(6, [[BUY, 9900, 1]]))
+        first = self.feed.drain()
+        self.queue(market_event(7, [[BUY, 9900, 0]]))
+        second = self.feed.drain()
+
+        self.assertEqual((first["prev_sequence"], first["sequence"]), (5, 6))
+        self.assertEqual((second["prev_sequence"], second["sequence"]), (6, 7))
+        self.assertEqual(second["bids"], [["99.00", 0]])
+
+    def test_gap_stalls_until_the_missing_event_arrives(self):
+        self.queue(market_event(7, [[BUY, 9900, 1]]))
+
+        self.assertIsNone(self.feed.drain())
+        self.assertIsNone(self.feed.drain())
+        self.assertEqual((self.feed.sequence, self.feed.stalled), (5, 2))
+
+        self.queue(market_event(6, [[BUY, 9800, 1]]))
+        delta = self.feed.drain()
+        self.assertEqual((delta["prev_sequence"], delta["sequence"], self.feed.stalled), (5, 7, 0))
+
+    async def test_stalled_feed_reloads_a_snapshot_and_resumes_from_it(self):
+        hub = MarketDataHub()
+        frames = []
+
+        async def broadcast(feed, text):
+            frames.append(json.loads(text))
+
+        hub.broadcast = broadcast
+        self.queue(market_event(7, [[BUY, 9900, 1]]), market_event(10, [[BUY, 9900, 2]]))
+        snapshot = {"sequence": 9, "bids": [[9900, 1]], "asks": [], "trades": []}
+
+        with mock.patch("trading.market_data.load_snapshot", mock.AsyncMock(return_value=snapshot)) as load:
+            for _ in range(MAX_STALLED_FLUSHES):
+                await hub.flush(self.feed)
+
+        load.assert_awaited_once_with(1, mock.ANY)
+        self.assertEqual([(frame["type"], frame["sequence"]) for frame in frames], [("snapshot", 9)])
+        # Events the snapshot already covers are dropped; the next one continues from it
+        self.assertEqual(list(self.feed.pending), [10])
+        await hub.flush(self.feed)
+        self.assertEqual((frames[-1]["type"], frames[-1]["prev_sequence"], frames[-1]["sequence"]), ("delta", 9, 10))
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}, MARKET_DATA_INTERVAL=0.01
+)
+class MarketDataConsumerTests(TestCase):
+    """ Subscribing over the market data socket: snapshot first, then deltas, until unsubscribed """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        cls.product = Product.objects.create(user=cls.trader, title="Gold bar", price=100, stock=10)
+        OrderBookState.objects.create(product=cls.product, sequence=3, bids=[[10000, 2]], asks=[])
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(MarketDataConsumer.as_asgi(), "/ws/market/")
+        communicator.scope["user"] = self.trader
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_subscribe_streams_snapshot_then_deltas_until_unsubscribed(self):
+        communicator = await self.connect()
+        product_id = self.product.id
+
+        await communicator.send_json_to({"action": "subscribe", "product": product_id})
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual((snapshot["type"], snapshot["sequence"]), ("snapshot", 3))
+        self.assertEqual(snapshot["bids"], [["100.00", 2]])
+
+        await get_channel_layer().group_send(group_name(product_id), dict(
+            market_event(4, [[SELL, 10100, 1]]), product=product_id
+        ))
+        delta = await communicator.receive_json_from(timeout=2)
+        self.assertEqual((delta["type"], delta["prev_sequence"], delta["sequence"]), ("delta", 3, 4))
+        self.assertEqual(delta["bbo"], {"bid": ["100.00", 2], "ask": ["101.00", 1]})
+
+        await communicator.send_json_to({"action": "unsubscribe", "product": product_id})
+        self.assertEqual(await communicator.receive_json_from(), {"type": "unsubscribed", "product": product_id})
+        self.assertNotIn(product_id, hub.feeds)
+        self.assertIsNone(hub.channel)
+
+        await communicator.send_json_to({"action": "resync", "product": product_id})
+        self.assertEqual((await communicator.receive_json_from())["type"], "error")
+        await communicator.disconnect()
+
+    async def test_rejects_anonymous_sockets(self):
+        communicator = WebsocketCommunicator(MarketDataConsumer.as_asgi(), "/ws/market/")
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
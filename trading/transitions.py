@@ -0,0 +1,67 @@
+from django.db import transaction
+
+from notifications.signals import bulk_notify
+from trading.models import Order, Transaction
+from trading.reservations import release_reservations
+
+
+# target status -> (required current status, error for anything else, customer notification)
+TRADER_TRANSITIONS = {
+    'approved': ('pending', "Only pending orders can be approved", "Your order {id} has been approved by the seller."),
+    'rejected': ('pending', "Only pending orders can be rejected", "Your order {id} has been rejected by the seller."),
+    'shipped': ('paid', "You can only ship paid orders", "Your order {id} has been shipped."),
+}
+# Like OrderViewSet.ship, shipping also needs the sales order to record the payment
+UNPAID_ERROR = "Order has not been paid yet"
+
+
+def bulk_transition(trader, order_ids, target):
+    """
+    Move many of a trader's orders to `target` in a fixed number of queries:
+    one locking SELECT to validate, one conditional UPDATE, one bulk INSERT
+    of Transaction rows. Returns one result dict per requested id, in order.
+    """
+    source, error, message = TRADER_TRANSITIONS[target]
+    order_ids = list(dict.fromkeys(order_ids))
+
+    with transaction.atomic():
+        current = {
+            order_id: (status, customer_id, sales_order_status)
+            for order_id, status, customer_id, sales_order_status in Order.objects.select_for_update(of=('self',))
+            .filter(id__in=order_ids, seller=trader)
+            .order_by('id')
+            .values_list('id', 'status', 'user_id', 'sales_order__status')
+        }
+        unpaid = {
+            order_id for order_id, (status, _, sales_order_status) in current.items()
+            if target == 'shipped' and status == source and sales_order_status != 'paid'
+        }
+        valid = [
+            order_id for order_id in order_ids
+            if current.get(order_id, (None,))[0] == source and order_id not in unpaid
+        ]
+
+        if valid:
+            # Rows are locked above, so the status guard here can no longer lose a race
+            Order.objects.filter(id__in=valid, status=source).update(status=target)
+            Transaction.objects.bulk_create([
+                Transaction(order_id=order_id, user=trader, status_from=source, status_to=target)
+                for order_id in valid
+            ])
+            if target == 'rejected':
+                release_reservations(valid)
+
+            notifications = [(current[order_id][1], message.format(id=order_id)) for order_id in valid]
+            transaction.on_commit(lambda: bulk_notify(notifications))
+
+    results = []
+    for order_id in order_ids:
+        if order_id not in current:
+            results.append({"id": order_id, "ok": False, "error": "Order not found"})
+        elif order_id in valid:
+            results.append({"id": order_id, "ok": True, "status": target})
+        elif order_id in unpaid:
+            results.append({"id": order_id, "ok": False, "error": UNPAID_ERROR, "status": current[order_id][0]})
+        else:
+            results.append({"id": order_id, "ok": False, "error": error, "status": current[order_id][0]})
+    return results
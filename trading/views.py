@@ -1,25 +1,39 @@
+from django.db import transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.pagination import PageNumberPagination
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from products.models import Product
 from sales.models import SalesOrder
 from trading.models import Order, Transaction
-from trading.serializers import OrderSerializer, TransactionSerializer
+from trading.reservations import CheckoutRejected, InsufficientStock, place_order, place_orders, release_reservations
+from trading.limit_orders import LimitOrderRejected, cancel_limit_order, submit_limit_order
+from trading.matching import from_ticks
+from trading.serializers import (
+    OrderSerializer, TransactionSerializer, BulkTransitionSerializer, CheckoutSerializer, LimitOrderSerializer
+)
+from trading.transitions import bulk_transition
+from trading_app.idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from trading_app.pagination import KeysetPagination
+from trading_app.search import FullTextSearchFilter
 from trading_app.permissions import IsOwnerOrAdmin, IsCustomer, IsTrader
 
 
-class OrderPagination(PageNumberPagination):
+class OrderPagination(KeysetPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
+class TransactionPagination(KeysetPagination):
+    keyset_field = 'timestamp'
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     """
     API for managing customer orders.
@@ -30,9 +44,13 @@ class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all().order_by('-created_at')
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['status']
-    search_fields = ['status', 'user__username', 'product__title']
+    search_vector_field = 'product__search_vector'
+    trigram_fields = ['product__title']
+    search_exact_fields = ['status']
+    search_contains_fields = ['user__username']
+    rank_search_results = False  # keyset pagination needs the fixed (-created_at, -id) order
     ordering_fields = ['created_at', 'total_price']
     pagination_class = OrderPagination
 
@@ -43,11 +61,29 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         user = self.request.user
         if user.is_trader():
-            return Order.objects.filter(product__user=user)
-        return Order.objects.filter(user=user)
-
+            # `seller` is the product owner; on limit orders that is not a party to the order
+            queryset = Order.objects.filter(Q(seller=user, order_type='purchase') | Q(user=user, order_type='limit'))
+        else:
+            queryset = Order.objects.filter(user=user)
+
+        # Everything OrderSerializer touches, loaded in the same query
+        return queryset.select_related(
+            "user", "product", "product__category", "sales_order", "sales_order__invoice"
+        ).order_by('-created_at', '-id')
+
+    def perform_destroy(self, instance):
+        """Give reserved stock back before the reservation row is deleted with the order"""
+        with transaction.atomic():
+            release_reservations([instance.id])
+            instance.delete()
+
+    @swagger_auto_schema(manual_parameters=[IDEMPOTENCY_KEY_PARAMETER])
+    @idempotent
     def create(self, request, *args, **kwargs):
-        """Customers request an order (needs trader approval)"""
+        """Customers request an order (needs trader approval), or place a limit order"""
+        if request.data.get("order_type") == "limit":
+            return self.create_limit_order(request)
+
         product_id = request.data.get("product")
         quantity = request.data.get("quantity", 1)
 
@@ -59,17 +95,17 @@ class OrderViewSet(viewsets.ModelViewSet):
         if product.user == request.user:
             return Response({"error": "You cannot purchase your own product."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if product.stock < int(quantity):
-            return Response({"error": "Not enough stock available"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Create the order
-        order = Order.objects.create(
-            user=request.user,
-            product=product,
-            quantity=quantity,
-            total_price=product.price * int(quantity)
-        )
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity < 1:
+            return Response({"error": "Quantity must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            order = place_order(request.user, product, quantity)
+        except InsufficientStock:
+            return Response({"error": "Not enough stock available"}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({
             "id": order.id,
@@ -78,6 +114,67 @@ class OrderViewSet(viewsets.ModelViewSet):
             "message": "Order request sent to trader for approval."
         }, status=status.HTTP_201_CREATED)
 
+    def create_limit_order(self, request):
+        """Limit orders are matched immediately against the product's order book"""
+        serializer = LimitOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        product = get_object_or_404(Product, id=data["product"])
+        try:
+            order, fills = submit_limit_order(request.user, product, data["side"], data["price"], data["quantity"])
+        except LimitOrderRejected as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock:
+            return Response({"error": "Not enough stock available"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "id": order.id,
+            "status": order.status,
+            "side": order.side,
+            "limit_price": str(order.limit_price),
+            "quantity": order.quantity,
+            "filled_quantity": order.filled_quantity,
+            "fills": [
+                {"counter_order": fill.maker_id, "price": str(from_ticks(fill.price)), "quantity": fill.quantity}
+                for fill in fills
+            ]
+        }, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        method='post',
+        request_body=CheckoutSerializer,
+        operation_description="Order every item of a cart in one request",
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={201: "Created orders"}
+    )
+    @action(detail=False, methods=['post'], permission_classes=[IsCustomer])
+    @idempotent
+    def checkout(self, request):
+        """Customers order a whole cart at once; all items succeed or none do"""
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # Repeated products in the cart collapse into a single order line
+        items = {}
+        for item in serializer.validated_data["items"]:
+            items[item["product"]] = items.get(item["product"], 0) + item["quantity"]
+
+        try:
+            orders = place_orders(request.user, items)
+        except CheckoutRejected as e:
+            return Response({"error": "Checkout failed", "items": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "orders": [
+                {"id": order.id, "product": order.product_id, "quantity": order.quantity,
+                 "status": order.status, "total_price": str(order.total_price)}
+                for order in orders
+            ],
+            "total_price": str(sum(order.total_price for order in orders)),
+            "message": "Order requests sent to traders for approval."
+        }, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['post'], permission_classes=[IsTrader])
     def approve(self, request, pk=None):
         """Trader (who owns the product) approves an order"""
@@ -86,7 +183,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.status != 'pending':
             return Response({"error": "Only pending orders can be approved"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if order.product.user != request.user:
+        if order.seller_id != request.user.id:
             return Response({"error": "You cannot approve this order"}, status=status.HTTP_403_FORBIDDEN)
 
         order.status = "approved"
@@ -113,7 +210,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.status != 'pending':
             return Response({"error": "Only pending orders can be rejected"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if order.product.user != request.user:
+        if order.seller_id != request.user.id:
             return Response({"error": "You cannot reject this order"}, status=status.HTTP_403_FORBIDDEN)
 
         order.status = "rejected"
@@ -126,6 +223,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             status_from="pending",
             status_to="rejected"
         )
+        release_reservations([order.id])
 
 
 
@@ -140,7 +238,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({"error": "You can only ship paid orders"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Verify payment exists in SalesOrder
-        sales_order = SalesOrder.objects.filter(order=order, status="succeeded").first()
+        sales_order = SalesOrder.objects.filter(order=order, status="paid").first()
         if not sales_order:
             return Response({"error": "Order has not been paid yet"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -159,15 +257,43 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         return Response({"message": "Order shipped", "order_id": order.id})
 
-    @action(detail=True, methods=['post'], permission_classes=[IsCustomer])
+    @swagger_auto_schema(
+        method='post',
+        request_body=BulkTransitionSerializer,
+        operation_description="Approve, reject or ship many of the trader's orders at once",
+        responses={200: "Per-order results"}
+    )
+    @action(detail=False, methods=['post'], permission_classes=[IsTrader], url_path='bulk-transition')
+    def bulk_transition(self, request):
+        """Trader moves a batch of orders to one state; each id gets its own result"""
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = bulk_transition(request.user, serializer.validated_data["ids"], serializer.validated_data["status"])
+
+        return Response({
+            "updated": sum(1 for result in results if result["ok"]),
+            "results": results
+        })
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def cancel(self, request, pk=None):
-        """Allow customers to cancel an order before approval"""
+        """Allow customers to cancel an order before approval, or pull a resting limit order"""
         order = self.get_object()
 
         if order.user != request.user:
             return Response({"error": "You do not have permission to cancel this order."},
                             status=status.HTTP_403_FORBIDDEN)
 
+        if order.order_type == "limit":
+            if not cancel_limit_order(order, request.user):
+                return Response({"error": "Only open limit orders can be canceled."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"message": "Order canceled", "order_id": order.id})
+
+        if not request.user.is_customer():
+            return Response({"error": "You do not have permission to cancel this order."},
+                            status=status.HTTP_403_FORBIDDEN)
+
         if order.status != 'pending':
             return Response({"error": "Only pending orders can be canceled."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -181,6 +307,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             status_from="pending",
             status_to="canceled"
         )
+        release_reservations([order.id])
 
 
         return Response({"message": "Order canceled", "order_id": order.id})
@@ -194,6 +321,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     search_fields = ['order__id', 'status_from', 'status_to', 'user__username']
+    pagination_class = TransactionPagination
 
     def get_queryset(self):
         """Filter transactions based on user role"""
@@ -202,5 +330,9 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
         user = self.request.user
         if user.is_trader():
-            return Transaction.objects.filter(order__product__user=user)
-        return Transaction.objects.filter(order__user=user)
\ No newline at end of file
+            queryset = Transaction.objects.filter(
+                Q(order__seller=user, order__order_type='purchase') | Q(order__user=user, order__order_type='limit')
+            )
+        else:
+            queryset = Transaction.objects.filter(order__user=user)
+        return queryset.select_related("order", "user").order_by("-timestamp", "-id")
\ No newline at end of file
@@ -16,7 +16,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trading_app.settings')
 django_asgi_app = get_asgi_application()
 
 from channels.routing import ProtocolTypeRouter, URLRouter
-from notifications.routing import websocket_urlpatterns
+from notifications.routing import websocket_urlpatterns as notification_urlpatterns
+from trading.routing import websocket_urlpatterns as market_urlpatterns
 from trading_app.auth_middleware import JWTSessionAuthMiddleware
 from channels.security.websocket import AllowedHostsOriginValidator
 
@@ -27,7 +28,7 @@ application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
         JWTSessionAuthMiddleware(
-            URLRouter(websocket_urlpatterns)
+            URLRouter(notification_urlpatterns + market_urlpatterns)
         )
     ),
 })
@@ -5,4 +5,19 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "trading_app.settings")
 
 app = Celery("trading_app")
 app.config_from_object("django.conf:settings", namespace="CELERY")
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+app.conf.beat_schedule = {
+    "release-expired-stock-reservations": {
+        "task": "trading.tasks.release_expired_reservations",
+        "schedule": 300.0,
+    },
+    "expire-stale-orders": {
+        "task": "trading.tasks.expire_stale_orders",
+        "schedule": 900.0,
+    },
+    "retry-stale-stripe-events": {
+        "task": "webhooks.tasks.retry_stale_stripe_events",
+        "schedule": 300.0,
+    },
+}
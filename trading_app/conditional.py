@@ -0,0 +1,39 @@
+"""
+Conditional GET helpers for read endpoints.
+
+A view works out an ETag (and, where it has one, a Last-Modified time) from
+something cheaper than the response body, such as a cache version counter
+or an `updated_at` column. A request whose If-None-Match /
+If-Modified-Since still match gets an empty 304. Every other response
+carries the validators so the client (or a proxy) can revalidate next time.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def etag_for(*parts):
+    return quote_etag(hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()[:32])
+
+
+def with_validators(response, etag, last_modified=None):
+    """ Stamps ETag/Last-Modified on a 200 (or 304) response; `last_modified` is a datetime """
+    if response.status_code not in (200, 304):
+        return response
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+    # Stored copies must be revalidated, which is now cheap
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """ A 304 response if the request's validators still match, else None """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+    if response is None or response.status_code != 304:
+        return None
+    return with_validators(response, etag, last_modified)
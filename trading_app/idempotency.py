@@ -0,0 +1,118 @@
+"""
+Idempotency-Key support for POST endpoints that create things.
+
+The first request with a given key runs the view and its response is stored
+in the cache for IDEMPOTENCY_TTL. Retries with the same key get that response
+back (marked with an `Idempotent-Replayed: true` header) without running the
+view again. A retry that arrives while the first request is still running
+waits for it, up to IDEMPOTENCY_WAIT, and then replays its response; the
+in-progress marker itself expires after IDEMPOTENCY_LOCK_TIMEOUT in case the
+worker handling the first request dies. The marker is a Redis lock held under
+a per-request token and released with an atomic compare-and-delete, so a
+request that outlived its lock never releases the lock of the retry that
+took it over.
+
+Keys are scoped per user and endpoint. Reusing a key with a different
+request body is rejected with 422, and 5xx responses are not stored so
+they can be retried.
+"""
+import functools
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from drf_yasg import openapi
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    HEADER, openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+    description="Unique key per logical request; retries with the same key replay the first response."
+)
+
+POLL_INTERVAL = 0.05
+
+# Deletes KEYS[1] only while it still holds this request's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def replay(stored):
+    return Response(stored["data"], status=stored["status"], headers={"Idempotent-Replayed": "true"})
+
+
+def acquire_lock(key, token):
+    """ Takes the lock `key` for `token` unless another request holds it """
+    client = cache._cache.get_client(key, write=True)
+    timeout = int(settings.IDEMPOTENCY_LOCK_TIMEOUT.total_seconds() * 1000)
+    return bool(client.set(cache.make_and_validate_key(key), token, nx=True, px=timeout))
+
+
+def release_lock(key, token):
+    """ Releases the lock `key` if `token` still holds it; returns whether it did """
+    client = cache._cache.get_client(key, write=True)
+    return bool(client.eval(RELEASE_LOCK_SCRIPT, 1, cache.make_and_validate_key(key), token))
+
+
+def idempotent(view):
+    """ Makes a viewset action replay its first response for repeated Idempotency-Key headers """
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"error": f"{HEADER} must be at most 255 characters."}, status=status.HTTP_400_BAD_REQUEST)
+
+        digest = hashlib.sha256(f"{request.user.pk}:{request.path}:{key}".encode()).hexdigest()
+        result_key, lock_key = f"idempotency:{digest}", f"idempotency:{digest}:lock"
+        request_fingerprint = fingerprint(request)
+        token = uuid.uuid4().hex
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT.total_seconds()
+        while True:
+            stored = cache.get(result_key)
+            if stored is not None:
+                if stored["fingerprint"] != request_fingerprint:
+                    return Response(
+                        {"error": f"{HEADER} was already used for a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                return replay(stored)
+            if acquire_lock(lock_key, token):
+                break
+            if time.monotonic() >= deadline:
+                return Response(
+                    {"error": f"A request with this {HEADER} is still being processed."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            response = view(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(
+                    result_key,
+                    {"fingerprint": request_fingerprint, "status": response.status_code, "data": response.data},
+                    timeout=settings.IDEMPOTENCY_TTL.total_seconds()
+                )
+            return response
+        finally:
+            release_lock(lock_key, token)
+
+    return wrapper
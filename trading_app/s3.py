@@ -0,0 +1,79 @@
+"""
+Shared S3 access for code that talks to boto3 directly (presigned URLs, HEAD checks).
+
+One client is created per process and reused; boto3 clients are thread-safe
+once built, only their creation is not. Presigned GET URLs are cached by
+object key for half their lifetime, so every URL handed out still has at
+least PRESIGNED_URL_EXPIRY / 2 seconds to run.
+"""
+import hashlib
+import logging
+import threading
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PRESIGNED_URL_EXPIRY = 600
+PRESIGNED_URL_CACHE_PREFIX = "s3:presigned:"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """ The process-wide boto3 S3 client; AWS_S3_ENDPOINT_URL points it at an S3-compatible stand-in """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME,
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    config=Config(signature_version=settings.AWS_S3_SIGNATURE_VERSION),
+                )
+    return _client
+
+
+def presigned_get_urls(keys, expires_in=PRESIGNED_URL_EXPIRY):
+    """
+    {key: signed GET URL} for objects in the storage bucket, in one cache round trip.
+    Keys that could not be signed map to None.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    cache_keys = {
+        f"{PRESIGNED_URL_CACHE_PREFIX}{expires_in}:{hashlib.sha256(f'{bucket}/{key}'.encode()).hexdigest()}": key
+        for key in keys
+    }
+    cached = cache.get_many(cache_keys)
+    urls = {cache_keys[cache_key]: url for cache_key, url in cached.items()}
+
+    signed = {}
+    client = get_s3_client()
+    for cache_key, key in cache_keys.items():
+        if key in urls:
+            continue
+        try:
+            signed[cache_key] = urls[key] = client.generate_presigned_url(
+                "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires_in, HttpMethod="GET"
+            )
+        except (BotoCoreError, ClientError):
+            logger.warning("Could not sign a download URL for %s", key, exc_info=True)
+            urls[key] = None
+    if signed:
+        cache.set_many(signed, timeout=expires_in // 2)
+    return urls
+
+
+def presigned_get_url(key, expires_in=PRESIGNED_URL_EXPIRY):
+    return presigned_get_urls([key], expires_in)[key]
@@ -0,0 +1,57 @@
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from rest_framework import filters
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter (same ?search= parameter) that
+    uses indexed Postgres matching instead of ILIKE '%term%' scans.
+
+    Views configure:
+    - search_vector_field: stored SearchVectorField, matched with websearch
+      syntax ("gold -ring", "\"gold bar\"").
+    - trigram_fields: text fields with a gin_trgm_ops index. They are
+      matched by word similarity, so misspelt terms still find results.
+    - search_exact_fields: fields compared with = (e.g. a status).
+    - search_contains_fields: short unindexed fields matched with ILIKE
+      '%term%' as SearchFilter did (e.g. a username on a joined table).
+    - search_config: text search configuration the vector was built with.
+    - rank_search_results: order matches by relevance unless ?ordering= is
+      given. Defaults to True; views whose pagination depends on a fixed
+      ordering turn it off.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        text = " ".join(terms)
+
+        vector_field = getattr(view, "search_vector_field", None)
+        trigram_fields = getattr(view, "trigram_fields", [])
+        exact_fields = getattr(view, "search_exact_fields", [])
+        contains_fields = getattr(view, "search_contains_fields", [])
+
+        conditions = [Q(**{f"{field}__trigram_word_similar": text}) for field in trigram_fields]
+        conditions += [Q(**{field: text}) for field in exact_fields]
+        conditions += [Q(**{f"{field}__icontains": text}) for field in contains_fields]
+        scores = [TrigramWordSimilarity(text, field) for field in trigram_fields]
+        if vector_field:
+            query = SearchQuery(text, search_type="websearch", config=getattr(view, "search_config", "english"))
+            conditions.append(Q(**{vector_field: query}))
+            scores.append(SearchRank(F(vector_field), query))
+        if not conditions:
+            return queryset
+
+        queryset = queryset.filter(reduce(or_, conditions))
+        if scores and getattr(view, "rank_search_results", True) and not request.query_params.get(
+            filters.OrderingFilter.ordering_param
+        ):
+            rank = scores[0] if len(scores) == 1 else Greatest(*scores)
+            queryset = queryset.annotate(search_rank=rank).order_by("-search_rank", "-id")
+        return queryset
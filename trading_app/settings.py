@@ -12,6 +12,7 @@ from sentry_sdk.integrations.django import DjangoIntegration
 from sentry_sdk.integrations.redis import RedisIntegration
 from sentry_sdk.integrations.celery import CeleryIntegration
 from django.utils.log import DEFAULT_LOGGING
+from corsheaders.defaults import default_headers
 import drf_spectacular
 # Check if running inside Docker
 
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'drf_yasg',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -84,6 +86,7 @@ else:
 
 CSRF_TRUSTED_ORIGINS = CORS_ALLOWED_ORIGINS
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 
 # === URL CONFIGURATION === #
 ROOT_URLCONF = 'trading_app.urls'
@@ -153,14 +156,28 @@ AWS_ACCESS_KEY_ID = env.str('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = env.str('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = env.str('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME = env.str('AWS_S3_REGION_NAME')
-AWS_S3_CUSTOM_DOMAIN = f"{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com"
+# Set to an S3-compatible endpoint (e.g. the minio service in docker-compose) instead of AWS
+AWS_S3_ENDPOINT_URL = env.str('AWS_S3_ENDPOINT_URL', default='') or None
+AWS_S3_CUSTOM_DOMAIN = None if AWS_S3_ENDPOINT_URL else f"{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com"
 AWS_S3_SIGNATURE_VERSION = "s3v4"
 AWS_DEFAULT_ACL = None
 AWS_QUERYSTRING_AUTH = False
 AWS_S3_OBJECT_PARAMETERS = {"CacheControl": "max-age=86400"}
 
 DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
-MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
+MEDIA_URL = f"{AWS_S3_ENDPOINT_URL}/{AWS_STORAGE_BUCKET_NAME}/" if AWS_S3_ENDPOINT_URL else f"https://{AWS_S3_CUSTOM_DOMAIN}/"
+
+# Presigned direct-to-bucket uploads (trading_app.uploads)
+DIRECT_UPLOAD_EXPIRY = env.int('DIRECT_UPLOAD_EXPIRY_SECONDS', default=300)
+DIRECT_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+
+# === PRODUCT IMAGES === #
+PRODUCT_IMAGE_WIDTHS = [160, 320, 640, 1280]
+PRODUCT_IMAGE_QUALITY = env.int('PRODUCT_IMAGE_QUALITY', default=80)
+
+# === PRODUCT IMPORTS === #
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
 
 # === SWAGGER SETTINGS === #
 SWAGGER_SETTINGS = {
@@ -185,6 +202,17 @@ LOGOUT_REDIRECT_URL = "users/login/"
 STRIPE_SECRET_KEY = env.str('STRIPE_SECRET_KEY')
 STRIPE_PUBLIC_KEY = env.str('STRIPE_PUBLIC_KEY')
 STRIPE_WEBHOOK_SECRET = env.str('STRIPE_WEBHOOK_SECRET')
+# Points the Stripe client somewhere else, e.g. the local stub (manage.py stripe_stub) for load tests
+STRIPE_API_BASE = env.str('STRIPE_API_BASE', default='')
+# Webhook events still pending after this long are re-queued by the sweeper
+STRIPE_EVENT_RETRY_AFTER = timedelta(seconds=env.int('STRIPE_EVENT_RETRY_AFTER_SECONDS', default=300))
+STRIPE_EVENT_MAX_ATTEMPTS = 10
+STRIPE_EVENT_RETRY_BATCH_SIZE = 500
+
+# === INVOICES === #
+# Batch rendering (sales.invoices.render_invoices): PDF processes and concurrent S3 uploads
+INVOICE_RENDER_WORKERS = env.int('INVOICE_RENDER_WORKERS', default=os.cpu_count() or 1)
+INVOICE_UPLOAD_THREADS = 8
 
 # === CHANNELS (WEBSOCKETS) === #
 REDIS_HOST = "redis" if DOCKER_MODE else "127.0.0.1"
@@ -198,11 +226,44 @@ CHANNEL_LAYERS = {
     },
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:6379/1",
+    },
+}
+
 # === CELERY === #
 CELERY_BROKER_URL = f"redis://{REDIS_HOST}:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 
+# === CATALOG CACHE === #
+CATALOG_CACHE_TTL = env.int('CATALOG_CACHE_TTL_SECONDS', default=300)
+# Version keys outlive the payloads stored under them, then expire like everything else
+CATALOG_VERSION_TTL = CATALOG_CACHE_TTL * 12
+
+# === IDEMPOTENCY KEYS === #
+IDEMPOTENCY_TTL = timedelta(hours=24)
+IDEMPOTENCY_WAIT = timedelta(seconds=10)
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(seconds=60)
+
+# === ORDER EXPIRY === #
+# Orders left in one of these statuses for longer than the given age are expired by the sweeper
+ORDER_EXPIRY = {
+    'pending': timedelta(hours=env.int('ORDER_PENDING_EXPIRY_HOURS', default=48)),
+    'approved': timedelta(hours=env.int('ORDER_APPROVED_EXPIRY_HOURS', default=7 * 24)),
+}
+ORDER_EXPIRY_BATCH_SIZE = 1000
+
+# === STOCK RESERVATIONS === #
+# Stock stays reserved for as long as an unpaid order can live; the order sweeper releases it on expiry
+STOCK_RESERVATION_TTL = max(ORDER_EXPIRY.values())
+
+# === MARKET DATA === #
+MARKET_DATA_INTERVAL = env.float('MARKET_DATA_INTERVAL_SECONDS', default=0.25)
+MARKET_DATA_TAPE_LENGTH = 50
+
 
 # === JWT === #
 
@@ -0,0 +1,47 @@
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+NDJSON_CHUNK_SIZE = 2000
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON (`?format=ndjson` or `Accept: application/x-ndjson`).
+
+    Views stream list payloads themselves with stream_ndjson(); this renderer
+    only handles regular responses such as errors, as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, cls=JSONEncoder, ensure_ascii=False) + '\n').encode()
+
+
+def wants_ndjson(request):
+    renderer = getattr(request, 'accepted_renderer', None)
+    return isinstance(renderer, NDJSONRenderer)
+
+
+def stream_ndjson(queryset, serializer_class, context, chunk_size=NDJSON_CHUNK_SIZE):
+    """
+    Streams one serialized object per line. Rows are fetched with a
+    server-side cursor `chunk_size` at a time and written out per chunk, so
+    memory stays flat however large the result is.
+    """
+    encoder = JSONEncoder(ensure_ascii=False)
+
+    def lines():
+        rows = queryset.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(rows, chunk_size)):
+            data = serializer_class(chunk, many=True, context=context).data
+            yield ''.join(encoder.encode(item) + '\n' for item in data)
+
+    return StreamingHttpResponse(lines(), content_type=NDJSONRenderer.media_type)
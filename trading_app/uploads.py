@@ -0,0 +1,87 @@
+"""
+Direct-to-storage uploads for S3-backed file fields.
+
+issue() returns a presigned POST. The browser sends the file straight to
+the bucket with it, so the bytes never pass through a web worker. The
+policy pins the object key and content type and caps the size. The signed
+token that comes with it names the object. confirm() checks that token,
+checks the uploaded object with a HEAD request and only then points the
+model field at it.
+"""
+import posixpath
+import uuid
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from drf_yasg import openapi
+
+from trading_app.s3 import get_s3_client
+
+CONTENT_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+SALT = "trading_app.uploads"
+
+UPLOAD_URL_REQUEST = openapi.Schema(type=openapi.TYPE_OBJECT, required=["content_type"], properties={
+    "content_type": openapi.Schema(type=openapi.TYPE_STRING, enum=list(CONTENT_TYPES)),
+})
+UPLOAD_CONFIRM_REQUEST = openapi.Schema(type=openapi.TYPE_OBJECT, required=["token"], properties={
+    "token": openapi.Schema(type=openapi.TYPE_STRING, description="Token returned with the upload URL"),
+})
+
+
+class UploadError(Exception):
+    pass
+
+
+def object_key(storage, name):
+    return posixpath.join(storage.location, name) if storage.location else name
+
+
+def issue(instance, field_name, content_type, user):
+    """ Presigned POST for a new object of `instance.<field_name>`, plus the token to confirm it with """
+    extension = CONTENT_TYPES.get(content_type)
+    if extension is None:
+        raise UploadError(f"Unsupported content type, expected one of: {', '.join(CONTENT_TYPES)}")
+
+    field = instance._meta.get_field(field_name)
+    name = field.generate_filename(instance, f"{uuid.uuid4().hex}{extension}")
+    expires_in = settings.DIRECT_UPLOAD_EXPIRY
+    upload = get_s3_client().generate_presigned_post(
+        Bucket=field.storage.bucket_name,
+        Key=object_key(field.storage, name),
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, settings.DIRECT_UPLOAD_MAX_BYTES],
+        ],
+        ExpiresIn=expires_in,
+    )
+    token = signing.dumps(
+        {"model": instance._meta.label, "pk": instance.pk, "field": field_name, "name": name, "user": user.pk}, salt=SALT
+    )
+    return {"url": upload["url"], "fields": upload["fields"], "token": token, "expires_in": expires_in}
+
+
+def confirm(instance, field_name, token, user):
+    """ Points `instance.<field_name>` at the object uploaded with `token` and saves it """
+    try:
+        # The token outlives the POST policy a little, so a slow upload can still be confirmed
+        claims = signing.loads(token, salt=SALT, max_age=settings.DIRECT_UPLOAD_EXPIRY * 2)
+    except signing.BadSignature:
+        raise UploadError("Invalid or expired upload token")
+    if (claims["model"], claims["pk"], claims["field"], claims["user"]) != (
+        instance._meta.label, instance.pk, field_name, user.pk
+    ):
+        raise UploadError("Upload token does not belong to this object")
+
+    storage = instance._meta.get_field(field_name).storage
+    try:
+        head = get_s3_client().head_object(Bucket=storage.bucket_name, Key=object_key(storage, claims["name"]))
+    except ClientError:
+        raise UploadError("The file has not been uploaded yet")
+    if head.get("ContentType") not in CONTENT_TYPES or not 0 < head["ContentLength"] <= settings.DIRECT_UPLOAD_MAX_BYTES:
+        raise UploadError("Uploaded file is not an accepted image")
+
+    setattr(instance, field_name, claims["name"])
+    instance.save()
+    return instance
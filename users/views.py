@@ -11,6 +11,7 @@ from users.serializers import (
     AvatarUpdateSerializer
 )
 from rest_framework.parsers import MultiPartParser
+from trading_app import uploads
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -24,6 +25,8 @@ class UserViewSet(viewsets.ViewSet):
     - `/api/users/profile/` → Retrieve logged-in user's profile
     - `/api/users/profile/update/` → Update profile details (name, phone)
     - `/api/users/profile/avatar/` → Upload avatar
+    - `/api/users/profile/avatar/upload-url/` → Presigned direct upload for the avatar
+    - `/api/users/profile/avatar/confirm/` → Attach the directly uploaded avatar
     """
 
     @swagger_auto_schema(request_body=RegisterSerializer, responses={201: UserSerializer})
@@ -98,4 +101,39 @@ class UserViewSet(viewsets.ViewSet):
         serializer = AvatarUpdateSerializer(request.user, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
+        return Response({"avatar_url": user.avatar.url})
+
+    @swagger_auto_schema(
+        method='post',
+        operation_description="Presigned POST for uploading an avatar straight to storage",
+        request_body=uploads.UPLOAD_URL_REQUEST,
+        responses={200: openapi.Response("Upload URL, form fields and confirmation token")}
+    )
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated],
+            url_path="profile/avatar/upload-url")
+    def profile_avatar_upload_url(self, request):
+        """ Issue a short-lived direct upload for the avatar """
+        try:
+            return Response(uploads.issue(request.user, "avatar", request.data.get("content_type"), request.user))
+        except uploads.UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(
+        method='post',
+        request_body=uploads.UPLOAD_CONFIRM_REQUEST,
+        responses={200: openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "avatar_url": openapi.Schema(type=openapi.TYPE_STRING, description="New avatar URL")
+            }
+        )}
+    )
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated],
+            url_path="profile/avatar/confirm")
+    def profile_avatar_confirm(self, request):
+        """ Point the avatar at the directly uploaded object """
+        try:
+            user = uploads.confirm(request.user, "avatar", request.data.get("token", ""), request.user)
+        except uploads.UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"avatar_url": user.avatar.url})
\ No newline at end of file
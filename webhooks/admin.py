@@ -1,3 +1,8 @@
 from django.contrib import admin
+from webhooks.models import StripeEvent
 
-# Register your models here.
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_id', 'type', 'sales_order_id', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'type')
+    search_fields = ('event_id', 'sales_order_id')
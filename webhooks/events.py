@@ -0,0 +1,186 @@
+"""
+Stripe webhook event pipeline.
+
+The webhook view only verifies the signature and records the raw event
+(record_event); Stripe gets its 200 straight away. A Celery task then
+processes it (process_event):
+  - redeliveries are dropped by the unique event_id, and an event is only
+    ever applied while it is still pending, so running a task twice is
+    harmless;
+  - the sales order row is locked while its events are applied, and all of
+    its pending events are applied in the order Stripe created them, so two
+    workers never interleave the events of one order;
+  - state changes only move forward (a paid order is never "paid" again),
+    so an event that arrives late cannot undo a newer one.
+"""
+import json
+import logging
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from sales.models import Invoice, Payment, SalesOrder, StripeReference
+from sales.tasks import generate_invoice
+from trading.reservations import consume_reservations
+from webhooks.models import StripeEvent
+
+logger = logging.getLogger(__name__)
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+PAYMENT_SUCCEEDED_EVENTS = {
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+    "payment_intent.succeeded",
+    "charge.succeeded",
+}
+PAYMENT_FAILED_EVENTS = {
+    "checkout.session.async_payment_failed",
+    "payment_intent.payment_failed",
+}
+
+
+def metadata_sales_order_id(obj):
+    """ The sales_order_id carried in an event object's metadata, if any """
+    value = (obj.get("metadata") or {}).get("sales_order_id")
+    return int(value) if value and str(value).isdigit() else None
+
+
+def object_references(obj):
+    """ Ids in an event object that the StripeReference index can hold: the session or PaymentIntent itself, and its PaymentIntent """
+    own = obj.get("id") if obj.get("object") in ("checkout.session", "payment_intent") else None
+    return [reference for reference in (obj.get("payment_intent"), own) if reference]
+
+
+def record_event(payload, event):
+    """
+    Stores a verified event. Returns (StripeEvent, created); `created` is
+    False when Stripe redelivered an event that is already stored.
+    """
+    obj = event["data"]["object"]
+    try:
+        with transaction.atomic():
+            stored = StripeEvent.objects.create(
+                event_id=event["id"],
+                type=event["type"],
+                payload=json.loads(payload),
+                stripe_created=event["created"],
+                sales_order_id=metadata_sales_order_id(obj) or StripeReference.resolve(*object_references(obj)),
+            )
+    except IntegrityError:
+        return StripeEvent.objects.get(event_id=event["id"]), False
+    return stored, True
+
+
+def resolve_sales_order(obj):
+    """
+    The sales order an event object belongs to: from its metadata, then the
+    local StripeReference index, and only then from the PaymentIntent's metadata at Stripe
+    """
+    sales_order_id = metadata_sales_order_id(obj) or StripeReference.resolve(*object_references(obj))
+    if sales_order_id is None and obj.get("payment_intent"):
+        logger.info("Resolving %s through the Stripe API", obj["payment_intent"])
+        payment_intent = stripe.PaymentIntent.retrieve(obj["payment_intent"])
+        sales_order_id = metadata_sales_order_id(payment_intent)
+    return sales_order_id
+
+
+def process_event(event_pk):
+    """
+    Applies a stored event together with every other pending event of its sales order.
+    Returns the number of events applied. Stripe API errors are re-raised so the task can retry.
+    """
+    event = StripeEvent.objects.filter(pk=event_pk, status="pending").first()
+    if event is None:
+        return 0
+
+    if event.type not in PAYMENT_SUCCEEDED_EVENTS | PAYMENT_FAILED_EVENTS:
+        finish(event_pk, "ignored", f"Unhandled event type {event.type}")
+        return 0
+
+    obj = event.payload["data"]["object"]
+    sales_order_id = event.sales_order_id
+    if sales_order_id is None:
+        try:
+            sales_order_id = resolve_sales_order(obj)
+        except stripe.StripeError as e:
+            StripeEvent.objects.filter(pk=event_pk).update(attempts=F("attempts") + 1, error=str(e))
+            raise
+        if sales_order_id is None:
+            finish(event_pk, "failed", "Missing sales_order_id")
+            return 0
+        StripeEvent.objects.filter(pk=event_pk).update(sales_order_id=sales_order_id)
+
+    return process_sales_order_events(sales_order_id)
+
+
+def process_sales_order_events(sales_order_id):
+    """ Applies the pending events of one sales order, oldest first, under a lock on the sales order """
+    with transaction.atomic():
+        sales_order = SalesOrder.objects.select_for_update().filter(pk=sales_order_id).first()
+        events = list(
+            StripeEvent.objects.select_for_update()
+            .filter(sales_order_id=sales_order_id, status="pending")
+            .order_by("stripe_created", "id")
+        )
+        for event in events:
+            if sales_order is None:
+                finish(event.pk, "failed", f"Unknown sales order {sales_order_id}")
+                continue
+            # e.g. a completed checkout session carries the PaymentIntent id that later events refer to
+            StripeReference.remember(sales_order.id, *object_references(event.payload["data"]["object"]))
+            if event.type in PAYMENT_SUCCEEDED_EVENTS:
+                payment_succeeded(sales_order, event)
+            elif event.type in PAYMENT_FAILED_EVENTS:
+                payment_failed(sales_order, event)
+            else:
+                finish(event.pk, "ignored", f"Unhandled event type {event.type}")
+    return len(events)
+
+
+def payment_succeeded(sales_order, event):
+    # A completed checkout can still be waiting for an asynchronous payment method
+    if event.type == "checkout.session.completed" and event.payload["data"]["object"].get("payment_status") == "unpaid":
+        finish(event.pk, "ignored", "Checkout completed without payment")
+        return
+
+    payments = Payment.objects.filter(sales_order=sales_order)
+    newly_succeeded = payments.exclude(status="succeeded").update(status="succeeded")
+    if not newly_succeeded and not payments.exists():
+        finish(event.pk, "failed", f"No payment for sales order {sales_order.id}")
+        return
+
+    if sales_order.status not in ("paid", "shipped"):
+        sales_order.status = "paid"
+        sales_order.save(update_fields=["status"])
+        logger.info("Sales order %s paid (Stripe event %s)", sales_order.id, event.event_id)
+    # The sales order may already be "paid" (DEBUG marks it at checkout); the payment is what counts
+    if newly_succeeded:
+        consume_reservations([sales_order.order_id])
+        if not Invoice.objects.filter(sales_order=sales_order).exists():
+            transaction.on_commit(lambda: generate_invoice.delay(sales_order.id))
+    finish(event.pk, "processed")
+
+
+def payment_failed(sales_order, event):
+    Payment.objects.filter(sales_order=sales_order, status="pending").update(status="failed")
+    logger.info("Payment for sales order %s failed (Stripe event %s)", sales_order.id, event.event_id)
+    finish(event.pk, "processed")
+
+
+def stale_events():
+    """ Pending events whose task was lost or gave up, oldest first """
+    return StripeEvent.objects.filter(
+        status="pending", received_at__lte=now() - settings.STRIPE_EVENT_RETRY_AFTER
+    ).order_by("received_at")
+
+
+def finish(event_pk, status, error=""):
+    StripeEvent.objects.filter(pk=event_pk).update(
+        status=status, error=error, attempts=F("attempts") + 1, processed_at=now()
+    )
+    if status == "failed":
+        logger.warning("Stripe event %s failed: %s", event_pk, error)
@@ -1,3 +1,32 @@
 from django.db import models
 
-# Create your models here.
+
+class StripeEvent(models.Model):
+    """ A verified Stripe webhook event, stored as received and processed asynchronously """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    # Stripe redelivers events; the unique id turns a redelivery into a no-op insert
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    stripe_created = models.BigIntegerField(help_text="Unix time the event was created at Stripe")
+    sales_order_id = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sales_order_id', 'stripe_created', 'id'], name='stripe_event_order_idx'),
+            models.Index(fields=['received_at'], name='stripe_event_pending_idx', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"Stripe event {self.event_id} ({self.type}) - {self.status}"
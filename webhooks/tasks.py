@@ -0,0 +1,27 @@
+import stripe
+from celery import shared_task
+from django.conf import settings
+
+from webhooks.events import finish, process_event, stale_events
+
+
+@shared_task(
+    autoretry_for=(stripe.StripeError,), retry_backoff=True, max_retries=5, acks_late=True
+)
+def process_stripe_event(event_pk):
+    """ Apply a stored Stripe webhook event (and any earlier pending ones of its sales order) """
+    applied = process_event(event_pk)
+    return f"Applied {applied} Stripe events for event {event_pk}"
+
+
+@shared_task
+def retry_stale_stripe_events():
+    """ Periodically re-queue events whose processing task was lost; give up after STRIPE_EVENT_MAX_ATTEMPTS """
+    requeued = 0
+    for pk, attempts in stale_events().values_list("id", "attempts")[:settings.STRIPE_EVENT_RETRY_BATCH_SIZE]:
+        if attempts >= settings.STRIPE_EVENT_MAX_ATTEMPTS:
+            finish(pk, "failed", f"Gave up after {attempts} attempts")
+            continue
+        process_stripe_event.delay(pk)
+        requeued += 1
+    return f"Re-queued {requeued} Stripe events"
@@ -1,3 +1,203 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
 from django.test import TestCase
+from django.utils.timezone import now
+
+from products.models import Product
+from sales.models import Payment, SalesOrder, StripeReference
+from sales.stripe_stub import sign
+from trading.models import Order, StockReservation
+from trading.reservations import place_order
+from users.models import User
+from webhooks import events
+from webhooks.events import process_event, resolve_sales_order
+from webhooks.models import StripeEvent
+from webhooks.tasks import retry_stale_stripe_events
+
+WEBHOOK_URL = "/api/webhooks/stripe/"
+
+
+class StripeWebhookTests(TestCase):
+    """ Signed webhook deliveries are stored once and applied per sales order, oldest first, forward only """
+
+    @classmethod
+    def setUpTestData(cls):
+        trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+        product = Product.objects.create(user=trader, title="Gold bar", price=100, stock=10)
+        cls.order = place_order(customer, product, 1)
+        Order.objects.filter(id=cls.order.id).update(status="approved")
+        cls.sales_order = SalesOrder.objects.create(order=cls.order, total_price=100)
+        cls.payment = Payment.objects.create(sales_order=cls.sales_order)
+
+    def setUp(self):
+        patcher = mock.patch("webhooks.views.process_stripe_event.delay")
+        self.process_delay = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("webhooks.events.generate_invoice.delay")
+        self.invoice_delay = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sequence = 0
+
+    def event(self, type, created=None, **obj):
+        self.sequence += 1
+        obj.setdefault("metadata", {"sales_order_id": str(self.sales_order.id)})
+        return {
+            "id": f"evt_{self.sequence}",
+            "object": "event",
+            "type": type,
+            "created": created or 1700000000 + self.sequence,
+            "data": {"object": obj},
+        }
+
+    def deliver(self, event, secret=None):
+        payload = json.dumps(event)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                WEBHOOK_URL, data=payload, content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=sign(payload, secret or settings.STRIPE_WEBHOOK_SECRET),
+            )
+
+    def apply(self, event):
+        self.deliver(event)
+        with self.captureOnCommitCallbacks(execute=True):
+            return process_event(StripeEvent.objects.get(event_id=event["id"]).pk)
+
+    def stored(self, event):
+        return StripeEvent.objects.get(event_id=event["id"])
+
+    def test_rejects_unsigned_payloads(self):
+        response = self.deliver(self.event("payment_intent.succeeded"), secret="whsec_wrong")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_redelivered_event_is_stored_and_queued_once(self):
+        event = self.event("payment_intent.succeeded", id="pi_1", object="payment_intent")
+
+        first, second = self.deliver(event), self.deliver(event)
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(second.json()["message"], "Event already received")
+        stored = self.stored(event)
+        self.assertEqual((stored.sales_order_id, stored.status), (self.sales_order.id, "pending"))
+        self.process_delay.assert_called_once_with(stored.pk)
+
+    def test_success_marks_the_order_paid_and_queues_one_invoice(self):
+        self.assertEqual(self.apply(self.event("payment_intent.succeeded", id="pi_1", object="payment_intent")), 1)
+
+        self.payment.refresh_from_db()
+        self.sales_order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.sales_order.status), ("succeeded", "paid"))
+        self.assertEqual(StockReservation.objects.get(order=self.order).status, "consumed")
+        self.invoice_delay.assert_called_once_with(self.sales_order.id)
+
+        # The completed session that follows changes nothing and queues no second invoice
+        completed = self.event("checkout.session.completed", id="cs_1", object="checkout.session",
+                               payment_status="paid", payment_intent="pi_1")
+        self.apply(completed)
+        self.assertEqual(self.stored(completed).status, "processed")
+        self.invoice_delay.assert_called_once()
+
+    def test_late_failure_does_not_undo_a_success(self):
+        self.apply(self.event("payment_intent.succeeded", id="pi_1", object="payment_intent"))
+        failed = self.event("payment_intent.payment_failed", id="pi_1", object="payment_intent")
+
+        self.apply(failed)
+
+        self.assertEqual(self.stored(failed).status, "processed")
+        self.payment.refresh_from_db()
+        self.sales_order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.sales_order.status), ("succeeded", "paid"))
+
+    def test_pending_events_of_an_order_are_applied_in_stripe_order(self):
+        succeeded = self.event("payment_intent.succeeded", created=1700000200, id="pi_1", object="payment_intent")
+        failed = self.event("payment_intent.payment_failed", created=1700000100, id="pi_1", object="payment_intent")
+        self.deliver(succeeded)
+        self.deliver(failed)
+
+        applied = []
+        with mock.patch.object(events, "payment_succeeded", side_effect=lambda so, e: applied.append(e.event_id)), \
+                mock.patch.object(events, "payment_failed", side_effect=lambda so, e: applied.append(e.event_id)):
+            # Processing the newer event picks up the older one of the same sales order first
+            self.assertEqual(process_event(self.stored(succeeded).pk), 2)
+
+        self.assertEqual(applied, [failed["id"], succeeded["id"]])
+
+    def test_unpaid_checkout_completion_is_ignored(self):
+        completed = self.event("checkout.session.completed", id="cs_1", object="checkout.session",
+                               payment_status="unpaid", payment_intent=None)
+
+        self.apply(completed)
+
+        self.assertEqual(self.stored(completed).status, "ignored")
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "pending")
+        self.invoice_delay.assert_not_called()
+
+    def test_event_without_a_sales_order_fails(self):
+        orphan = self.event("payment_intent.succeeded", id="pi_unknown", object="payment_intent", metadata={})
+
+        self.assertEqual(self.apply(orphan), 0)
+
+        self.assertEqual((self.stored(orphan).status, self.stored(orphan).error), ("failed", "Missing sales_order_id"))
+
+    def test_stale_events_are_requeued_until_the_attempt_limit(self):
+        fresh, stale, exhausted = (self.event("payment_intent.succeeded", id=f"pi_{n}", object="payment_intent")
+                                   for n in range(3))
+        for event in (fresh, stale, exhausted):
+            self.deliver(event)
+        old = now() - settings.STRIPE_EVENT_RETRY_AFTER - timedelta(seconds=1)
+        StripeEvent.objects.filter(event_id__in=[stale["id"], exhausted["id"]]).update(received_at=old)
+        StripeEvent.objects.filter(event_id=exhausted["id"]).update(attempts=settings.STRIPE_EVENT_MAX_ATTEMPTS)
+
+        with mock.patch("webhooks.tasks.process_stripe_event.delay") as requeue:
+            self.assertEqual(retry_stale_stripe_events(), "Re-queued 1 Stripe events")
+
+        requeue.assert_called_once_with(self.stored(stale).pk)
+        self.assertEqual(self.stored(fresh).status, "pending")
+        self.assertEqual(self.stored(exhausted).status, "failed")
+
+
+class SalesOrderResolutionTests(TestCase):
+    """ Events find their sales order from metadata, then the local index, and only then from Stripe """
+
+    @classmethod
+    def setUpTestData(cls):
+        trader = User.objects.create_user(username="trader", password="pass12345", role="trader")
+        customer = User.objects.create_user(username="customer", password="pass12345", role="customer")
+        product = Product.objects.create(user=trader, title="Gold bar", price=100, stock=10)
+        order = Order.objects.create(user=customer, product=product, quantity=1, total_price=100)
+        cls.sales_order = SalesOrder.objects.create(order=order, total_price=100)
+
+    def setUp(self):
+        patcher = mock.patch("webhooks.events.stripe.PaymentIntent.retrieve")
+        self.retrieve = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.retrieve.return_value = {"id": "pi_1", "metadata": {"sales_order_id": str(self.sales_order.id)}}
+
+    def test_metadata_needs_no_lookup(self):
+        obj = {"object": "payment_intent", "id": "pi_1", "metadata": {"sales_order_id": str(self.sales_order.id)}}
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_sales_order(obj), self.sales_order.id)
+        self.retrieve.assert_not_called()
+
+    def test_indexed_ids_resolve_without_stripe(self):
+        StripeReference.remember(self.sales_order.id, "cs_1")
+        session = {"object": "checkout.session", "id": "cs_1", "payment_intent": "pi_1", "metadata": {}}
+
+        self.assertEqual(resolve_sales_order(session), self.sales_order.id)
+        self.retrieve.assert_not_called()
+
+    def test_charge_before_its_payment_intent_is_indexed_asks_stripe(self):
+        # A new checkout session has no PaymentIntent id, so until an event carrying it has been
+        # applied, a charge can only be traced through the PaymentIntent at Stripe
+        charge = {"object": "charge", "id": "ch_1", "payment_intent": "pi_1", "metadata": {}}
+        self.assertEqual(resolve_sales_order(charge), self.sales_order.id)
+        self.retrieve.assert_called_once_with("pi_1")
 
-# Create your tests here.
+        StripeReference.remember(self.sales_order.id, "pi_1")
+        self.assertEqual(resolve_sales_order(charge), self.sales_order.id)
+        self.retrieve.assert_called_once()